@@ -0,0 +1,105 @@
+# HTML parser backendの比較
+#
+# 使い方:
+#   python benchmarks/bench_html_parser.py --fetch "http://www1.river.go.jp/cgi-bin/SiteInfo.exe?ID=..."
+#   python benchmarks/bench_html_parser.py [samples_dir] [--repeat N]
+#
+# --fetchで取得したページはsamples_dir(デフォルト: benchmarks/samples)に生のまま保存される
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from utils.html_parser import available_backends, make_soup, find_first
+
+DEFAULT_SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'samples')
+
+# 実際のコードで使っている一つのtagだけの検索
+TARGETED_LOOKUPS = [
+    ('font', {'size': "+2"}),
+    ('a', {'href': True, 'target': "_blank"}),
+    ('tr', {'align': 'CENTER'}),
+]
+
+def fetch_samples(urls, samples_dir):
+    from http_session import HttpSession
+
+    os.makedirs(samples_dir, exist_ok=True)
+    session = HttpSession()
+    for url in urls:
+        response = session.get(url)
+        response.raise_for_status()
+        file_name = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16] + '.html'
+        with open(os.path.join(samples_dir, file_name), 'wb') as file:
+            file.write(response.content)
+        print(f"saved {url} -> {file_name}")
+
+def load_samples(samples_dir):
+    samples = []
+    for file_name in sorted(os.listdir(samples_dir)):
+        if file_name.endswith(('.html', '.htm')):
+            with open(os.path.join(samples_dir, file_name), 'rb') as file:
+                samples.append((file_name, file.read()))
+    return samples
+
+def measure(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def run(samples, repeat):
+    backends = available_backends()
+    tree_backends = [name for name in backends if name != 'selectolax']
+
+    print(f"backends: {', '.join(backends)} / samples: {len(samples)} / repeat: {repeat}")
+    print(f"{'sample':<24}{'lookup':<16}{'method':<24}{'ms':>10}")
+
+    totals = {}
+    for file_name, markup in samples:
+        for backend in tree_backends:
+            elapsed = measure(lambda: make_soup(markup, backend=backend), repeat)
+            totals[('full', backend)] = totals.get(('full', backend), 0) + elapsed
+            print(f"{file_name[:23]:<24}{'(full parse)':<16}{backend:<24}{elapsed:>10.3f}")
+
+        for name, attrs in TARGETED_LOOKUPS:
+            for backend in tree_backends:
+                elapsed = measure(lambda: make_soup(markup, backend=backend).find(name, attrs), repeat)
+                totals[(name, f"full+find/{backend}")] = totals.get((name, f"full+find/{backend}"), 0) + elapsed
+                print(f"{file_name[:23]:<24}{name:<16}{'full+find/' + backend:<24}{elapsed:>10.3f}")
+
+            for backend in backends:
+                elapsed = measure(lambda: find_first(markup, name, attrs, backend=backend), repeat)
+                totals[(name, f"find_first/{backend}")] = totals.get((name, f"find_first/{backend}"), 0) + elapsed
+                print(f"{file_name[:23]:<24}{name:<16}{'find_first/' + backend:<24}{elapsed:>10.3f}")
+
+    print()
+    print("total (ms per pass over all samples)")
+    for (lookup, method), elapsed in sorted(totals.items(), key=lambda item: (item[0][0], item[1])):
+        print(f"  {lookup:<14}{method:<26}{elapsed:>10.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTML parser backends on saved WIS pages")
+    parser.add_argument('samples_dir', nargs='?', default=DEFAULT_SAMPLES_DIR)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--fetch', nargs='+', metavar='URL', help="download pages into samples_dir before running")
+    args = parser.parse_args()
+
+    if args.fetch:
+        fetch_samples(args.fetch, args.samples_dir)
+
+    if not os.path.isdir(args.samples_dir):
+        parser.error(f"samples directory not found: {args.samples_dir} (use --fetch to save pages first)")
+
+    samples = load_samples(args.samples_dir)
+    if not samples:
+        parser.error(f"no .html samples in {args.samples_dir}")
+
+    run(samples, args.repeat)
+
+if __name__ == '__main__':
+    main()
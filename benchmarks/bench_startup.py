@@ -0,0 +1,84 @@
+# 起動時間の計測 (WIS_InfoWindowのimport時間と最初の描画までの時間)
+#
+# 使い方:
+#   python benchmarks/bench_startup.py [--repeat N] [--offscreen]
+#
+# 毎回新しいプロセスで計測するので、importのcacheの影響は受けない
+# 起動時に読み込まれている重いモジュールも表示する
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SRC_DIR = os.path.join(REPO_DIR, 'src')
+
+# 起動時には不要なモジュール
+DEFERRED_MODULES = ['bs4', 'markdown', 'WIS_DetailInfoWindow', 'getObservationInfo']
+
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QObject, QEvent, QTimer
+
+app = QApplication(sys.argv)
+import_start = time.perf_counter()
+import WIS_InfoWindow
+import_end = time.perf_counter()
+
+result = {'import': import_end - import_start, 'modules': [m for m in %(modules)r if m in sys.modules]}
+
+class PaintFilter(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and 'first_paint' not in result:
+            result['first_paint'] = time.perf_counter() - start
+            QTimer.singleShot(0, app.quit)
+        return False
+
+paint_filter = PaintFilter()
+app.installEventFilter(paint_filter)
+window = WIS_InfoWindow.App()
+QTimer.singleShot(10000, app.quit)
+app.exec_()
+
+result['total'] = time.perf_counter() - start
+print(json.dumps(result))
+"""
+
+def run_once(offscreen):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = SRC_DIR + os.pathsep + env.get('PYTHONPATH', '')
+    if offscreen:
+        env['QT_QPA_PLATFORM'] = 'offscreen'
+
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT % {'modules': DEFERRED_MODULES}],
+        cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time benchmark for WIS_InfoWindow")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--offscreen', action='store_true', help="use the Qt offscreen platform (CI, no display)")
+    args = parser.parse_args()
+
+    results = [run_once(args.offscreen) for _ in range(args.repeat)]
+
+    for key, label in (('import', 'import WIS_InfoWindow'), ('first_paint', 'first paint')):
+        values = [result[key] * 1000 for result in results if key in result]
+        if values:
+            print(f"{label:<24} median {statistics.median(values):8.1f} ms  min {min(values):8.1f} ms  max {max(values):8.1f} ms")
+        else:
+            print(f"{label:<24} not reached")
+
+    loaded = sorted({module for result in results for module in result['modules']})
+    print(f"{'deferred modules loaded':<24} {', '.join(loaded) if loaded else '-'}")
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,139 @@
+from functools import partial
+
 from PyQt5.QtWidgets import (
                             QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, 
                             QTableWidgetItem, QLineEdit, QPushButton, QLabel, 
-                            QHeaderView, QMessageBox
+                            QHeaderView, QMessageBox, QProgressBar
                             )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QFont, QColor
 
 from SrchRainData import SrchRainData_1, SrchRainData_2, SrchRainData_3, SrchRainData_4
 from SrchWaterData import SrchWaterData_1, SrchWaterData_2, SrchWaterData_3, SrchWaterData_4, SrchWaterData_5, SrchWaterData_6, SrchWaterData_7, SrchWaterData_8
 
 from getObservationInfo import ObservationDataMatcher
+from download_engine import DownloadEngine, DownloadCancelled
+from data_handlers import get_data_class, has_data_in_range, run_download
 from utils.decorators import date_input, data_confirm, data_type_decorator
 
+LOADING_TEXT = "読み込み中..."
+
+# 閉じたダイアログのloader/ダウンロードが終わるまで参照を保持
+_running_threads = set()
+
+# 観測項目の判定 -> Srch*Data.exeの取得をGUIスレッドの外で行い、取得したものから順に送る
+# 対応していないdata type/kindならnotSupported、観測項目が見つからない・取得に失敗した場合はloadFailed
+# cancel()の後は何もemitしない
+class DetailLoaderThread(QThread):
+    kindResolved = pyqtSignal(str, int)
+    headerFetched = pyqtSignal(str)
+    tableFetched = pyqtSignal(list)
+    stationFetched = pyqtSignal(dict)
+    notSupported = pyqtSignal(str)
+    loadFailed = pyqtSignal(str)
+
+    def __init__(self, js_detail, name):
+        super().__init__()
+        self.js_detail = js_detail
+        self.name = name
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            matcher = ObservationDataMatcher(self.js_detail, self.name)
+            is_name_present, kind_value = matcher.check_name_in_page()
+            if not is_name_present:
+                if not self.cancelled:
+                    self.loadFailed.emit("Observation item not found")
+                return
+
+            data_type = get_data_type(matcher.check_data_type())
+            kind_value_int = int(kind_value)
+            data_class = get_data_class(data_type, kind_value_int)
+            if self.cancelled:
+                return
+            if data_class is None:
+                self.notSupported.emit("Not Supported Data Type" if data_type in ('SrchRainData', 'SrchWaterData') else "Not Supported Yet")
+                return
+            self.kindResolved.emit(data_type, kind_value_int)
+
+            data_handler = data_class(self.js_detail, kind_value_int)
+            if self.cancelled:
+                return
+            self.headerFetched.emit(data_handler.fetch_header_value())
+
+            table_data = data_handler.fetch_table_data()
+            if self.cancelled:
+                return
+            self.tableFetched.emit(table_data if isinstance(table_data, list) else [])
+
+            station_data = data_handler.fetch_station_data()
+            if self.cancelled:
+                return
+            self.stationFetched.emit(station_data if isinstance(station_data, dict) else {})
+
+        except Exception as e:
+            if not self.cancelled:
+                self.loadFailed.emit(str(e))
+
+# Srch*Dataの作成 (ページの取得)、範囲の検証、scrape_data_for_months/years/periodをバックグラウンドで実行
+# create_handlerはengineを受け取ってSrch*Dataを返す、resume=Trueなら完了済みの期間をスキップ
+# 範囲内にデータがなければrejected、進捗はDownloadEngineのon_progressからprogressedで送る
+class DownloadJobThread(QThread):
+    progressed = pyqtSignal(object)
+    completed = pyqtSignal()
+    cancelled = pyqtSignal()
+    failed = pyqtSignal(str)
+    rejected = pyqtSignal(str)
+
+    def __init__(self, engine, create_handler, resume=False):
+        super().__init__()
+        self.engine = engine
+        self.create_handler = create_handler
+        self.resume = resume
+        self.engine.on_progress = self.progressed.emit
+
+    def run(self):
+        try:
+            data_handler = self.create_handler(engine=self.engine)
+            data_handler.resume = self.resume
+            if not has_data_in_range(data_handler):
+                self.rejected.emit("Invalid Data range")
+                return
+
+            run_download(data_handler)
+            if self.engine.cancelled:
+                self.cancelled.emit()
+            else:
+                self.completed.emit()
+        except DownloadCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size:.0f} B"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+# data_type_codeからdata typeの確認
+def get_data_type(data_type_code):
+    data_type_mapping = {
+        0: 'SrchRainData',
+        1: 'SrchWaterData',
+        2: 'SrchWquaData',
+        3: 'SrchUWaterData',
+        4: 'SrchDamData',
+        5: 'SrchKaisyoData',
+        6: 'SrchSnowData'
+    }
+    return data_type_mapping.get(data_type_code, 'UnknownData')
+
 class DetailInfoWindow(QDialog):
     def __init__(self, parent=None, name=None, js_detail=None):
         super().__init__(parent)
@@ -21,6 +143,8 @@ class DetailInfoWindow(QDialog):
         self.valid_end_year = None
         self.start_month = None
         self.end_month = None
+        self.download_thread = None
+        self.download_panel = None
 
         self.initUI()
         self.process_data()
@@ -35,6 +159,13 @@ class DetailInfoWindow(QDialog):
         self.main_layout.addLayout(self.header_layout)
         self.main_layout.addLayout(self.additional_container)
 
+        # 取得が終わるまでのplaceholder
+        self.header_placeholder = self.create_label(LOADING_TEXT, 12, QFont.Bold)
+        self.header_layout.addWidget(self.header_placeholder)
+        self.table_placeholder = self.create_label(LOADING_TEXT, 10, QFont.Normal)
+        self.additional_container.addWidget(self.table_placeholder)
+        self.additional_container.addStretch(1)
+
 # ============================ 共通関数 ============================== #
 
     def display_station_data(self, station_data):
@@ -50,6 +181,11 @@ class DetailInfoWindow(QDialog):
 
         self.main_layout.insertLayout(1, self.station_layout)
 
+    def remove_placeholder(self, placeholder):
+        if placeholder is not None:
+            placeholder.hide()
+            placeholder.deleteLater()
+
     # tableデータを表示
     def display_table_data(self, table_data):
         self.table_widget = QTableWidget()
@@ -78,8 +214,9 @@ class DetailInfoWindow(QDialog):
         layout_height = total_height + 5
         self.table_widget.setFixedHeight(layout_height)
         self.table_widget.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.additional_container.addWidget(self.table_widget)
-        self.additional_container.addStretch(1)
+        self.additional_container.replaceWidget(self.table_placeholder, self.table_widget)
+        self.remove_placeholder(self.table_placeholder)
+        self.table_placeholder = None
 
     # date tableのための事前処理
     def prepare_table_dict(self, table_data):
@@ -94,10 +231,14 @@ class DetailInfoWindow(QDialog):
 
     # header表示
     def display_message(self, message):
+        self.remove_placeholder(self.header_placeholder)
+        self.header_placeholder = None
         message_label = self.create_label(message, 12, QFont.Bold)
         self.header_layout.addWidget(message_label)
 
     def display_header_value(self, header_value):
+        self.remove_placeholder(self.header_placeholder)
+        self.header_placeholder = None
         header_value_label = self.create_label(header_value, 12, QFont.Bold)
         header_value_label.setStyleSheet("""
             QLabel {
@@ -115,39 +256,21 @@ class DetailInfoWindow(QDialog):
         label.setFont(QFont("Arial", font_size, font_weight))
         return label
 
-    # data_type_codeからdata typeの確認
-    def get_data_type(self, data_type_code):
-        data_type_mapping = {
-            0: 'SrchRainData',
-            1: 'SrchWaterData',
-            2: 'SrchWquaData',
-            3: 'SrchUWaterData',
-            4: 'SrchDamData',
-            5: 'SrchKaisyoData',
-            6: 'SrchSnowData'
-        }
-        return data_type_mapping.get(data_type_code, 'UnknownData')
-
-    # dataの実際の配列での有効範囲検証
-    def validate_years_range(self, data_handler_class, kind_value, start_year, end_year):
-        data_handler = data_handler_class(self.js_detail, kind_value, start_year, end_year)
-        filtered_years = data_handler.filter_years()
-
-        all_years_in_range = [str(year) for year in range(start_year, end_year + 1)]
-        if not all(year in filtered_years for year in all_years_in_range):
-            QMessageBox.warning(self, "警告", "Invalid Data range")
-            return False
-        return True
-
     # data_typeの処理
+    # 取得はDetailLoaderThreadで行い、ダイアログはplaceholderのまま先に表示
     def process_data(self):
-        matcher = ObservationDataMatcher(self.js_detail, self.name)
-        is_name_present, kind_value = matcher.check_name_in_page()
-        data_type_code = matcher.check_data_type()
-
-        data_type = self.get_data_type(data_type_code)
-        kind_value_int = int(kind_value)
-
+        self.loader = DetailLoaderThread(self.js_detail, self.name)
+        self.loader.kindResolved.connect(self.on_kind_resolved)
+        self.loader.headerFetched.connect(self.display_header_value)
+        self.loader.tableFetched.connect(self.display_table_data)
+        self.loader.stationFetched.connect(self.display_station_data)
+        self.loader.notSupported.connect(self.on_load_failed)
+        self.loader.loadFailed.connect(lambda message: self.on_load_failed(f"Error: {message}"))
+        self.loader.finished.connect(lambda loader=self.loader: _running_threads.discard(loader))
+        _running_threads.add(self.loader)
+        self.loader.start()
+
+    def on_kind_resolved(self, data_type, kind_value_int):
         # SrchRainDataの処理　
         # handle_data_rainに移動
         if data_type == 'SrchRainData':
@@ -159,6 +282,135 @@ class DetailInfoWindow(QDialog):
         else:
             self.display_message("Not Supported Yet")
 
+    # header・tableのplaceholderをメッセージに置き換える
+    def on_load_failed(self, message):
+        self.display_message(message)
+        self.remove_placeholder(self.table_placeholder)
+        self.table_placeholder = None
+
+# ========================== Download Job Part ========================== #
+
+    def create_download_engine(self):
+        return DownloadEngine()
+
+    # 進捗バーと一時停止・キャンセルボタン (最初のダウンロード時に追加)
+    def create_download_panel(self):
+        self.download_panel = QVBoxLayout()
+
+        self.download_progress = QProgressBar()
+        self.download_progress.setFormat("%v/%m")
+        self.download_panel.addWidget(self.download_progress)
+
+        status_layout = QHBoxLayout()
+        self.download_status = QLabel()
+        status_layout.addWidget(self.download_status, 1)
+
+        self.pause_button = QPushButton("Pause")
+        self.pause_button.clicked.connect(self.on_pause_download)
+        status_layout.addWidget(self.pause_button)
+
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.on_cancel_download)
+        status_layout.addWidget(self.cancel_button)
+
+        self.download_panel.addLayout(status_layout)
+        self.additional_container.addLayout(self.download_panel)
+
+    # range_argsはdata_classのkind_valueより後の引数 (開始・終了の年月)
+    # 範囲内の一部の年にだけデータがある場合は通し、データのある年だけをダウンロード
+    def start_download(self, data_class, kind_value, *range_args):
+        if self.download_thread is not None:
+            return
+        if self.download_panel is None:
+            self.create_download_panel()
+
+        self.download_progress.setRange(0, 0)
+        self.download_status.setText("Starting...")
+        self.pause_button.setText("Pause")
+        self.pause_button.setEnabled(True)
+        self.cancel_button.setEnabled(True)
+        self.confirm_button.setEnabled(False)
+
+        self.download_thread = DownloadJobThread(self.create_download_engine(), partial(data_class, self.js_detail, kind_value, *range_args),
+                                                 resume=self.resume_check_box.isChecked())
+        self.download_thread.progressed.connect(self.on_download_progress)
+        self.download_thread.completed.connect(self.on_download_completed)
+        self.download_thread.cancelled.connect(self.on_download_cancelled)
+        self.download_thread.failed.connect(self.on_download_failed)
+        self.download_thread.rejected.connect(self.on_download_rejected)
+        self.download_thread.finished.connect(lambda thread=self.download_thread: _running_threads.discard(thread))
+        _running_threads.add(self.download_thread)
+        self.download_thread.start()
+
+    def on_download_progress(self, progress):
+        if progress.jobs_total:
+            self.download_progress.setRange(0, progress.jobs_total)
+            self.download_progress.setValue(progress.jobs_done)
+
+        status = f"{format_bytes(progress.total_bytes)}  {format_bytes(progress.bytes_per_second)}/s"
+        if progress.file_name:
+            status = f"{progress.file_name} ({format_bytes(progress.file_bytes)})  " + status
+        if progress.eta is not None:
+            minutes, seconds = divmod(int(progress.eta), 60)
+            status += f"  ETA {minutes:02d}:{seconds:02d}"
+        if progress.paused:
+            status += "  (paused)"
+        self.download_status.setText(status)
+
+    def on_pause_download(self):
+        engine = self.download_thread.engine
+        if engine.paused:
+            engine.resume()
+            self.pause_button.setText("Pause")
+        else:
+            engine.pause()
+            self.pause_button.setText("Resume")
+
+    def on_cancel_download(self):
+        self.download_thread.engine.cancel()
+        self.pause_button.setEnabled(False)
+        self.cancel_button.setEnabled(False)
+        self.download_status.setText("Cancelling...")
+
+    def finish_download(self, message):
+        self.download_thread = None
+        self.download_status.setText(message)
+        self.pause_button.setEnabled(False)
+        self.cancel_button.setEnabled(False)
+        self.confirm_button.setEnabled(True)
+
+    def on_download_completed(self):
+        self.download_progress.setValue(self.download_progress.maximum())
+        self.finish_download("Download complete")
+        QMessageBox.information(self, "Download Complete", "Data download completed successfully.")
+
+    def on_download_cancelled(self):
+        self.finish_download("Download cancelled")
+
+    def on_download_failed(self, message):
+        self.finish_download(f"Download failed: {message}")
+        QMessageBox.warning(self, "警告", f"Download failed: {message}")
+
+    def on_download_rejected(self, message):
+        self.download_progress.setRange(0, 1)
+        self.finish_download(message)
+        QMessageBox.warning(self, "警告", message)
+
+    # 閉じたら残りの取得結果は捨て、ダウンロードもキャンセル
+    def done(self, result):
+        if self.download_thread is not None:
+            self.download_thread.engine.cancel()
+            for signal in (self.download_thread.progressed, self.download_thread.completed,
+                           self.download_thread.cancelled, self.download_thread.failed, self.download_thread.rejected):
+                signal.disconnect()
+            self.download_thread = None
+        if not self.loader.cancelled:
+            self.loader.cancel()
+            for signal in (self.loader.kindResolved, self.loader.headerFetched, self.loader.tableFetched,
+                           self.loader.stationFetched, self.loader.notSupported, self.loader.loadFailed):
+                signal.disconnect()
+        super().done(result)
+
 # ========================= SrchWaterData Part ========================== #
 
     # this is not best way, which mean this code 'WIS_DetailInfoWindow.py hav to changed for DRY and SOLID Principle for program optimization
@@ -166,82 +418,33 @@ class DetailInfoWindow(QDialog):
     
     @data_type_decorator(data_type="water")
     def handle_data_water(self, kind_value_int, data_class_prefix):
-        data_class = lambda x: globals()[f'{data_class_prefix}_{x}']
-        
         if kind_value_int == 1:
-            self.handle_specific_data_water(data_class(1), kind_value_int, self.valid_start_year, self.start_month, self.valid_end_year, self.end_month)
             self.add_date_input_fields_water_1()
 
         elif kind_value_int == 2:
-            self.handle_specific_data_water(data_class(2), kind_value_int, self.valid_start_year, self.start_month, self.valid_end_year, self.end_month)
             self.add_date_input_fields_water_2()
         
         elif kind_value_int == 3:
-            self.handle_specific_data_water(data_class(3), kind_value_int, self.valid_start_year, self.valid_end_year)
             self.add_date_input_fields_water_3()
         
         elif kind_value_int == 4:
-            self.handle_specific_data_water(data_class(4), kind_value_int, self.valid_start_year, self.valid_end_year)
             self.add_date_input_fields_water_4()
 
         elif kind_value_int == 5:
-            self.handle_specific_data_water(data_class(5), kind_value_int, self.valid_start_year, self.start_month, self.valid_end_year, self.end_month)
             self.add_date_input_fields_water_5()
 
         elif kind_value_int == 6:
-            self.handle_specific_data_water(data_class(6), kind_value_int, self.valid_start_year, self.start_month, self.valid_end_year, self.end_month)
             self.add_date_input_fields_water_6()
 
         elif kind_value_int == 7:
-            self.handle_specific_data_water(data_class(7), kind_value_int, self.valid_start_year, self.valid_end_year)
             self.add_date_input_fields_water_7()
         
         elif kind_value_int == 8:
-            self.handle_specific_data_water(data_class(8), kind_value_int, self.valid_start_year, self.valid_end_year)
             self.add_date_input_fields_water_8()
         
         else:
             self.display_message("Not Supported Data Type")
 
-    @data_type_decorator(data_type="water")
-    def handle_specific_data_water(self, DataClass, kind_value_int, start_year=None, end_year=None, start_month=None, end_month=None, data_class_prefix=None):
-        if DataClass == globals()[f'{data_class_prefix}_1']:
-            data_handler = DataClass(self.js_detail, kind_value_int, start_year, start_month, end_year, end_month)
-
-        elif DataClass == globals()[f'{data_class_prefix}_2']:
-            data_handler = DataClass(self.js_detail, kind_value_int, start_year, start_month, end_year, end_month)
-        
-        elif DataClass == globals()[f'{data_class_prefix}_3']:
-            data_handler = DataClass(self.js_detail, kind_value_int, start_year, end_year)
-        
-        elif DataClass == globals()[f'{data_class_prefix}_4']:
-            data_handler = DataClass(self.js_detail, kind_value_int, start_year, end_year)
-
-        elif DataClass == globals()[f'{data_class_prefix}_5']:
-            data_handler = DataClass(self.js_detail, kind_value_int, start_year, start_month, end_year, end_month)
-
-        elif DataClass == globals()[f'{data_class_prefix}_6']:
-            data_handler = DataClass(self.js_detail, kind_value_int, start_year, start_month, end_year, end_month)
-
-        elif DataClass == globals()[f'{data_class_prefix}_7']:
-            data_handler = DataClass(self.js_detail, kind_value_int, start_year, end_year)
-
-        elif DataClass == globals()[f'{data_class_prefix}_8']:
-            data_handler = DataClass(self.js_detail, kind_value_int, start_year, end_year)
-        
-        else:
-            self.display_message("Not Supported Data Type")
-            return
-
-        header_value = data_handler.fetch_header_value()
-        self.display_header_value(header_value)
-
-        table_data = data_handler.fetch_table_data()
-        self.display_table_data(table_data)
-
-        station_data = data_handler.fetch_station_data()
-        self.display_station_data(station_data)
-
     # SrchwaterData_1
     @date_input(input_type='date')
     def add_date_input_fields_water_1(self):
@@ -250,13 +453,7 @@ class DetailInfoWindow(QDialog):
 
     @data_confirm(data_type='date')
     def on_data_confirm_water_1(self, start_year, end_year, start_month, end_month):
-        if not self.validate_years_range(SrchWaterData_1, 1, start_year, end_year):
-            return
-        
-        data_handler = SrchWaterData_1(self.js_detail, 1, start_year, start_month, end_year, end_month)
-        data_handler.scrape_data_for_months()
-
-        QMessageBox.information(self, "Download Complete", "Data download completed successfully.")
+        self.start_download(SrchWaterData_1, 1, start_year, start_month, end_year, end_month)
 
     # SrchwaterData_2
     @date_input(input_type='date')
@@ -266,13 +463,7 @@ class DetailInfoWindow(QDialog):
 
     @data_confirm(data_type='date')
     def on_data_confirm_water_2(self, start_year, end_year, start_month, end_month):
-        if not self.validate_years_range(SrchWaterData_2, 2, start_year, end_year):
-            return
-
-        data_handler = SrchWaterData_2(self.js_detail, 2, start_year, start_month, end_year, end_month)
-        data_handler.scrape_data_for_months()
-
-        QMessageBox.information(self, "Download Complete", "Data download completed successfully.")
+        self.start_download(SrchWaterData_2, 2, start_year, start_month, end_year, end_month)
 
     # SrchwaterData_3
     @date_input(input_type='year')
@@ -282,13 +473,7 @@ class DetailInfoWindow(QDialog):
     
     @data_confirm(data_type='year')
     def on_data_confirm_water_3(self, start_year, end_year, start_month=None, end_month=None):
-        if not self.validate_years_range(SrchWaterData_3, 3, start_year, end_year):
-            return
-
-        data_handler = SrchWaterData_3(self.js_detail, 3, start_year, end_year)
-        data_handler.scrape_data_for_years()
-
-        QMessageBox.information(self, "Download Complete", "Data download completed successfully.")
+        self.start_download(SrchWaterData_3, 3, start_year, end_year)
 
     # SrchwaterData_4
     @date_input(input_type='year')
@@ -298,13 +483,7 @@ class DetailInfoWindow(QDialog):
 
     @data_confirm(data_type='year')
     def on_data_confirm_water_4(self, start_year, end_year, start_month=None, end_month=None):
-        if not self.validate_years_range(SrchWaterData_4, 4, start_year, end_year):
-            return
-        
-        data_handler = SrchWaterData_4(self.js_detail, 4, start_year, end_year)
-        data_handler.scrape_data_for_period()
-        
-        QMessageBox.information(self, "Download Complete", "Data download completed successfully.")
+        self.start_download(SrchWaterData_4, 4, start_year, end_year)
 
     # SrchwaterData_5
     @date_input(input_type='date')
@@ -314,13 +493,7 @@ class DetailInfoWindow(QDialog):
 
     @data_confirm(data_type='date')
     def on_data_confirm_water_5(self, start_year, end_year, start_month, end_month):
-        if not self.validate_years_range(SrchWaterData_5, 5, start_year, end_year):
-            return
-        
-        data_handler = SrchWaterData_5(self.js_detail, 5, start_year, start_month, end_year, end_month)
-        data_handler.scrape_data_for_months()
-
-        QMessageBox.information(self, "Download Complete", "Data download completed successfully.")
+        self.start_download(SrchWaterData_5, 5, start_year, start_month, end_year, end_month)
 
     # SrchwaterData_6
     @date_input(input_type='date')
@@ -330,13 +503,7 @@ class DetailInfoWindow(QDialog):
 
     @data_confirm(data_type='date')
     def on_data_confirm_water_6(self, start_year, end_year, start_month, end_month):
-        if not self.validate_years_range(SrchWaterData_6, 6, start_year, end_year):
-            return
-
-        data_handler = SrchWaterData_6(self.js_detail, 6, start_year, start_month, end_year, end_month)
-        data_handler.scrape_data_for_months()
-
-        QMessageBox.information(self, "Download Complete", "Data download completed successfully.")
+        self.start_download(SrchWaterData_6, 6, start_year, start_month, end_year, end_month)
 
     # SrchwaterData_7
     @date_input(input_type='year')
@@ -346,13 +513,7 @@ class DetailInfoWindow(QDialog):
     
     @data_confirm(data_type='year')
     def on_data_confirm_water_7(self, start_year, end_year, start_month=None, end_month=None):
-        if not self.validate_years_range(SrchWaterData_7, 7, start_year, end_year):
-            return
-
-        data_handler = SrchWaterData_7(self.js_detail, 7, start_year, end_year)
-        data_handler.scrape_data_for_years()
-
-        QMessageBox.information(self, "Download Complete", "Data download completed successfully.")
+        self.start_download(SrchWaterData_7, 7, start_year, end_year)
 
     # SrchwaterData_8
     @date_input(input_type='year')
@@ -362,71 +523,30 @@ class DetailInfoWindow(QDialog):
 
     @data_confirm(data_type='year')
     def on_data_confirm_water_8(self, start_year, end_year, start_month=None, end_month=None):
-        if not self.validate_years_range(SrchWaterData_8, 8, start_year, end_year):
-            return
-        
-        data_handler = SrchWaterData_8(self.js_detail, 8, start_year, end_year)
-        data_handler.scrape_data_for_period()
-        
-        QMessageBox.information(self, "Download Complete", "Data download completed successfully.")
+        self.start_download(SrchWaterData_8, 8, start_year, end_year)
 
 # ========================== SrchRainData Part ========================== #
 
     # SrchRainDataのデータ処理、
-    # process_dataから移動、handle_specific_data_rainに移動
+    # process_dataから移動、データの種類ごとの入力欄を追加
     @data_type_decorator(data_type="rain")
     def handle_data_rain(self, kind_value_int, data_class_prefix):
-        data_class = lambda x: globals()[f'{data_class_prefix}_{x}']
-        
         if kind_value_int == 1:
-            self.handle_specific_data_rain(data_class(1), kind_value_int, self.valid_start_year, self.start_month, self.valid_end_year, self.end_month)
             self.add_date_input_fields_rain_1()
 
         elif kind_value_int == 2:
-            self.handle_specific_data_rain(data_class(2), kind_value_int, self.valid_start_year, self.start_month, self.valid_end_year, self.end_month)
             self.add_date_input_fields_rain_2()
         
         elif kind_value_int == 3:
-            self.handle_specific_data_rain(data_class(3), kind_value_int, self.valid_start_year, self.valid_end_year)
             self.add_date_input_fields_rain_3()
         
         elif kind_value_int == 4:
-            self.handle_specific_data_rain(data_class(4), kind_value_int, self.valid_start_year, self.valid_end_year)
             self.add_date_input_fields_rain_4()
 
         else:
             self.display_message("Not Supported Data Type")
             return
 
-    # start_yearやend_yearなどのDataClassにより異なるロジックを処理
-    # handle_data_rainから移動
-
-    @data_type_decorator(data_type="rain")
-    def handle_specific_data_rain(self, DataClass, kind_value_int, start_year=None, end_year=None, start_month=None, end_month=None, data_class_prefix=None):
-        if DataClass == globals()[f'{data_class_prefix}_1']:
-            data_handler = DataClass(self.js_detail, kind_value_int, start_year, start_month, end_year, end_month)
-
-        elif DataClass == globals()[f'{data_class_prefix}_2']:
-            data_handler = DataClass(self.js_detail, kind_value_int, start_year, start_month, end_year, end_month)
-        
-        elif DataClass == globals()[f'{data_class_prefix}_3']:
-            data_handler = DataClass(self.js_detail, kind_value_int, start_year, end_year)
-        
-        elif DataClass == globals()[f'{data_class_prefix}_4']:
-            data_handler = DataClass(self.js_detail, kind_value_int, start_year, end_year)
-        
-        else:
-            data_handler = DataClass(self.js_detail, kind_value_int)
-
-        header_value = data_handler.fetch_header_value()
-        self.display_header_value(header_value)
-
-        table_data = data_handler.fetch_table_data()
-        self.display_table_data(table_data)
-
-        station_data = data_handler.fetch_station_data()
-        self.display_station_data(station_data)
-
     # SrchRainData_1
     @date_input(input_type='date')
     def add_date_input_fields_rain_1(self):
@@ -435,13 +555,7 @@ class DetailInfoWindow(QDialog):
 
     @data_confirm(data_type='date')
     def on_data_confirm_rain_1(self, start_year, end_year, start_month, end_month):
-        if not self.validate_years_range(SrchRainData_1, 1, start_year, end_year):
-            return
-
-        data_handler = SrchRainData_1(self.js_detail, 1, start_year, start_month, end_year, end_month)
-        data_handler.scrape_data_for_months()
-
-        QMessageBox.information(self, "Download Complete", "Data download completed successfully.")
+        self.start_download(SrchRainData_1, 1, start_year, start_month, end_year, end_month)
 
     # SrchRainData_2
     @date_input(input_type='date')
@@ -451,13 +565,7 @@ class DetailInfoWindow(QDialog):
 
     @data_confirm(data_type='date')
     def on_data_confirm_rain_2(self, start_year, end_year, start_month, end_month):
-        if not self.validate_years_range(SrchRainData_2, 2, start_year, end_year):
-            return
-        
-        data_handler = SrchRainData_2(self.js_detail, 2, start_year, start_month, end_year, end_month)
-        data_handler.scrape_data_for_months()
-
-        QMessageBox.information(self, "Download Complete", "Data download completed successfully.")
+        self.start_download(SrchRainData_2, 2, start_year, start_month, end_year, end_month)
 
     # SrchRainData_3
     @date_input(input_type='year')
@@ -467,13 +575,7 @@ class DetailInfoWindow(QDialog):
     
     @data_confirm(data_type='year')
     def on_data_confirm_rain_3(self, start_year, end_year, start_month=None, end_month=None):
-        if not self.validate_years_range(SrchRainData_3, 3, start_year, end_year):
-            return
-
-        data_handler = SrchRainData_3(self.js_detail, 3, start_year, end_year)
-        data_handler.scrape_data_for_years()
-
-        QMessageBox.information(self, "Download Complete", "Data download completed successfully.")
+        self.start_download(SrchRainData_3, 3, start_year, end_year)
 
     # SrchRainData_4
     @date_input(input_type='year')
@@ -483,13 +585,7 @@ class DetailInfoWindow(QDialog):
 
     @data_confirm(data_type='year')
     def on_data_confirm_rain_4(self, start_year, end_year, start_month=None, end_month=None):
-        if not self.validate_years_range(SrchRainData_4, 4, start_year, end_year):
-            return
-        
-        data_handler = SrchRainData_4(self.js_detail, 4, start_year, end_year)
-        data_handler.scrape_data_for_period()
-        
-        QMessageBox.information(self, "Download Complete", "Data download completed successfully.")
+        self.start_download(SrchRainData_4, 4, start_year, end_year)
 
 # ======================================================================= #
 
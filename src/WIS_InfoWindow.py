@@ -4,55 +4,64 @@
 import sys
 import datetime
 import json
-import re
 import requests
-import markdown
-import zipfile
-import shutil
 import os
-import subprocess
 
 from functools import lru_cache
 from PyQt5.QtWidgets import (
                             QApplication, QWidget, QPushButton, QVBoxLayout, QHBoxLayout,
-                            QTableWidget, QTableWidgetItem, QTextEdit, QSplitter, QLineEdit,
+                            QTableWidget, QTableWidgetItem, QTableView, QTextEdit, QSplitter, QLineEdit,
                             QLabel, QComboBox, QMessageBox, QTabWidget, QTabBar, 
-                            QDialog, QGroupBox, QSizePolicy, QProgressBar, QProgressDialog
+                            QDialog, QGroupBox, QSizePolicy, QProgressBar, QProgressDialog, QCheckBox
                             )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QSize, QUrl, QTimer
-from PyQt5.QtGui import QColor, QPixmap, QDesktopServices
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QUrl, QTimer
+from PyQt5.QtGui import QPixmap, QDesktopServices
+from PyQt5 import sip
 
+from http_session import get_session
 from getWISInfo import RiverDataScraper
-from getDetailInfo import DetailInfoScraper, MapImageScraper, SiteHtmlChecker
+from station_table_model import StationTableModel, DetailButtonDelegate, DETAIL_COLUMN
+from getDetailInfo import DetailInfoScraper
+from map_image_loader import MapImageLoader, MAP_IMAGE_SIZE
 from getObservedInfo import ObservedInfoScraper
-from WIS_DetailInfoWindow import DetailInfoWindow  
-from update_manager import UpdateChecker, DownloadProgressDialog, DownloadThread
+from update_manager import UpdateChecker, UpdateCheckThread, DownloadProgressDialog, DownloadThread
+
+SEARCH_DEBOUNCE_MSEC = 250
 
 class CrawlerThread(QThread):
     dataFetched = pyqtSignal(list, bool)
+    pageFetched = pyqtSignal(int, list)
+    allPagesFetched = pyqtSignal(int)
     updateLog = pyqtSignal(str)
 
-    def __init__(self, ken_code, suikei_code, komoku_code, scraper):
+    def __init__(self, ken_code, suikei_code, komoku_code, scraper, all_pages=False):
         super().__init__()
         self.ken_code = ken_code
         self.suikei_code = suikei_code
         self.komoku_code = komoku_code
         self.scraper = scraper
+        self.all_pages = all_pages
 
     def run(self):
         try:
-            if not self.is_server_connected():
-                self.updateLog.emit("ERROR - Unable to Connect to the Server")
-                return
+            # 先読み済みのページはサーバーの接続確認を省略
+            is_cached = self.scraper.is_page_cached(self.ken_code, self.suikei_code, self.komoku_code, self.scraper.page_number)
+            if not is_cached:
+                if not self.is_server_connected():
+                    self.updateLog.emit("ERROR - Unable to Connect to the Server")
+                    return
 
-            self.updateLog.emit("INFO - Connected Successfully to the Server")
+                self.updateLog.emit("INFO - Connected Successfully to the Server")
 
             start_time = datetime.datetime.now()
             self.updateLog.emit(f"INFO - Data request at: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
 
-            self.scraper.scrape_data(self.ken_code, self.suikei_code, self.komoku_code)
-            data_empty = len(self.scraper.data) == 0
-            self.dataFetched.emit(self.scraper.data, data_empty) 
+            if self.all_pages:
+                self.fetch_all_pages()
+            else:
+                self.scraper.scrape_data(self.ken_code, self.suikei_code, self.komoku_code)
+                data_empty = len(self.scraper.data) == 0
+                self.dataFetched.emit(self.scraper.data, data_empty) 
 
             end_time = datetime.datetime.now()
             self.updateLog.emit(f"INFO - Ended at: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
@@ -61,9 +70,19 @@ class CrawlerThread(QThread):
         except Exception as e:
             self.updateLog.emit(f"ERROR - Data Fetching Failed: {e}")
 
+    # 空のページまで全ページを取得し、ページごとにtableへ送る
+    def fetch_all_pages(self):
+        page_count = 0
+        for page_number, rows in self.scraper.iter_all_pages(self.ken_code, self.suikei_code, self.komoku_code):
+            page_count += 1
+            self.pageFetched.emit(page_number, rows)
+            self.updateLog.emit(f"INFO - Page {page_number + 1}: {len(rows)} rows")
+
+        self.allPagesFetched.emit(page_count)
+
     def is_server_connected(self):
         try:
-            response = requests.get("http://www1.river.go.jp", timeout=5)
+            response = get_session().get("http://www1.river.go.jp", timeout=5)
             return True if response.status_code == 200 else False
         
         except requests.ConnectionError:
@@ -102,6 +121,9 @@ class LegalNoticeDialog(QDialog):
 
         layout = QVBoxLayout(self)
 
+        # markdownは初めてLegal Noticeを開いたときにimport
+        import markdown
+
         with open('OPEN_SOURCE_LICENSES.md', 'r', encoding='utf-8') as file:
             license_text = file.read()
             html_text = markdown.markdown(license_text)
@@ -123,18 +145,33 @@ class App(QWidget):
         self.height = 650
         self.searchResults = []  
         self.searchIndex = -1 
+        self.mapImageLoaders = set()
+
+        # 入力が止まってからSEARCH_DEBOUNCE_MSEC後に検索
+        self.searchTimer = QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(SEARCH_DEBOUNCE_MSEC)
+        self.searchTimer.timeout.connect(lambda: self.on_search(show_no_result=False))
+
         self.logViewer = QTextEdit()
         self.logViewer.setMinimumHeight(int(self.height * 0.25))
-        self.scraper = RiverDataScraper("http://www1.river.go.jp/cgi-bin/SrchSite.exe", 
-                                        "./json/ken_values.json", "./json/suikei_values.json", "./json/komoku_values.json")
+        self.scraper = None
         self.version = self.read_version_file()
-        QTimer.singleShot(0, self.check_update)
         self.pageNumberLabel = QLabel("1")
 
         self.update_checker = UpdateChecker('VERSION', 'https://raw.githubusercontent.com/refiaa/WIS_Scraper/main/VERSION')
         
         self.initUI()
 
+        # JSONの読み込みと更新確認はウィンドウを表示してから行う
+        QTimer.singleShot(0, self.initDeferred)
+
+    def initDeferred(self):
+        self.loadComboBoxData()
+        self.scraper = RiverDataScraper("http://www1.river.go.jp/cgi-bin/SrchSite.exe", 
+                                        "./json/ken_values.json", "./json/suikei_values.json", "./json/komoku_values.json")
+        self.check_update()
+
     def initUI(self):
         self.setWindowTitle(self.title)
         self.setGeometry(self.left, self.top, self.width, self.height)
@@ -201,7 +238,6 @@ class App(QWidget):
         self.suikeiComboBox = QComboBox()
         self.komokuComboBox = QComboBox()
         
-        self.loadComboBoxData() 
 
         layout.addWidget(self.kenComboBox)
         layout.addWidget(self.suikeiComboBox)
@@ -212,6 +248,10 @@ class App(QWidget):
         self.startButton.setFixedWidth(60)
         layout.addWidget(self.startButton)
 
+        self.allPagesCheckBox = QCheckBox('全ページ')
+        self.allPagesCheckBox.stateChanged.connect(self.on_all_pages_toggled)
+        layout.addWidget(self.allPagesCheckBox)
+
         self.resetSearchButton = QPushButton('クリア')
         self.resetSearchButton.clicked.connect(self.reset_search)
         self.resetSearchButton.setFixedWidth(60)
@@ -259,10 +299,12 @@ class App(QWidget):
 
         self.searchField = QLineEdit()
         self.searchField.setPlaceholderText("ページ内検索...")
+        self.searchField.textChanged.connect(self.on_search_text_changed)
+        self.searchField.returnPressed.connect(self.on_search)
         searchLayout.addWidget(self.searchField)
 
         self.searchButton = QPushButton('検索')
-        self.searchButton.clicked.connect(self.on_search)
+        self.searchButton.clicked.connect(lambda: self.on_search())
         self.searchButton.setFixedWidth(60)
         searchLayout.addWidget(self.searchButton)
 
@@ -298,17 +340,17 @@ class App(QWidget):
 
         bottomLayout.addWidget(pageNumberContainer)
 
-        prev_page = QPushButton('前')
-        prev_page.setFixedWidth(40)
+        self.prevPageButton = QPushButton('前')
+        self.prevPageButton.setFixedWidth(40)
 
-        next_page = QPushButton('次')
-        next_page.setFixedWidth(40)
+        self.nextPageButton = QPushButton('次')
+        self.nextPageButton.setFixedWidth(40)
 
-        prev_page.clicked.connect(self.on_prev_page)
-        next_page.clicked.connect(self.on_next_page)
+        self.prevPageButton.clicked.connect(self.on_prev_page)
+        self.nextPageButton.clicked.connect(self.on_next_page)
 
-        bottomLayout.addWidget(prev_page)
-        bottomLayout.addWidget(next_page)
+        bottomLayout.addWidget(self.prevPageButton)
+        bottomLayout.addWidget(self.nextPageButton)
 
         bottomContainer = QWidget()
         bottomContainer.setLayout(bottomLayout)
@@ -326,11 +368,16 @@ class App(QWidget):
         self.tabWidget.addTab(crawlingTab, "WIS Info Searcher")
 
     def addCrawlingTableAndLog(self, layout):
-        self.tableWidget = QTableWidget()
-        self.tableWidget.setRowCount(0)
-        self.tableWidget.setColumnCount(5)
-        self.tableWidget.setHorizontalHeaderLabels(['項目', '水系名', '河川名', '観測所名', '所在地', '詳細'])
-        layout.addWidget(self.tableWidget) 
+        self.tableModel = StationTableModel(self)
+        self.detailDelegate = DetailButtonDelegate(self)
+        self.detailDelegate.clicked.connect(self.onDetailButtonClicked)
+
+        self.tableView = QTableView()
+        self.tableView.setModel(self.tableModel)
+        self.tableView.setItemDelegateForColumn(DETAIL_COLUMN, self.detailDelegate)
+        self.tableView.setMouseTracking(True)
+        self.tableView.verticalHeader().setDefaultSectionSize(30)
+        layout.addWidget(self.tableView) 
 
     def loadComboBoxData(self):
         self.kenData = self.loadJsonData('./json/ken_values.json')
@@ -359,8 +406,13 @@ class App(QWidget):
         suikei_code = self.suikeiData[selected_suikei]
         komoku_code = self.komokuData[selected_komoku] 
         
-        self.crawlerThread = CrawlerThread(ken_code, suikei_code, komoku_code, self.scraper)
+        all_pages = self.allPagesCheckBox.isChecked()
+        self.crawlerThread = CrawlerThread(ken_code, suikei_code, komoku_code, self.scraper, all_pages=all_pages)
         self.crawlerThread.dataFetched.connect(self.updateTable)
+        if all_pages:
+            self.clearTable()
+            self.crawlerThread.pageFetched.connect(self.appendPageRows)
+            self.crawlerThread.allPagesFetched.connect(self.onAllPagesFetched)
         self.crawlerThread.updateLog.connect(self.updateLog)
         self.crawlerThread.start()
 
@@ -373,28 +425,8 @@ class App(QWidget):
                 self.on_click()
             return
 
-        self.tableWidget.setRowCount(0)
-        self.tableWidget.setColumnCount(6)
-        self.tableWidget.setHorizontalHeaderLabels(['項目', '水系名', '河川名', '観測所名', '所在地', '詳細'])
-
-        row_count = 0
-        valid_data_found = False
-
-        for row_data in data:
-            javascript_detail = row_data[7] if len(row_data) > 7 else None
-
-            if javascript_detail and any(row_data[1:6]):
-                valid_data_found = True
-                self.tableWidget.insertRow(row_count)
-                for j in range(1, 6):
-                    item = QTableWidgetItem(str(row_data[j]))
-                    item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
-                    self.tableWidget.setItem(row_count, j - 1, item)
-
-                btn = QPushButton('詳細情報')
-                btn.clicked.connect(lambda checked, js_detail=javascript_detail: self.onDetailButtonClicked(js_detail))
-                self.tableWidget.setCellWidget(row_count, 5, btn)
-                row_count += 1
+        self.clearTable()
+        valid_data_found = self.appendTableRows(data) > 0
 
         if not valid_data_found:
             QMessageBox.information(self, "No Data", "データが存在しません")
@@ -403,14 +435,28 @@ class App(QWidget):
                 self.update_page_number_label()
                 self.on_click()
 
+    def clearTable(self):
+        self.tableModel.clear()
+
+    # 既存の行は残したまま末尾に追加し、追加した行数を返す
+    def appendTableRows(self, data):
+        return self.tableModel.append_rows(data)
 
-    def onDetailButtonClicked(self, javascript_detail):
+    def appendPageRows(self, page_number, rows):
+        self.appendTableRows(rows)
+        self.pageNumberLabel.setText(f"1-{page_number + 1}")
+
+    def onAllPagesFetched(self, page_count):
+        if self.tableModel.total_rows() == 0:
+            QMessageBox.information(self, "No Data", "データが存在しません")
+        self.updateLog(f"INFO - {page_count} pages, {self.tableModel.total_rows()} rows")
+
+    def onDetailButtonClicked(self, row):
         execute_time = datetime.datetime.now()
-        current_row = self.tableWidget.currentRow()
-        river_name_item = self.tableWidget.item(current_row, 2)
-        river_name = river_name_item.text() if river_name_item else "Unknown"
-        observation_site_name_item = self.tableWidget.item(current_row, 3)
-        observation_site_name = observation_site_name_item.text() if observation_site_name_item else "Unknown"
+        row_data = self.tableModel.row_data(row)
+        javascript_detail = row_data[7]
+        river_name = row_data[3] or "Unknown"
+        observation_site_name = row_data[4] or "Unknown"
 
         tabTitle = f"詳細情報 - {river_name} ({observation_site_name})"
         self.updateLog(f"INFO - Access to {river_name} ({observation_site_name}) at: {execute_time.strftime('%Y-%m-%d %H:%M:%S')} ")
@@ -452,39 +498,21 @@ class App(QWidget):
         formatted_data += "</table>"
 
         javascript_detail = data.get('観測所記号', '')
-        checker = SiteHtmlChecker(javascript_detail)
-        has_image = checker.check_for_image()
 
         imageGroupBox = QGroupBox("位置図")
         imageLayout = QVBoxLayout()
-        
-        image_label = QLabel()
-        pixmap = QPixmap()
-
-        if has_image:
-            coord_string = data.get('緯度経度', '')
-            latitude, longitude = self.extractCoords(coord_string)
-            map_image_scraper = MapImageScraper(javascript_detail, latitude, longitude)
-            image_url = map_image_scraper.scrape_image_url()
-        else:
-            image_url = "./img/noImage.png"
 
-        image_label = QLabel()
-        pixmap = QPixmap()
+        # 位置図は別スレッドで取得 (縮小済みの画像は./cache/mapから読む)
+        image_label = QLabel("読み込み中...")
+        image_label.setAlignment(Qt.AlignCenter)
+        image_label.setMinimumSize(MAP_IMAGE_SIZE)
 
-        desired_width = 400  
-        desired_height = 300 
+        loader = MapImageLoader(javascript_detail, data.get('緯度経度', ''))
+        loader.imageLoaded.connect(lambda image: self.displayMapImage(image, image_label))
+        loader.finished.connect(lambda: self.mapImageLoaders.discard(loader))
+        self.mapImageLoaders.add(loader)
+        loader.start()
 
-        if has_image:
-            response = requests.get(image_url)
-            if response.status_code == 200:
-                pixmap.loadFromData(response.content)
-                pixmap = pixmap.scaled(QSize(desired_width, desired_height), Qt.KeepAspectRatio)
-        else:
-            pixmap.load(image_url)
-            pixmap = pixmap.scaled(QSize(desired_width, desired_height), Qt.KeepAspectRatio)
-
-        image_label.setPixmap(pixmap)
         imageLayout.addWidget(image_label)
         imageGroupBox.setLayout(imageLayout)
 
@@ -494,16 +522,12 @@ class App(QWidget):
 
         detailViewer.setLayout(layout)
 
+    # 画像の取得中にタブが閉じられた場合は何もしない
     @staticmethod
-    def extractCoords(coord_string):
-        degrees = [int(match) for match in re.findall(r'(\d+)度', coord_string)]
-        minutes = [int(match) for match in re.findall(r'(\d+)分', coord_string)]
-        seconds = [int(match) for match in re.findall(r'(\d+)秒', coord_string)]
-
-        latitude = f"{str(degrees[0]).zfill(3)}{str(minutes[0]).zfill(2)}{str(seconds[0]).zfill(2)}000"
-        longitude = f"{str(degrees[1]).zfill(3)}{str(minutes[1]).zfill(2)}{str(seconds[1]).zfill(2)}000"
-
-        return latitude, longitude
+    def displayMapImage(image, image_label):
+        if sip.isdeleted(image_label):
+            return
+        image_label.setPixmap(QPixmap.fromImage(image))
 
     def displayObservedInfo(self, data, javascript_detail):
         currentTabIndex = self.tabWidget.currentIndex()
@@ -540,6 +564,8 @@ class App(QWidget):
         currentTab.layout().addWidget(splitter)
 
     def onStatusButtonClicked(self, key, javascript_detail):
+        from WIS_DetailInfoWindow import DetailInfoWindow
+
         dialog = DetailInfoWindow(self, key, javascript_detail)
         dialog.exec_()
 
@@ -547,7 +573,7 @@ class App(QWidget):
         execute_time = datetime.datetime.now()
 
         self.searchField.clear()
-        self.tableWidget.setRowCount(0)
+        self.tableModel.clear()
         self.searchResults = []
         self.update_search_count()
 
@@ -569,31 +595,23 @@ class App(QWidget):
     def updateLog(self, message):
         self.logViewer.append(message)
 
-    def on_search(self):
-        search_text = self.searchField.text().lower()
-        if not search_text:
-            return
+    def on_search_text_changed(self, text):
+        self.searchTimer.start()
 
-        self.searchResults = []
+    # 検索は表示行の読み込み時に作ったn-gram indexを使う
+    def on_search(self, show_no_result=True):
+        self.searchTimer.stop()
+        search_text = self.searchField.text()
+
+        self.searchResults = self.tableModel.find(search_text) if search_text else []
         self.searchIndex = -1
-        match_found = False
-
-        for row in range(self.tableWidget.rowCount()):
-            for column in range(self.tableWidget.columnCount()):
-                if column == 5:
-                    continue
-                item = self.tableWidget.item(row, column)
-                if item and search_text in item.text().lower():
-                    self.searchResults.append((row, column))
-                    item.setBackground(QColor('yellow'))
-                    match_found = True
-                elif item:
-                    item.setBackground(QColor('white'))
-
-        if not match_found:
-            QMessageBox.information(self, "No Results", "一致なし")
-        else:
+
+        if self.searchResults:
             self.jump_to_first_search_result()
+        else:
+            self.tableModel.set_highlights([])
+            if search_text and show_no_result:
+                QMessageBox.information(self, "No Results", "一致なし")
 
         self.update_search_count()
 
@@ -613,13 +631,11 @@ class App(QWidget):
             self.highlight_search_result()
 
     def highlight_search_result(self):
-        for row, column in self.searchResults:
-            self.tableWidget.item(row, column).setBackground(QColor('white'))
-
         row, column = self.searchResults[self.searchIndex]
-        
-        self.tableWidget.item(row, column).setBackground(QColor('yellow'))
-        self.tableWidget.scrollToItem(self.tableWidget.item(row, column))
+
+        self.tableModel.ensure_visible(row)
+        self.tableModel.set_highlights([(row, column)])
+        self.tableView.scrollTo(self.tableModel.index(row, column))
         self.update_search_count()
 
     def update_search_count(self):
@@ -630,14 +646,16 @@ class App(QWidget):
 
     def clear_search(self):
         self.searchField.clear()
-        for row in range(self.tableWidget.rowCount()):
-            for column in range(self.tableWidget.columnCount()):
-                item = self.tableWidget.item(row, column)
-                if item:
-                    item.setBackground(QColor('white'))
+        self.tableModel.set_highlights([])
         self.searchResults = []
         self.update_search_count()
 
+    # 全ページモードではページ送りは使わない
+    def on_all_pages_toggled(self, state):
+        all_pages = state == Qt.Checked
+        self.prevPageButton.setEnabled(not all_pages)
+        self.nextPageButton.setEnabled(not all_pages)
+
     def on_prev_page(self):
         self.scraper.decrement_page()
         self.update_page_number_label()
@@ -685,17 +703,22 @@ class App(QWidget):
         except FileNotFoundError:
             return "0.0.0"
 
+    # 最新バージョンの取得は別スレッドで行い、結果が来てから確認する
     def check_update(self):
-        if self.update_checker.check_update():
-            reply = QMessageBox.question(
-                self, 
-                "更新情報", 
-                "新しいバージョンが利用可能です。最新版にアップデートしてご利用ください。", 
-                QMessageBox.Yes | QMessageBox.No
-            )
+        self.update_check_thread = UpdateCheckThread(self.update_checker)
+        self.update_check_thread.update_available.connect(self.on_update_available)
+        self.update_check_thread.start()
+
+    def on_update_available(self):
+        reply = QMessageBox.question(
+            self, 
+            "更新情報", 
+            "新しいバージョンが利用可能です。最新版にアップデートしてご利用ください。", 
+            QMessageBox.Yes | QMessageBox.No
+        )
 
-            if reply == QMessageBox.Yes:
-                self.start_update()
+        if reply == QMessageBox.Yes:
+            self.start_update()
 
     def start_update(self):
         latest_version = self.update_checker.get_remote_version()
@@ -734,6 +757,8 @@ class App(QWidget):
             self.install_update(file_name)
 
     def install_update(self, file_name: str):
+        import zipfile
+
         try:
             with zipfile.ZipFile(file_name, 'r') as zip_ref:
                 zip_ref.extractall("temp_update")
@@ -783,6 +808,8 @@ class App(QWidget):
             return False
 
     def schedule_update(self):
+        import subprocess
+
         bat_path = os.path.join(os.getcwd(), "update_script.bat")
         subprocess.Popen(["cmd.exe", "/C", bat_path], shell=True)
 
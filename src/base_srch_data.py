@@ -1,36 +1,53 @@
-import requests
-from bs4 import BeautifulSoup
+import os
+import re
+import codecs
+import calendar
+import tempfile
+import threading
 
-class BaseSrchData:
-    BASE_URL = "http://www1.river.go.jp/cgi-bin/"
+from http_session import get_session
+from download_engine import DownloadEngine
+from utils.cache import TTLCache
+from utils.html_parser import make_soup, find_first
+from download_planner import AvailabilityBitset, DownloadPlanner
+from job_manifest import JobManifest, period_key, write_station_index
 
-    def __init__(self, js_detail, kind_value, data_type):
-        self.js_detail = js_detail
-        self.kind_value = kind_value
-        self.data_type = data_type
+PAGE_CACHE_TTL = 300  # 秒
+DOWNLOAD_URL = "http://www1.river.go.jp/dat/dload/download/"
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_DIR = './Download'
 
-    def fetch_header_value(self):
-        url = f"{self.BASE_URL}{self.data_type}.exe?ID={self.js_detail}&KIND={self.kind_value}&PAGE=0"
-        response = requests.get(url)
-        response.encoding = 'EUC-JP'
+# .datのデータ行 (先頭が YYYY/MM/DD)
+DATA_LINE_PATTERN = re.compile(r'^\s*(\d{4})/(\d{1,2})/\d{1,2}')
 
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            header_tag = soup.find('font', size="+2")
-            return header_tag.get_text(strip=True) if header_tag else "Header not found"
-        else:
-            return "Error accessing the page"
+# Dsp*Data.exeのページにある <a href="/dat/dload/download/NNN.dat" target="_blank">
+TEMP_NUMBER_PATTERN = re.compile(rb'<a\s[^>]*href\s*=\s*["\']?[^"\'\s>]*/dat/dload/download/([\w-]+)\.dat', re.IGNORECASE)
 
+# Srch*Data.exe?ID=..&KIND=..&PAGE=0 のページを一度だけparseしたモデル
+class SrchPage:
+    def __init__(self, status_code, header_value=None, table_data=None, station_data=None):
+        self.status_code = status_code
+        self.header_value = header_value
+        self.table_data = table_data
+        self.station_data = station_data
+        self.availability = AvailabilityBitset.from_table_data(table_data) if table_data is not None else None
 
-    def fetch_table_data(self):
-        url = f"{self.BASE_URL}{self.data_type}.exe?ID={self.js_detail}&KIND={self.kind_value}&PAGE=0"
-        response = requests.get(url)
-        response.encoding = 'EUC-JP'
+    @property
+    def ok(self):
+        return self.status_code == 200
 
-        if response.status_code != 200:
-            return "Error accessing the page"
+    @classmethod
+    def from_html(cls, html):
+        soup = make_soup(html)
+        return cls(200, cls.parse_header_value(soup), cls.parse_table_data(soup), cls.parse_station_data(soup))
+
+    @staticmethod
+    def parse_header_value(soup):
+        header_tag = soup.find('font', size="+2")
+        return header_tag.get_text(strip=True) if header_tag else "Header not found"
 
-        soup = BeautifulSoup(response.text, 'html.parser')
+    @staticmethod
+    def parse_table_data(soup):
         rows = soup.find_all('tr')
 
         data_list = []
@@ -50,15 +67,8 @@ class BaseSrchData:
                     break
         return data_list
 
-    def fetch_station_data(self):
-        url = f"{self.BASE_URL}{self.data_type}.exe?ID={self.js_detail}&KIND={self.kind_value}&PAGE=0"
-        response = requests.get(url)
-        response.encoding = 'EUC-JP'
-
-        if response.status_code != 200:
-            return "Error accessing the page"
-
-        soup = BeautifulSoup(response.text, 'html.parser')
+    @staticmethod
+    def parse_station_data(soup):
         table = soup.find('table', {'border': '1'})
         if not table:
             return "No table found"
@@ -77,6 +87,281 @@ class BaseSrchData:
 
         return station_data
 
+# (data_type, js_detail, kind)ごとのSrchPage
+_page_cache = TTLCache(ttl=PAGE_CACHE_TTL)
+
+class BaseSrchData:
+    BASE_URL = "http://www1.river.go.jp/cgi-bin/"
+
+    # 月単位のKINDで一回のDsp*Data.exeリクエストにまとめる最大の月数 (KINDごとに上書き)
+    # 返ってきた.datに含まれない月は、月ごとのリクエストで取り直す
+    MAX_SPAN_MONTHS = 1
+    # ENDDATEを月末日にするか、31日固定にするか
+    USE_LAST_DAY = True
+
+    def __init__(self, js_detail, kind_value, data_type, session=None, engine=None):
+        self.js_detail = js_detail
+        self.kind_value = kind_value
+        self.data_type = data_type
+        self.session = session or get_session()
+        self.engine = engine or DownloadEngine()
+        # Trueなら_manifest.jsonlで完了済みの期間はダウンロードしない (今日を含む期間は毎回取得)
+        self.resume = True
+        # 観測所ディレクトリを作る場所 (wis_cli --download-dir)
+        self.download_dir = DOWNLOAD_DIR
+        self.skipped_periods = set()
+        # このhandlerで書き込んだ期間 (spanは月ごとのファイルに分割されるので、jobの数とは一致しない)
+        self.written_periods = set()
+        self._manifest = None
+        self._manifest_lock = threading.Lock()
+
+    # 同じページはTTLの間、一度しか取得・parseしない
+    def fetch_page(self):
+        key = (self.data_type, str(self.js_detail), str(self.kind_value))
+        return _page_cache.get_or_load(key, self._load_page, should_cache=lambda page: page.ok)
+
+    def _load_page(self):
+        url = f"{self.BASE_URL}{self.data_type}.exe?ID={self.js_detail}&KIND={self.kind_value}&PAGE=0"
+        response = self.session.get(url)
+        response.encoding = 'EUC-JP'
+
+        if response.status_code != 200:
+            return SrchPage(response.status_code)
+        return SrchPage.from_html(response.text)
+
+    def fetch_header_value(self):
+        page = self.fetch_page()
+        return page.header_value if page.ok else "Error accessing the page"
+
+    def fetch_table_data(self):
+        page = self.fetch_page()
+        return page.table_data if page.ok else "Error accessing the page"
+
+    def fetch_station_data(self):
+        page = self.fetch_page()
+        return page.station_data if page.ok else "Error accessing the page"
+
+    # 年ごとのデータ有無のbitset (ページが取得できない場合はNone)
+    def fetch_availability(self):
+        page = self.fetch_page()
+        return page.availability if page.ok else None
+
+    def get_planner(self):
+        return DownloadPlanner(self.fetch_availability())
+
+    def build_data_url(self, bgndate, enddate):
+        dsp_name = self.data_type.replace('Srch', 'Dsp', 1)
+        return f"{self.BASE_URL}{dsp_name}.exe?KIND={self.kind_value}&ID={self.js_detail}&BGNDATE={bgndate}&ENDDATE={enddate}&KAWABOU=NO"
+
+    def month_end_date(self, year, month, use_last_day=None):
+        if use_last_day is None:
+            use_last_day = self.USE_LAST_DAY
+        day = calendar.monthrange(year, month)[1] if use_last_day else 31
+        return f"{year}{month:02d}{day}"
+
+    def scrape_data_for_month(self, year, month, use_last_day=None):
+        url = self.build_data_url(f"{year}{month:02d}01", self.month_end_date(year, month, use_last_day))
+        self.scrape_data(url, year, month)
+
+    def scrape_data_for_year(self, year):
+        self.scrape_data(self.build_data_url(f"{year}0131", f"{year}1231"), year)
+
+    # 連続する複数の月を一回のリクエストで取得し、月ごとのファイルに分割
+    def scrape_data_for_span(self, months):
+        if len(months) == 1:
+            self.scrape_data_for_month(*months[0])
+            return
+
+        (start_year, start_month), (end_year, end_month) = months[0], months[-1]
+        url = self.build_data_url(f"{start_year}{start_month:02d}01", self.month_end_date(end_year, end_month))
+
+        written = set()
+        try:
+            response = self.session.get(url)
+            if response.status_code == 200:
+                temp_number = self.extract_temp_number(response.content)
+                if temp_number:
+                    written = self.download_span_file(temp_number, months)
+        except Exception as e:
+            for year, month in months:
+                self.get_manifest().record_failed(period_key(year, month), e)
+            raise
+
+        for year, month in months:
+            if (year, month) not in written:
+                self.scrape_data_for_month(year, month)
+
+    # Dsp*Data.exeのページから一時ファイル番号を取得し.datをダウンロード
+    def scrape_data(self, url, year, month=None):
+        if self.is_period_done(year, month):
+            return
+
+        try:
+            self.engine.checkpoint()
+            response = self.session.get(url)
+
+            if response.status_code == 200:
+                temp_number = self.extract_temp_number(response.content)
+                if temp_number:
+                    self.download_data_file(temp_number, year, month)
+        except Exception as e:
+            self.get_manifest().record_failed(period_key(year, month), e)
+            raise
+
+    # DOMを作らずに生のbytesから一時ファイル番号を探す
+    # 見つからない場合のみHTML parserで<a target="_blank">を探す
+    @staticmethod
+    def extract_temp_number(content):
+        match = TEMP_NUMBER_PATTERN.search(content)
+        if match:
+            return match.group(1).decode('ascii')
+
+        link_tag = find_first(content.decode('EUC-JP', errors='replace'), 'a', {'href': True, 'target': "_blank"})
+        if link_tag:
+            return link_tag['href'].split('/')[-1].split('.')[0]
+        return None
+
+    def get_directory(self):
+        return f"{self.download_dir}/{self.data_type}_{self.kind_value}_{self.station_data.get('水系名', 'Unknown')}_{self.station_data.get('河川名', 'Unknown')}_{self.station_data.get('観測所名', 'Unknown')}"
+
+    def get_manifest(self):
+        with self._manifest_lock:
+            if self._manifest is None:
+                self._manifest = JobManifest(self.get_directory())
+            return self._manifest
+
+    def record_done(self, year, month=None):
+        write_station_index(self.get_directory(), self.js_detail, self.data_type, self.kind_value)
+        self.get_manifest().record_done(period_key(year, month), self.get_file_path(year, month))
+        self.written_periods.add(period_key(year, month))
+
+    # 前回までに完了している期間 (resume=False、今日を含む期間なら常にFalse)
+    def is_period_done(self, year, month=None):
+        if not self.resume or not self.get_manifest().is_done(period_key(year, month), self.get_file_path(year, month)):
+            return False
+        self.skipped_periods.add(period_key(year, month))
+        return True
+
+    def get_file_path(self, year, month=None):
+        if month:
+            return os.path.join(self.get_directory(), f"{year}_{month:02d}.dat")
+        return os.path.join(self.get_directory(), f"{year}.dat")
+
+    # .datをchunkごとにShift-JISからUTF-8へ変換しながら一時ファイルに書き込む
+    # 全体をメモリに載せないので、数十年分の期間データでもメモリ使用量は一定
+    def download_data_file(self, temp_number, year, month=None):
+        response = self.session.get(f"{DOWNLOAD_URL}{temp_number}.dat", stream=True)
+        try:
+            if response.status_code == 200:
+                file_path = self.get_file_path(year, month)
+                chunks = self.engine.track(response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE), os.path.basename(file_path))
+                self.write_chunks(chunks, file_path)
+                self.record_done(year, month)
+        finally:
+            response.close()
+
+    def download_span_file(self, temp_number, months):
+        response = self.session.get(f"{DOWNLOAD_URL}{temp_number}.dat", stream=True)
+        try:
+            if response.status_code != 200:
+                return set()
+            (first_year, first_month), (last_year, last_month) = months[0], months[-1]
+            file_name = f"{first_year}_{first_month:02d}-{last_year}_{last_month:02d}.dat"
+            chunks = self.engine.track(response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE), file_name)
+            written = self.split_chunks_by_month(chunks, months)
+            for year, month in sorted(written):
+                self.record_done(year, month)
+            return written
+        finally:
+            response.close()
+
+    # 複数月の.datを行ごとに読み、データ行の日付で月ごとの一時ファイルに振り分ける
+    # 最初のデータ行より前(ヘッダ)と最後のデータ行より後(フッタ)は全ての月のファイルに書く
+    # 書き込めた(データのあった)月の集合を返す
+    def split_chunks_by_month(self, chunks, months):
+        wanted = set(months)
+        decoder = codecs.getincrementaldecoder('shift_jis')(errors='replace')
+        header_lines = []
+        footer_lines = []
+        outputs = {}
+        pending = ''
+
+        def handle_line(line):
+            match = DATA_LINE_PATTERN.match(line)
+            if not match:
+                (footer_lines if outputs else header_lines).append(line)
+                return
+
+            key = (int(match.group(1)), int(match.group(2)))
+            if key not in wanted:
+                return
+
+            if key not in outputs:
+                file_path = self.get_file_path(*key)
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix='.part')
+                file = os.fdopen(fd, "wb")
+                file.write(''.join(header_lines).encode('utf-8'))
+                outputs[key] = (file, temp_path, file_path)
+
+            # データ行の間に挟まった行はフッタではないので、次のデータ行と同じ月に書く
+            file = outputs[key][0]
+            if footer_lines:
+                file.write(''.join(footer_lines).encode('utf-8'))
+                footer_lines.clear()
+            file.write(line.encode('utf-8'))
+
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                lines = (pending + decoder.decode(chunk)).split('\n')
+                pending = lines.pop()
+                for line in lines:
+                    handle_line(line + '\n')
+
+            pending += decoder.decode(b'', final=True)
+            if pending:
+                handle_line(pending)
+
+            for file, temp_path, file_path in outputs.values():
+                file.write(''.join(footer_lines).encode('utf-8'))
+                file.close()
+                os.replace(temp_path, file_path)
+        except BaseException:
+            for file, temp_path, file_path in outputs.values():
+                file.close()
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            raise
+
+        return set(outputs)
+
+    def save_to_file(self, content, year, month=None):
+        self.write_chunks([content], self.get_file_path(year, month), transcode=False)
+
+    # 書き込みが終わってからrenameするので、途中で失敗しても壊れたファイルは残らない
+    @staticmethod
+    def write_chunks(chunks, file_path, transcode=True):
+        directory = os.path.dirname(file_path)
+        os.makedirs(directory, exist_ok=True)
+
+        decoder = codecs.getincrementaldecoder('shift_jis')(errors='replace')
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    file.write(decoder.decode(chunk).encode('utf-8') if transcode else chunk)
+                if transcode:
+                    file.write(decoder.decode(b'', final=True).encode('utf-8'))
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
     def filter_years(self):
         data_list = self.fetch_table_data()
         filtered_years = []
@@ -86,4 +371,32 @@ class BaseSrchData:
             if status == 'ari':
                 filtered_years.append(year)
 
-        return filtered_years
\ No newline at end of file
+        return filtered_years
+
+    # start_year/start_month ~ end_year/end_monthの(year, month)を順に返す
+    def iter_months(self):
+        for year in range(self.start_year, self.end_year + 1):
+            for month in range(1, 13):
+                if year == self.start_year and month < self.start_month:
+                    continue
+                if year == self.end_year and month > self.end_month:
+                    break
+                yield year, month
+
+    def iter_years(self):
+        return range(self.start_year, self.end_year + 1)
+
+    # データのない年を除いた(year, month)・year
+    def planned_months(self):
+        months = self.get_planner().plan_months(self.iter_months())
+        return [(year, month) for year, month in months if not self.is_period_done(year, month)]
+
+    # データのある月を、連続する月ごとにMAX_SPAN_MONTHSまでまとめた期間
+    def planned_spans(self):
+        return DownloadPlanner.coalesce_months(self.planned_months(), self.MAX_SPAN_MONTHS)
+
+    def planned_years(self):
+        return [year for year in self.get_planner().plan_years(self.iter_years()) if not self.is_period_done(year)]
+
+    def has_data_in_period(self):
+        return self.get_planner().covers_any(self.start_year, self.end_year)
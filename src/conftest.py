@@ -0,0 +1,84 @@
+import os
+
+import requests
+
+from requests.adapters import BaseAdapter
+
+from base_srch_data import BaseSrchData
+from download_engine import DownloadEngine
+
+# テストで共有するfake
+
+STATION_DATA = {'水系名': '水系', '河川名': '河川', '観測所名': '観測所'}
+
+# 呼び出すと現在時刻を返し、sleepで進む時計
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b'', chunks=None):
+        self.status_code = status_code
+        self.content = content
+        self.chunks = chunks or []
+
+    def iter_content(self, chunk_size=None):
+        return iter(self.chunks)
+
+    def close(self):
+        pass
+
+# HttpSessionにmountして、全てのリクエストに同じstatusを返すadapter
+class StatusAdapter(BaseAdapter):
+    def __init__(self, status_code=200, content=b'ok'):
+        super().__init__()
+        self.status_code = status_code
+        self.content = content
+        self.requests = 0
+
+    def send(self, request, **kwargs):
+        self.requests += 1
+        response = requests.Response()
+        response.status_code = self.status_code
+        response._content = self.content
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+# リクエストを記録して失敗するsession
+class RecordingSession:
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        raise AssertionError("no request expected")
+
+# ページを取得しないSrch*Data (availabilityなし = 全期間が対象)
+class OfflineSrchData(BaseSrchData):
+    def __init__(self, start=None, end=None, session=None, engine=None):
+        super().__init__('123', 1, 'SrchRainData', session=session or RecordingSession(), engine=engine or DownloadEngine(1))
+        self.station_data = dict(STATION_DATA)
+        if start is not None:
+            self.start_year, self.start_month = start
+        if end is not None:
+            self.end_year, self.end_month = end
+
+    def fetch_availability(self):
+        return None
+
+def write_file(path, content=b'data'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(content)
+    return path
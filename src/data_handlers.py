@@ -0,0 +1,54 @@
+import SrchRainData
+import SrchWaterData
+
+from utils.date_range import parse_month_range, parse_year_range
+
+# Qtを使わずにSrch*Data_{kind}を選んで実行するための共通処理 (CLIとGUIで共通)
+DATA_MODULES = {
+    'SrchRainData': SrchRainData,
+    'SrchWaterData': SrchWaterData,
+}
+
+DATA_TYPE_ALIASES = {
+    'rain': 'SrchRainData',
+    'water': 'SrchWaterData',
+}
+
+def normalize_data_type(data_type):
+    return DATA_TYPE_ALIASES.get(str(data_type).lower(), data_type)
+
+# 対応していないdata_type/kindの場合はNone
+def get_data_class(data_type, kind_value):
+    module = DATA_MODULES.get(normalize_data_type(data_type))
+    if module is None:
+        return None
+    return getattr(module, f'{normalize_data_type(data_type)}_{int(kind_value)}', None)
+
+# 月単位 (scrape_data_for_months) のkindは開始・終了を "YYYY/MM"、それ以外は "YYYY" で指定
+def is_monthly(data_class):
+    return hasattr(data_class, 'scrape_data_for_months')
+
+def create_handler(js_detail, data_type, kind_value, start, end, session=None, engine=None):
+    data_class = get_data_class(data_type, kind_value)
+    if data_class is None:
+        raise ValueError(f"Not Supported Data Type: {data_type} {kind_value}")
+
+    kind_value = int(kind_value)
+    if is_monthly(data_class):
+        start_year, end_year, start_month, end_month = parse_month_range(str(start), str(end))
+        return data_class(js_detail, kind_value, start_year, start_month, end_year, end_month, session=session, engine=engine)
+
+    start_year, end_year = parse_year_range(str(start), str(end))
+    return data_class(js_detail, kind_value, start_year, end_year, session=session, engine=engine)
+
+# 範囲内にデータのある年があるか (GUIのDownloadJobThreadとwis_cliで共通)
+def has_data_in_range(data_handler):
+    return data_handler.get_planner().covers_any(data_handler.start_year, data_handler.end_year)
+
+def run_download(data_handler):
+    if hasattr(data_handler, 'scrape_data_for_months'):
+        data_handler.scrape_data_for_months()
+    elif hasattr(data_handler, 'scrape_data_for_years'):
+        data_handler.scrape_data_for_years()
+    else:
+        data_handler.scrape_data_for_period()
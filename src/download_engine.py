@@ -0,0 +1,152 @@
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_MAX_WORKERS = 4
+
+class DownloadCancelled(Exception):
+    pass
+
+# on_progressに渡す進捗のsnapshot
+class DownloadProgress:
+    def __init__(self, jobs_total, jobs_done, file_name, file_bytes, total_bytes, elapsed, paused):
+        self.jobs_total = jobs_total
+        self.jobs_done = jobs_done
+        self.file_name = file_name
+        self.file_bytes = file_bytes
+        self.total_bytes = total_bytes
+        self.elapsed = elapsed
+        self.paused = paused
+
+    @property
+    def bytes_per_second(self):
+        return self.total_bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    # 終わったjobの平均時間から残り時間(秒)を見積もる
+    @property
+    def eta(self):
+        if not self.jobs_done or self.jobs_done >= self.jobs_total:
+            return None
+        return self.elapsed / self.jobs_done * (self.jobs_total - self.jobs_done)
+
+# 月・年単位のダウンロードjobを上限付きのworker poolで並列実行
+# cancel/pause/resumeはjobの開始時とchunkの受信ごとに反映される
+# clockはテスト用に差し替えられる
+class DownloadEngine:
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, on_progress=None, clock=time.monotonic):
+        self.max_workers = max(1, int(max_workers))
+        self.on_progress = on_progress
+        self.clock = clock
+
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._lock = threading.Lock()
+
+        self.jobs_total = 0
+        self.jobs_done = 0
+        self.total_bytes = 0
+        self._started_at = None
+        self._paused_at = None
+        self._paused_time = 0.0
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()
+
+    def pause(self):
+        with self._lock:
+            if self._running.is_set():
+                self._paused_at = self.clock()
+                self._running.clear()
+
+    def resume(self):
+        with self._lock:
+            if not self._running.is_set():
+                self._paused_time += self.clock() - self._paused_at
+                self._paused_at = None
+                self._running.set()
+
+    # pause中は待ち、cancelされていればDownloadCancelledを送出
+    def checkpoint(self):
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise DownloadCancelled()
+
+    # chunkのiterableを包み、受信したbyte数をon_progressへ通知
+    def track(self, chunks, file_name):
+        file_bytes = 0
+        for chunk in chunks:
+            self.checkpoint()
+            file_bytes += len(chunk)
+            with self._lock:
+                self.total_bytes += len(chunk)
+            self._notify(file_name, file_bytes)
+            yield chunk
+
+    def _elapsed(self):
+        if self._started_at is None:
+            return 0.0
+        now = self._paused_at if self._paused_at is not None else self.clock()
+        return now - self._started_at - self._paused_time
+
+    def _notify(self, file_name=None, file_bytes=0):
+        if self.on_progress is None:
+            return
+        with self._lock:
+            progress = DownloadProgress(
+                self.jobs_total, self.jobs_done, file_name, file_bytes,
+                self.total_bytes, self._elapsed(), self.paused
+            )
+        self.on_progress(progress)
+
+    def _run_job(self, func, args):
+        self.checkpoint()
+        try:
+            func(*args)
+        finally:
+            with self._lock:
+                self.jobs_done += 1
+            self._notify()
+
+    # jobs: (func, args)のiterable
+    # 全jobの終了を待ち、失敗したjobがあれば最初の例外を送出 (cancel時はDownloadCancelled)
+    def run(self, jobs):
+        jobs = list(jobs)
+        if not jobs:
+            return
+
+        with self._lock:
+            self.jobs_total += len(jobs)
+            if self._started_at is None:
+                self._started_at = self.clock()
+        self._notify()
+
+        errors = []
+        if self.max_workers == 1:
+            for func, args in jobs:
+                try:
+                    self._run_job(func, args)
+                except Exception as e:
+                    errors.append(e)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as executor:
+                futures = [executor.submit(self._run_job, func, args) for func, args in jobs]
+                for future in as_completed(futures):
+                    error = future.exception()
+                    if error is not None:
+                        errors.append(error)
+
+        if self.cancelled:
+            raise DownloadCancelled()
+        if errors:
+            raise errors[0]
@@ -0,0 +1,81 @@
+# Srch*Data.exeの年ごとの ari/nashi の表を観測所・KINDごとのbitsetとして保持
+# bit i が base_year + i 年のデータの有無
+class AvailabilityBitset:
+    def __init__(self, base_year=None, bits=0):
+        self.base_year = base_year
+        self.bits = bits
+
+    # fetch_table_dataの ["2012 - ari", "2013 - nashi", ...] から作成
+    @classmethod
+    def from_table_data(cls, table_data):
+        years = []
+        for data in table_data:
+            year, status = data.split(' - ')
+            if status == 'ari' and year.isdigit():
+                years.append(int(year))
+
+        if not years:
+            return cls()
+
+        base_year = min(years)
+        bits = 0
+        for year in years:
+            bits |= 1 << (year - base_year)
+        return cls(base_year, bits)
+
+    def has_year(self, year):
+        if self.base_year is None or year < self.base_year:
+            return False
+        return bool(self.bits >> (year - self.base_year) & 1)
+
+    def years(self):
+        if self.base_year is None:
+            return []
+        return [self.base_year + i for i in range(self.bits.bit_length()) if self.bits >> i & 1]
+
+    def count_in_range(self, start_year, end_year):
+        return sum(1 for year in range(start_year, end_year + 1) if self.has_year(year))
+
+    def __bool__(self):
+        return self.bits != 0
+
+# データのある期間だけをリクエストするための計画
+# availabilityがNone(表が取得できなかった)の場合は何も除外しない
+class DownloadPlanner:
+    def __init__(self, availability):
+        self.availability = availability
+
+    def plan_months(self, months):
+        if self.availability is None:
+            return list(months)
+        return [(year, month) for year, month in months if self.availability.has_year(year)]
+
+    def plan_years(self, years):
+        if self.availability is None:
+            return list(years)
+        return [year for year in years if self.availability.has_year(year)]
+
+    def covers_any(self, start_year, end_year):
+        if self.availability is None:
+            return True
+        return self.availability.count_in_range(start_year, end_year) > 0
+
+    def covers_all(self, start_year, end_year):
+        if self.availability is None:
+            return True
+        return self.availability.count_in_range(start_year, end_year) == end_year - start_year + 1
+
+    # 連続する月をmax_span_monthsまでの期間にまとめる
+    # [(2020, 1), (2020, 2), (2020, 4)] -> [[(2020, 1), (2020, 2)], [(2020, 4)]]
+    @staticmethod
+    def coalesce_months(months, max_span_months):
+        spans = []
+        for year, month in months:
+            if spans:
+                last_year, last_month = spans[-1][-1]
+                is_next = (year, month) == ((last_year, last_month + 1) if last_month < 12 else (last_year + 1, 1))
+                if is_next and len(spans[-1]) < max_span_months:
+                    spans[-1].append((year, month))
+                    continue
+            spans.append([(year, month)])
+        return spans
@@ -0,0 +1,106 @@
+import heapq
+import math
+import re
+
+from array import array
+
+DEFAULT_CELL_SIZE = 0.25  # 度
+EARTH_RADIUS_KM = 6371.0
+
+DMS_PATTERN = re.compile(r'(\d+)度\s*(\d+)分\s*(\d+(?:\.\d+)?)秒')
+
+# SiteInfo.exeの緯度経度 ("北緯 35度41分22秒 東経 139度41分30秒") を10進数の(緯度, 経度)に変換
+def parse_coords(coord_string):
+    matches = DMS_PATTERN.findall(coord_string or '')
+    if len(matches) < 2:
+        return None
+
+    latitude, longitude = (
+        int(degrees) + int(minutes) / 60 + float(seconds) / 3600
+        for degrees, minutes, seconds in matches[:2]
+    )
+    return latitude, longitude
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+# 観測所の座標を固定サイズのgridに分けて保持する空間index
+# 座標はarrayで、gridのセルには配列の位置だけを持つ
+class GridIndex:
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.keys = []
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+        self._cells = {}
+        self._bounds = None  # (min_row, min_col, max_row, max_col)
+
+    def _cell(self, latitude, longitude):
+        return int(math.floor(latitude / self.cell_size)), int(math.floor(longitude / self.cell_size))
+
+    def add(self, key, latitude, longitude):
+        position = len(self.keys)
+        self.keys.append(key)
+        self.latitudes.append(latitude)
+        self.longitudes.append(longitude)
+        row, col = self._cell(latitude, longitude)
+        self._cells.setdefault((row, col), []).append(position)
+        if self._bounds is None:
+            self._bounds = (row, col, row, col)
+        else:
+            min_row, min_col, max_row, max_col = self._bounds
+            self._bounds = (min(min_row, row), min(min_col, col), max(max_row, row), max(max_col, col))
+
+    def __len__(self):
+        return len(self.keys)
+
+    # 範囲内の(key, 緯度, 経度)
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        min_row, min_col = self._cell(min_lat, min_lon)
+        max_row, max_col = self._cell(max_lat, max_lon)
+
+        results = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                for position in self._cells.get((row, col), ()):
+                    latitude, longitude = self.latitudes[position], self.longitudes[position]
+                    if min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon:
+                        results.append((self.keys[position], latitude, longitude))
+        return results
+
+    # 近い順にk件の(key, 距離km)
+    # 中心のセルから外側へ一周ずつ広げ、未探索のセルより近いk件が揃ったら終了
+    def nearest(self, latitude, longitude, k=5):
+        if not self.keys or k <= 0:
+            return []
+
+        center_row, center_col = self._cell(latitude, longitude)
+        min_row, min_col, max_row, max_col = self._bounds
+        max_ring = max(
+            abs(center_row - min_row), abs(center_row - max_row),
+            abs(center_col - min_col), abs(center_col - max_col)
+        )
+
+        cell_km = haversine_km(0, 0, 0, self.cell_size)
+
+        heap = []  # (-距離, position) の最大ヒープ
+        for ring in range(max_ring + 1):
+            for row in range(center_row - ring, center_row + ring + 1):
+                for col in range(center_col - ring, center_col + ring + 1):
+                    if max(abs(row - center_row), abs(col - center_col)) != ring:
+                        continue
+                    for position in self._cells.get((row, col), ()):
+                        distance = haversine_km(latitude, longitude, self.latitudes[position], self.longitudes[position])
+                        if len(heap) < k:
+                            heapq.heappush(heap, (-distance, position))
+                        elif distance < -heap[0][0]:
+                            heapq.heapreplace(heap, (-distance, position))
+
+            # 経度方向のセル幅は緯度が高いほど狭くなるので、探索範囲の極側の緯度で見積もる
+            edge_latitude = min(abs(latitude) + (ring + 1) * self.cell_size, 89.9)
+            if len(heap) == k and -heap[0][0] <= ring * cell_km * math.cos(math.radians(edge_latitude)):
+                break
+
+        return [(self.keys[position], -distance) for distance, position in sorted(heap, reverse=True)]
@@ -1,19 +1,20 @@
-import requests
-from bs4 import BeautifulSoup
+from http_session import get_session
+from site_info import fetch_site_info
+from utils.html_parser import find_first
 import re
 
 class DetailInfoScraper:
-    def __init__(self, js_detail):
-        self.base_url = "http://www1.river.go.jp/cgi-bin/SiteInfo.exe?ID="
+    def __init__(self, js_detail, session=None):
         self.js_detail = js_detail
+        self.session = session or get_session()
 
     def scrape(self):
-        url = self.base_url + self.js_detail
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        page = fetch_site_info(self.js_detail, self.session)
+        if not page.ok:
+            return {}
 
         data = {}
-        table = soup.find('table', {'align': 'CENTER', 'width': '600'})
+        table = page.soup.find('table', {'align': 'CENTER', 'width': '600'})
 
         for row in table.find_all('tr'):
             cells = row.find_all('td')
@@ -30,35 +31,34 @@ class DetailInfoScraper:
                 file.write(f"{key}: {value}\n")
 
 class MapImageScraper:
-    def __init__(self, js_detail, latitude, longitude):
+    def __init__(self, js_detail, latitude, longitude, session=None):
         self.js_detail = js_detail
         self.latitude = latitude
         self.longitude = longitude
         self.base_url = "http://www1.river.go.jp/cgi-bin/"
+        self.session = session or get_session()
 
     def scrape_image_url(self):
         url = f"{self.base_url}DspMapPosition.exe?MODE=01&MAP=0&ID={self.js_detail}&SIDO={self.latitude}&SKEIDO={self.longitude}"
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        image_element = soup.find('img', alt="拡大図1")
+        response = self.session.get(url)
+        image_element = find_first(response.content, 'img', {'alt': "拡大図1"})
         if image_element:
             return self.base_url + image_element['src']
 
         return None
     
 class SiteHtmlChecker:
-    def __init__(self, js_detail):
-        self.base_url = "http://www1.river.go.jp/cgi-bin/SiteInfo.exe?ID="
+    def __init__(self, js_detail, session=None):
         self.js_detail = js_detail
+        self.session = session or get_session()
         self.check_img = False
 
     def check_for_image(self):
-        url = self.base_url + self.js_detail
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        page = fetch_site_info(self.js_detail, self.session)
+        if not page.ok:
+            return self.check_img
 
-        image_element = soup.find('img', {'src': '/img/btn_view_pos.png'})
+        image_element = page.soup.find('img', {'src': '/img/btn_view_pos.png'})
         self.check_img = bool(image_element)
 
         return self.check_img
@@ -1,21 +1,20 @@
-import requests
 import re
 
-from bs4 import BeautifulSoup
+from http_session import get_session
+from site_info import fetch_site_info
+from utils.html_parser import find_first
 
 class ObservationDataMatcher:
-    def __init__(self, js_detail, name):
-        self.base_url = "http://www1.river.go.jp/cgi-bin/SiteInfo.exe"
+    def __init__(self, js_detail, name, session=None):
         self.js_detail = js_detail
         self.name = name
+        self.session = session or get_session()
 
     def check_name_in_page(self):
-        response = requests.get(f"{self.base_url}?ID={self.js_detail}")
-        response.encoding = 'EUC-JP'
+        page = fetch_site_info(self.js_detail, self.session)
 
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            images = soup.find_all('img', alt=self.name)
+        if page.ok:
+            images = page.soup.find_all('img', alt=self.name)
 
             for img in images:
                 parent_a_tag = img.find_parent('a')
@@ -29,12 +28,10 @@ class ObservationDataMatcher:
             return False, None
 
     def check_data_type(self):
-        response = requests.get(f"{self.base_url}?ID={self.js_detail}")
-        response.encoding = 'EUC-JP'
+        page = fetch_site_info(self.js_detail, self.session)
 
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            links = soup.find_all('a', href=True)
+        if page.ok:
+            links = page.soup.find_all('a', href=True)
 
             for link in links:
                 if 'SrchRainData' in link['href']:
@@ -66,9 +63,10 @@ class ObservationDataMatcher:
 class ObservationDataCrawler:
     BASE_URL = "http://www1.river.go.jp/cgi-bin/SrchRainData.exe"
 
-    def __init__(self, js_detail, value):
+    def __init__(self, js_detail, value, session=None):
         self.js_detail = js_detail
         self.value = value
+        self.session = session or get_session()
 
     def fetch_data(self):
         params = {
@@ -77,7 +75,7 @@ class ObservationDataCrawler:
             'PAGE': 0
         }
 
-        response = requests.get(self.BASE_URL, params=params)
+        response = self.session.get(self.BASE_URL, params=params)
 
         if response.status_code == 200:
             response.encoding = 'EUC-JP'
@@ -88,7 +86,6 @@ class ObservationDataCrawler:
 
     @staticmethod
     def parse_html(html_content):
-        soup = BeautifulSoup(html_content, 'html.parser')
-        target_text = soup.find('font', size="+2").get_text(strip=True)
+        target_text = find_first(html_content, 'font', {'size': "+2"}).text
 
         return target_text
@@ -1,19 +1,18 @@
-import requests
-from bs4 import BeautifulSoup
+from http_session import get_session
+from site_info import fetch_site_info
 
 class ObservedInfoScraper:
-    def __init__(self, js_detail):
-        self.base_url = "http://www1.river.go.jp/cgi-bin/SiteInfo.exe?ID="
+    def __init__(self, js_detail, session=None):
         self.js_detail = js_detail
+        self.session = session or get_session()
 
     def scrape(self):
-        url = self.base_url + self.js_detail
-        response = requests.get(url)
-        response.encoding = 'EUC-JP'
-        soup = BeautifulSoup(response.text, 'html.parser')
+        page = fetch_site_info(self.js_detail, self.session)
+        if not page.ok:
+            return []
 
         data = []
-        for img_tag in soup.find_all('img'):
+        for img_tag in page.soup.find_all('img'):
             alt_text = img_tag.get('alt')
             if alt_text and alt_text not in ["位置図", "観測所詳細諸元", "リアルタイム雨量", "川の防災情報", "雨量・水位ランキング検索", "リアルタイム水位", "リアルタイムダム諸量検索"]:
                 data.append(alt_text)
@@ -1,15 +1,23 @@
-import requests
 import csv
 import logging
 import os
 import json
 import re
+import threading
 
-from bs4 import BeautifulSoup
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from http_session import get_session
+from utils.html_parser import make_soup, make_strainer
+
+MAX_PAGES = 1000
+PAGE_CACHE_SIZE = 8
+PREFETCH_WORKERS = 2
 
 class RiverDataScraper:
-    def __init__(self, base_url, ken_file, suikei_file, komoku_file):
+    def __init__(self, base_url, ken_file, suikei_file, komoku_file, session=None):
         self.base_url = base_url
+        self.session = session or get_session()
         self.ken_values = self.load_values(ken_file)
         self.suikei_values = self.load_values(suikei_file)
         self.komoku_values = self.load_values(komoku_file) 
@@ -17,17 +25,94 @@ class RiverDataScraper:
 
         self.data = []
 
+        # 現在の検索条件のページ (page_number -> Future)
+        self._page_cache = OrderedDict()
+        self._page_cache_query = None
+        self._page_cache_lock = threading.Lock()
+        self._prefetch_executor = None
+
     @staticmethod
     def load_values(file_name):
         with open(file_name, 'r', encoding='utf-8') as file:
             return json.load(file)
 
+    # 表示したページの前後をバックグラウンドで先読みしておく
     def scrape_data(self, ken_code, suikei_code, komoku_code):
-        response = requests.get(f"{self.base_url}?KOMOKU={komoku_code}&SUIKEI={suikei_code}&KEN={ken_code}&CITY=&PAGE={self.page_number}")
-        soup = BeautifulSoup(response.content, 'html.parser')
+        self.data = self.get_page(ken_code, suikei_code, komoku_code, self.page_number)
+        if not self.is_empty_page(self.data):
+            self.prefetch_pages(ken_code, suikei_code, komoku_code, [self.page_number + 1, self.page_number - 1])
+
+    def get_page(self, ken_code, suikei_code, komoku_code, page_number):
+        query = (ken_code, suikei_code, komoku_code)
+        future = self._get_cached_page(query, page_number)
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                self._discard_cached_page(query, page_number)
+
+        rows = self.fetch_page(ken_code, suikei_code, komoku_code, page_number)
+        future = Future()
+        future.set_result(rows)
+        self._store_cached_page(query, page_number, future)
+        return rows
+
+    def prefetch_pages(self, ken_code, suikei_code, komoku_code, page_numbers):
+        query = (ken_code, suikei_code, komoku_code)
+        for page_number in page_numbers:
+            if page_number < 0 or self._get_cached_page(query, page_number) is not None:
+                continue
+            future = self._get_prefetch_executor().submit(self.fetch_page, ken_code, suikei_code, komoku_code, page_number)
+            self._store_cached_page(query, page_number, future)
+
+    # 取得済み、または先読み中のページか
+    def is_page_cached(self, ken_code, suikei_code, komoku_code, page_number):
+        return self._get_cached_page((ken_code, suikei_code, komoku_code), page_number) is not None
+
+    def clear_page_cache(self):
+        with self._page_cache_lock:
+            self._page_cache.clear()
+            self._page_cache_query = None
+
+    def _get_prefetch_executor(self):
+        if self._prefetch_executor is None:
+            self._prefetch_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+        return self._prefetch_executor
+
+    def _get_cached_page(self, query, page_number):
+        with self._page_cache_lock:
+            if self._page_cache_query != query:
+                return None
+            future = self._page_cache.get(page_number)
+            if future is not None:
+                self._page_cache.move_to_end(page_number)
+            return future
+
+    # 検索条件が変わったら、前の検索条件のページは破棄
+    def _store_cached_page(self, query, page_number, future):
+        with self._page_cache_lock:
+            if self._page_cache_query != query:
+                self._page_cache.clear()
+                self._page_cache_query = query
+            self._page_cache[page_number] = future
+            while len(self._page_cache) > PAGE_CACHE_SIZE:
+                self._page_cache.popitem(last=False)
+
+    def _discard_cached_page(self, query, page_number):
+        with self._page_cache_lock:
+            if self._page_cache_query == query:
+                self._page_cache.pop(page_number, None)
+
+    def fetch_page(self, ken_code, suikei_code, komoku_code, page_number):
+        response = self.session.get(f"{self.base_url}?KOMOKU={komoku_code}&SUIKEI={suikei_code}&KEN={ken_code}&CITY=&PAGE={page_number}")
+        return self.parse_rows(response.content, suikei_code)
+
+    @staticmethod
+    def parse_rows(content, suikei_code):
+        soup = make_soup(content, parse_only=make_strainer('tr', align='CENTER'))
         rows = soup.find_all('tr', align='CENTER')
 
-        self.data = [] 
+        data = []
 
         for row in rows[1:]:
             cols = row.find_all('td')
@@ -44,26 +129,74 @@ class RiverDataScraper:
                 continue 
 
             if any(entry):
-                self.data.append(entry)
+                data.append(entry)
+
+        return data
 
-    def save_to_csv(self, file_name):
-        output_dir = os.path.join('.', 'output')
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+    # js_detailのある行が一つもないページを結果の最後とみなす
+    @staticmethod
+    def is_empty_page(rows):
+        return not any(len(row) > 7 and row[7] for row in rows)
+
+    # start_pageから空のページまで、max_workers件ずつ先読みしながら順番に(page_number, rows)を返す
+    def iter_pages(self, ken_code, suikei_code, komoku_code, max_workers=4, start_page=0, max_pages=MAX_PAGES):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            next_page = start_page
+
+            def submit():
+                nonlocal next_page
+                if next_page < start_page + max_pages:
+                    pending.append((next_page, executor.submit(self.fetch_page, ken_code, suikei_code, komoku_code, next_page)))
+                    next_page += 1
+
+            for _ in range(max_workers):
+                submit()
+
+            try:
+                while pending:
+                    page_number, future = pending.popleft()
+                    rows = future.result()
+                    if self.is_empty_page(rows):
+                        return
+                    submit()
+                    yield page_number, rows
+
+                # 空のページの前にmax_pagesに達した場合、残りのページは取得していない
+                logging.warning(
+                    f"Stopped after {max_pages} pages (KEN={ken_code} SUIKEI={suikei_code} KOMOKU={komoku_code}), "
+                    f"results after page {start_page + max_pages - 1} were not fetched"
+                )
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    # 全ページモード: 空のページまで順番に取得し、ページごとに行を返す
+    # self.dataはページごとに置き換えず、取得した行を追加していく
+    def iter_all_pages(self, ken_code, suikei_code, komoku_code, max_workers=4):
+        self.data = []
+        for page_number, rows in self.iter_pages(ken_code, suikei_code, komoku_code, max_workers=max_workers):
+            self.data.extend(rows)
+            yield page_number, rows
 
-        full_file_path = os.path.join(output_dir, file_name)
-        with open(full_file_path, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(['No', '項目', '水系名', '河川名', '観測所名', '所在地', 'SUIKEI', 'JavaScriptSiteDetail'])
-            writer.writerows(self.data)
+    def save_to_csv(self, file_name, rows=None):
+        with StationCsvWriter(file_name) as writer:
+            writer.write_rows(self.data if rows is None else rows)
 
-    def run(self, ken_name, suikei_name, komoku_name):
+    def run(self, ken_name, suikei_name, komoku_name, all_pages=False):
         ken_code = self.ken_values.get(ken_name, '-1')
         suikei_code = self.suikei_values.get(suikei_name, '-1')
         komoku_code = self.komoku_values.get(komoku_name, '-1')
-        
+        file_name = f'river_data_{ken_name}_{suikei_name}_{komoku_name}.csv'
+
+        if all_pages:
+            with StationCsvWriter(file_name) as writer:
+                for page_number, rows in self.iter_all_pages(ken_code, suikei_code, komoku_code):
+                    writer.write_rows(rows)
+            return
+
         self.scrape_data(ken_code, suikei_code, komoku_code)
-        self.save_to_csv(f'river_data_{ken_name}_{suikei_name}_{komoku_name}.csv')
+        self.save_to_csv(file_name)
 
     def increment_page(self):
         self.page_number += 1
@@ -73,4 +206,32 @@ class RiverDataScraper:
             self.page_number -= 1
 
     def reset_page_number(self):
-        self.page_number = 0
\ No newline at end of file
+        self.page_number = 0
+        self.clear_page_cache()
+
+# ./output/以下のCSVにページごとに行を追記していく
+class StationCsvWriter:
+    HEADER = ['No', '項目', '水系名', '河川名', '観測所名', '所在地', 'SUIKEI', 'JavaScriptSiteDetail']
+
+    def __init__(self, file_name, output_dir=os.path.join('.', 'output')):
+        os.makedirs(output_dir, exist_ok=True)
+        self.file_path = os.path.join(output_dir, file_name)
+        self.file = open(self.file_path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.HEADER)
+        self.row_count = 0
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.writer.writerow(row)
+            self.row_count += 1
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
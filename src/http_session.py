@@ -0,0 +1,145 @@
+import sqlite3
+import threading
+import time
+import requests
+
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from response_cache import ResponseCache
+from utils.rate_limit import TokenBucket, AdaptiveConcurrency
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (5, 30)  # (connect, read)
+DEFAULT_RATE_LIMIT = 10.0  # 1ホストあたりのリクエスト数/秒
+DEFAULT_CONCURRENCY = 4  # 同時リクエスト数の初期値、AIMDでpool_sizeまで増える
+DEFAULT_HEADERS = {
+    'User-Agent': 'WIS_Scraper (+https://github.com/refiaa/WIS_Scraper)',
+    'Connection': 'keep-alive',
+}
+
+# www1.river.go.jpへの接続を使い回すためのkeep-alive付きSession
+# cacheを渡すとSiteInfo.exeやSrch*Data.exeなどのレスポンスをディスクに保存して再利用
+#
+# cacheにない実際のリクエストはホストごとに
+#   - token bucketでrate (リクエスト数/秒) を超えないように待つ (rate=Noneで無制限)
+#   - 同時リクエスト数をAIMDで調整する (adaptive=Falseで無効、pool_sizeが上限)
+# rate_limiter (utils.rate_limit.TokenBucket) を渡すと、rateの代わりにすべてのホストでそれを使う
+# (TokenBucket.sharedなら複数のプロセスで共有)
+class HttpSession:
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, headers=None, max_retries=0, cache=None,
+                 rate=DEFAULT_RATE_LIMIT, rate_limiter=None, adaptive=True):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cache = cache
+        self.rate = rate
+        self.rate_limiter = rate_limiter
+        self.adaptive = adaptive
+        self._throttles = {}
+        self._throttles_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        if headers:
+            self.session.headers.update(headers)
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=max_retries)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+
+        if self.cache is None or kwargs.get('stream'):
+            return self._request(url, **kwargs)
+
+        full_url = requests.Request('GET', url, params=kwargs.pop('params', None)).prepare().url
+        # cacheが使えない (ロック中、ファイルが壊れているなど) 場合はcacheなしで取得
+        try:
+            content = self.cache.get(full_url)
+        except sqlite3.Error:
+            return self._request(full_url, **kwargs)
+        if content is not None:
+            return self._cached_response(full_url, content)
+
+        response = self._request(full_url, **kwargs)
+        if response.status_code == 200:
+            try:
+                self.cache.put(full_url, response.content)
+            except sqlite3.Error:
+                pass
+        return response
+
+    # ホストごとの (token bucket, 同時リクエスト数)
+    def throttle_for(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._throttles_lock:
+            throttle = self._throttles.get(host)
+            if throttle is None:
+                bucket = self.rate_limiter or (TokenBucket(self.rate) if self.rate else None)
+                concurrency = AdaptiveConcurrency(DEFAULT_CONCURRENCY, maximum=self.pool_size) if self.adaptive else None
+                throttle = self._throttles[host] = (bucket, concurrency)
+            return throttle
+
+    def _request(self, url, **kwargs):
+        bucket, concurrency = self.throttle_for(url)
+        if concurrency is not None:
+            concurrency.acquire()
+
+        ok = None
+        started_at = time.monotonic()
+        try:
+            if bucket is not None:
+                bucket.acquire()
+            started_at = time.monotonic()
+            response = self.session.get(url, **kwargs)
+            # 429も混雑として扱う
+            ok = response.status_code < 500 and response.status_code != 429
+            return response
+        except (requests.Timeout, requests.ConnectionError):
+            ok = False
+            raise
+        finally:
+            if concurrency is not None:
+                concurrency.release(started_at, ok)
+
+    @staticmethod
+    def _cached_response(url, content):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = url
+        response.headers = CaseInsensitiveDict()
+        response._content = content
+        response.from_cache = True
+        return response
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+_session = None
+_session_lock = threading.Lock()
+
+def _create_session(use_cache=True, **kwargs):
+    if use_cache and 'cache' not in kwargs:
+        kwargs['cache'] = ResponseCache()
+    return HttpSession(**kwargs)
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _create_session()
+        return _session
+
+# プロセス全体で共有するSessionの設定を変更 (既存のSessionは閉じる)
+# use_cache=Falseでディスクcacheを無効化
+def configure_session(use_cache=True, **kwargs):
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = _create_session(use_cache, **kwargs)
+        return _session
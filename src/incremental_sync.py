@@ -0,0 +1,96 @@
+import datetime
+import os
+import re
+
+from base_srch_data import DOWNLOAD_DIR
+from data_handlers import get_data_class, is_monthly, normalize_data_type
+from job_manifest import JobManifest, period_key, read_station_index
+
+# 前回までにダウンロードした期間より新しい分だけを取得するための範囲の計算
+# 最後にダウンロードした期間 (今の月/年ならまだ途中) は毎回取得し直す
+
+DATA_FILE_PATTERN = re.compile(r'^(\d{4})(?:_(\d{2}))?\.dat$')
+
+class SyncSkipped(Exception):
+    pass
+
+# ディレクトリ内の YYYY_MM.dat / YYYY.dat のうち最新の (year, month)、年単位はmonth=None
+def latest_local_period(directory):
+    if not os.path.isdir(directory):
+        return None
+
+    latest = None
+    for name in os.listdir(directory):
+        match = DATA_FILE_PATTERN.match(name)
+        if match is None:
+            continue
+        period = (int(match.group(1)), int(match.group(2)) if match.group(2) else 0)
+        if latest is None or period > latest:
+            latest = period
+
+    if latest is None:
+        return None
+    return latest[0], latest[1] or None
+
+# 同期用のindex (_station.json) のある観測所ディレクトリ
+def find_local_stations(download_dir=DOWNLOAD_DIR):
+    if not os.path.isdir(download_dir):
+        return []
+
+    stations = []
+    for name in sorted(os.listdir(download_dir)):
+        index = read_station_index(os.path.join(download_dir, name))
+        if index is not None:
+            stations.append({'js_detail': index['js_detail'], 'data_type': index['data_type'], 'kind': str(index['kind'])})
+    return stations
+
+# 今回取得する範囲 (start, end) と、完了扱いをやめて取り直す期間のkey
+# latestはlatest_local_period()の結果、start/endはdownloadのentryと同じ形式 ("YYYY/MM" または "YYYY")
+# 最新の期間が今日より後 (時計のずれなど) の場合は、今の月/年だけを取り直す
+def plan_sync_range(latest, monthly, today=None, initial_start=None):
+    today = today or datetime.date.today()
+    current = (today.year, today.month) if monthly else (today.year, None)
+    end = f"{today.year}/{today.month:02d}" if monthly else str(today.year)
+
+    if latest is None:
+        if not initial_start:
+            raise SyncSkipped("No local data and no initial start")
+        # 月単位・年単位のkindが混ざっていても同じ--initial-startを使えるように
+        if monthly and '/' not in initial_start:
+            return f"{initial_start}/01", end, None
+        if not monthly:
+            return initial_start.split('/')[0], end, None
+        return initial_start, end, None
+
+    if monthly and latest[1] is None:
+        raise SyncSkipped("Unexpected yearly files for a monthly kind")
+    if not monthly:
+        latest = (latest[0], None)
+
+    year, month = min(latest, current, key=lambda period: (period[0], period[1] or 0))
+    start = f"{year}/{month:02d}" if monthly else str(year)
+    return start, end, period_key(year, month)
+
+# download用のentry (start/endを今回の取得範囲にしたもの) を返す
+# ローカルにデータがなければentryのstartかinitial_startから、それもなければSyncSkipped
+def plan_sync(entry, initial_start=None, today=None, session=None, download_dir=DOWNLOAD_DIR):
+    data_class = get_data_class(entry['data_type'], entry['kind'])
+    if data_class is None:
+        raise SyncSkipped(f"Not Supported Data Type: {entry['data_type']} {entry['kind']}")
+    if not hasattr(data_class, 'scrape_data_for_months') and not hasattr(data_class, 'scrape_data_for_years'):
+        # 期間のkindは1ファイルなので差分の取得はできない
+        raise SyncSkipped("Period data can not be synced")
+
+    data_handler = data_class(entry['js_detail'], int(entry['kind']), session=session)
+    data_handler.download_dir = download_dir
+    if not isinstance(data_handler.station_data, dict):
+        raise RuntimeError(data_handler.station_data)
+    directory = data_handler.get_directory()
+
+    start, end, refresh_period = plan_sync_range(latest_local_period(directory), is_monthly(data_class), today,
+                                                 entry.get('start') or initial_start)
+    if refresh_period is not None:
+        # 前回の最後の期間は途中までの可能性があるので完了扱いをやめて取得し直す
+        JobManifest(directory).invalidate(refresh_period)
+
+    return dict(entry, data_type=normalize_data_type(entry['data_type']), start=start, end=end, directory=directory)
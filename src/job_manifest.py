@@ -0,0 +1,157 @@
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+MANIFEST_FILE_NAME = '_manifest.jsonl'
+STATION_INDEX_FILE_NAME = '_station.json'
+STATION_INDEX_KEYS = ('js_detail', 'data_type', 'kind')
+HASH_CHUNK_SIZE = 64 * 1024
+
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+STATE_STALE = 'stale'
+
+# 期間 (YYYY_MM, YYYY, YYYY-YYYY) のkey、get_file_pathのファイル名と同じ
+def period_key(year, month=None):
+    return f"{year}_{month:02d}" if month else str(year)
+
+# 今日を含む (またはそれより後の) 期間はまだデータが増えるので完了扱いにしない
+# "YYYY_MM" は月、"YYYY" は年、"YYYY-YYYY" は終了年で判定
+def is_open_period(period, today=None):
+    today = today or datetime.date.today()
+    period = str(period)
+    if '_' in period:
+        year, month = map(int, period.split('_'))
+        return (year, month) >= (today.year, today.month)
+    return int(period.split('-')[-1]) >= today.year
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# 観測所のダウンロードディレクトリごとの期間の状態
+# 1行1レコードのJSONLに追記し、同じ期間は最後のレコードが有効
+# {"period": "2020_01", "state": "done", "bytes": 1234, "sha256": "...", "updated_at": ...}
+class JobManifest:
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_FILE_NAME)
+        self._lock = threading.Lock()
+        self._records = self._load()
+
+    def _load(self):
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+
+        with open(self.path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 書き込み途中で止まった最後の行
+                    continue
+                records[record['period']] = record
+        return records
+
+    def _append(self, record):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._records[record['period']] = record
+
+    def get(self, period):
+        with self._lock:
+            return self._records.get(period)
+
+    # 完了済みで、ファイルが残っていてサイズ(verify_checksum=Trueならsha256も)が一致する場合のみTrue
+    # 今日を含む期間は常にFalse
+    def is_done(self, period, file_path, verify_checksum=False, today=None):
+        if is_open_period(period, today):
+            return False
+        record = self.get(period)
+        if record is None or record['state'] != STATE_DONE:
+            return False
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != record['bytes']:
+            return False
+        return not verify_checksum or file_sha256(file_path) == record['sha256']
+
+    def record_done(self, period, file_path):
+        self._append({
+            'period': period,
+            'state': STATE_DONE,
+            'bytes': os.path.getsize(file_path),
+            'sha256': file_sha256(file_path),
+            'updated_at': time.time(),
+        })
+
+    def record_failed(self, period, error):
+        self._append({
+            'period': period,
+            'state': STATE_FAILED,
+            'error': str(error) or error.__class__.__name__,
+            'updated_at': time.time(),
+        })
+
+    # 完了済みでも次回は取得し直す (まだ終わっていない月など)
+    def invalidate(self, period):
+        self._append({
+            'period': period,
+            'state': STATE_STALE,
+            'updated_at': time.time(),
+        })
+
+    def failed_periods(self):
+        with self._lock:
+            return sorted(period for period, record in self._records.items() if record['state'] == STATE_FAILED)
+
+    # 期間ごとの最新のレコードだけに書き直す
+    def compact(self):
+        with self._lock:
+            if not self._records:
+                return
+            temp_path = self.path + '.part'
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                for record in self._records.values():
+                    file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            os.replace(temp_path, self.path)
+
+# ディレクトリ名からは観測所IDが分からないので、同期用にIDとKINDを保存しておく
+# {"js_detail": "...", "data_type": "SrchRainData", "kind": 1}
+# 途中で落ちても壊れたファイルが残らないように一時ファイルに書いてからrename
+# 読めないファイルがあれば書き直す
+def write_station_index(directory, js_detail, data_type, kind_value):
+    if read_station_index(directory) is not None:
+        return
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump({'js_detail': str(js_detail), 'data_type': data_type, 'kind': int(kind_value)}, file)
+        os.replace(temp_path, os.path.join(directory, STATION_INDEX_FILE_NAME))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+# ない、または読めない (途中までしか書かれていないなど) 場合はNone
+def read_station_index(directory):
+    path = os.path.join(directory, STATION_INDEX_FILE_NAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            index = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(index, dict) or any(key not in index for key in STATION_INDEX_KEYS):
+        return None
+    return index
@@ -0,0 +1,93 @@
+import os
+import re
+import tempfile
+
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QSize
+from PyQt5.QtGui import QImage
+
+from http_session import get_session
+from getDetailInfo import MapImageScraper, SiteHtmlChecker
+
+MAP_CACHE_DIR = os.path.join('.', 'cache', 'map')
+NO_IMAGE_PATH = './img/noImage.png'
+MAP_IMAGE_SIZE = QSize(400, 300)
+
+# 緯度経度 ("北緯 35度41分22秒 東経 139度41分30秒") をDspMapPosition.exeのSIDO/SKEIDOに変換
+def extract_map_coords(coord_string):
+    degrees = [int(match) for match in re.findall(r'(\d+)度', coord_string)]
+    minutes = [int(match) for match in re.findall(r'(\d+)分', coord_string)]
+    seconds = [int(match) for match in re.findall(r'(\d+)秒', coord_string)]
+
+    latitude = f"{str(degrees[0]).zfill(3)}{str(minutes[0]).zfill(2)}{str(seconds[0]).zfill(2)}000"
+    longitude = f"{str(degrees[1]).zfill(3)}{str(minutes[1]).zfill(2)}{str(seconds[1]).zfill(2)}000"
+
+    return latitude, longitude
+
+def map_cache_path(js_detail, size=MAP_IMAGE_SIZE, cache_dir=MAP_CACHE_DIR):
+    return os.path.join(cache_dir, f"{js_detail}_{size.width()}x{size.height()}.png")
+
+# 縮小済みのpngを一時ファイルに書いてからrename
+def save_map_image(image, file_path):
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    os.close(fd)
+    try:
+        if not image.save(temp_path, 'PNG'):
+            raise OSError(f"Failed to save {file_path}")
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+# 位置図を取得・縮小するworker
+# ディスクに縮小済みの画像があればネットワークには接続しない
+# QPixmapはGUIスレッドでしか使えないので、QImageで受け渡す
+class MapImageLoader(QThread):
+    imageLoaded = pyqtSignal(QImage)
+
+    def __init__(self, js_detail, coord_string, size=MAP_IMAGE_SIZE, session=None):
+        super().__init__()
+        self.js_detail = js_detail
+        self.coord_string = coord_string
+        self.size = size
+        self.session = session
+
+    def run(self):
+        cache_path = map_cache_path(self.js_detail, self.size)
+        image = QImage(cache_path) if os.path.exists(cache_path) else QImage()
+
+        if image.isNull():
+            image = self.fetch_image()
+            if not image.isNull():
+                image = image.scaled(self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                try:
+                    save_map_image(image, cache_path)
+                except OSError:
+                    pass
+
+        if image.isNull():
+            image = QImage(NO_IMAGE_PATH).scaled(self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+        self.imageLoaded.emit(image)
+
+    def fetch_image(self):
+        session = self.session or get_session()
+        try:
+            if not SiteHtmlChecker(self.js_detail, session).check_for_image():
+                return QImage()
+
+            latitude, longitude = extract_map_coords(self.coord_string)
+            image_url = MapImageScraper(self.js_detail, latitude, longitude, session).scrape_image_url()
+            if not image_url:
+                return QImage()
+
+            response = session.get(image_url)
+            if response.status_code != 200:
+                return QImage()
+            return QImage.fromData(response.content)
+
+        except Exception:
+            return QImage()
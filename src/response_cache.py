@@ -0,0 +1,194 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_CACHE_PATH = os.path.join('.', 'cache', 'http_cache.sqlite3')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+ACCESS_FLUSH_SIZE = 100
+ACCESS_FLUSH_INTERVAL = 60  # 秒
+RECOUNT_INTERVAL = 60  # 秒
+EVICT_RATIO = 0.9  # max_bytesを超えたら、その9割まで削除 (いっぱいのときにputのたびに数え直さないように)
+
+# endpointごとの有効期限(秒)、ここにないURLはcacheしない
+# Dsp*Data.exeや.datは一時ファイル番号を返すのでcache対象外
+ENDPOINT_TTLS = [
+    (re.compile(r'/SiteInfo\.exe$', re.IGNORECASE), 7 * 24 * 60 * 60),
+    (re.compile(r'/SrchSite\.exe$', re.IGNORECASE), 24 * 60 * 60),
+    (re.compile(r'/Srch\w*Data\.exe$', re.IGNORECASE), 60 * 60),
+]
+
+# scheme/hostの大文字小文字、queryの順序、fragmentの違いを吸収
+def normalize_url(url):
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ''))
+
+# 生のレスポンス(EUC-JP/Shift-JISのまま)を保存するSQLiteのcache
+# 合計サイズがmax_bytesを超えると、最後に参照された時刻が古いものから削除
+#
+# 参照時刻の更新はメモリにためて、ACCESS_FLUSH_SIZE件またはACCESS_FLUSH_INTERVAL秒ごとにまとめて書き込む
+# 合計サイズは接続時に数えて、以降はputと削除で増減させる
+# 他のプロセスも同じファイルに書くので、RECOUNT_INTERVAL秒ごとと削除の前には数え直す
+# sqlite3のエラー (ロック、壊れたファイルなど) はそのまま送出するので、呼び出し側でcacheなしとして扱う
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, endpoint_ttls=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.endpoint_ttls = ENDPOINT_TTLS if endpoint_ttls is None else endpoint_ttls
+        self._conn = None
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._accessed = {}
+        self._accessed_flushed_at = time.time()
+        self._counted_at = 0
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            try:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "url TEXT PRIMARY KEY, content BLOB NOT NULL, size INTEGER NOT NULL, "
+                    "fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)")
+                conn.commit()
+                self._recount(conn)
+            except BaseException:
+                conn.close()
+                raise
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _count_bytes(conn):
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _recount(self, conn):
+        self._total_bytes = self._count_bytes(conn)
+        self._counted_at = time.time()
+
+    def ttl_for(self, url):
+        path = urlsplit(url).path
+        for pattern, ttl in self.endpoint_ttls:
+            if pattern.search(path):
+                return ttl
+        return None
+
+    def get(self, url):
+        ttl = self.ttl_for(url)
+        if ttl is None:
+            return None
+
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT content, size, fetched_at FROM responses WHERE url = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+
+                content, size, fetched_at = row
+                if fetched_at + ttl <= now:
+                    conn.execute("DELETE FROM responses WHERE url = ?", (key,))
+                    conn.commit()
+                    self._total_bytes -= size
+                    self._accessed.pop(key, None)
+                    return None
+
+                self._accessed[key] = now
+                if len(self._accessed) >= ACCESS_FLUSH_SIZE or now - self._accessed_flushed_at >= ACCESS_FLUSH_INTERVAL:
+                    self._flush_accessed(conn)
+                    conn.commit()
+                return content
+            except sqlite3.Error:
+                self._rollback(conn)
+                raise
+
+    def put(self, url, content):
+        if self.ttl_for(url) is None or len(content) > self.max_bytes:
+            return
+
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT size FROM responses WHERE url = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (url, content, size, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, sqlite3.Binary(content), len(content), now, now)
+                )
+                self._accessed.pop(key, None)
+                self._total_bytes += len(content) - (row[0] if row else 0)
+                if now - self._counted_at >= RECOUNT_INTERVAL:
+                    self._recount(conn)
+                if self._total_bytes > self.max_bytes:
+                    self._evict(conn)
+                conn.commit()
+            except sqlite3.Error:
+                # 途中までの変更を残さない
+                self._rollback(conn)
+                raise
+
+    @staticmethod
+    def _rollback(conn):
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+
+    # 参照時刻をまとめて書き込む (commitは呼び出し側)
+    def _flush_accessed(self, conn):
+        if self._accessed:
+            conn.executemany("UPDATE responses SET accessed_at = ? WHERE url = ?",
+                             [(accessed_at, key) for key, accessed_at in self._accessed.items()])
+            self._accessed.clear()
+        self._accessed_flushed_at = time.time()
+
+    def _evict(self, conn):
+        # 古いものから消すので、ためていた参照時刻を先に反映
+        self._flush_accessed(conn)
+        self._recount(conn)
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        target = self.max_bytes * EVICT_RATIO
+        for url, size in conn.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall():
+            conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self._total_bytes -= size
+            if self._total_bytes <= target:
+                break
+
+    def total_bytes(self):
+        with self._lock:
+            self._connect()
+            return self._total_bytes
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+            self._total_bytes = 0
+            self._accessed.clear()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._flush_accessed(self._conn)
+                    self._conn.commit()
+                except sqlite3.Error:
+                    pass
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,37 @@
+from http_session import get_session
+from utils.cache import TTLCache
+from utils.html_parser import make_soup
+
+SITE_INFO_URL = "http://www1.river.go.jp/cgi-bin/SiteInfo.exe?ID="
+SITE_INFO_CACHE_SIZE = 256
+SITE_INFO_CACHE_TTL = 600  # 秒
+
+# SiteInfo.exe?ID=... を一度だけparseしたページ
+class SiteInfoPage:
+    def __init__(self, status_code, soup=None):
+        self.status_code = status_code
+        self.soup = soup
+
+    @property
+    def ok(self):
+        return self.status_code == 200 and self.soup is not None
+
+# js_detailごとのSiteInfoPage
+# DetailInfoScraper, SiteHtmlChecker, ObservedInfoScraper, ObservationDataMatcherで共有
+_site_info_cache = TTLCache(ttl=SITE_INFO_CACHE_TTL, maxsize=SITE_INFO_CACHE_SIZE)
+
+def fetch_site_info(js_detail, session=None):
+    session = session or get_session()
+    return _site_info_cache.get_or_load(
+        str(js_detail),
+        lambda: _load_site_info(js_detail, session),
+        should_cache=lambda page: page.ok
+    )
+
+def _load_site_info(js_detail, session):
+    response = session.get(f"{SITE_INFO_URL}{js_detail}")
+    response.encoding = 'EUC-JP'
+
+    if response.status_code != 200:
+        return SiteInfoPage(response.status_code)
+    return SiteInfoPage(200, make_soup(response.text))
@@ -0,0 +1,321 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from getWISInfo import RiverDataScraper
+from getDetailInfo import DetailInfoScraper
+from geo_index import GridIndex, parse_coords
+
+SRCH_SITE_URL = "http://www1.river.go.jp/cgi-bin/SrchSite.exe"
+CATALOG_PATH = os.path.join('.', 'cache', 'station_catalog.sqlite3')
+JSON_DIR = os.path.join('.', 'json')
+
+ALL_KEN = '-1'
+ALL_SUIKEI = '-00001'
+ALL_KOMOKU = '-1'
+
+# 全国の観測所をローカルで検索するためのSQLiteのcatalog
+class StationCatalog:
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS stations (
+                js_detail TEXT NOT NULL,
+                komoku TEXT NOT NULL,
+                no TEXT,
+                suikei_name TEXT,
+                river_name TEXT,
+                station_name TEXT,
+                location TEXT,
+                suikei_code TEXT,
+                ken_code TEXT,
+                komoku_code TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (js_detail, komoku)
+            );
+            CREATE INDEX IF NOT EXISTS idx_stations_station_name ON stations (station_name);
+            CREATE INDEX IF NOT EXISTS idx_stations_river_name ON stations (river_name);
+            CREATE INDEX IF NOT EXISTS idx_stations_suikei_name ON stations (suikei_name);
+            CREATE INDEX IF NOT EXISTS idx_stations_ken_komoku ON stations (ken_code, komoku_code);
+            CREATE TABLE IF NOT EXISTS coordinates (
+                js_detail TEXT PRIMARY KEY,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+        self._geo_indexes = {}
+
+    # RiverDataScraperの行 ([No, 項目, 水系名, 河川名, 観測所名, 所在地, SUIKEI, js_detail]) を保存
+    # SUIKEIは検索に使ったコード (全水系なら-00001) なので、水系コードは水系名からsuikei_codesで引く
+    # suikei_codesにない水系名はNULL
+    def upsert_rows(self, rows, ken_code=None, komoku_code=None, suikei_codes=None):
+        now = time.time()
+        records = [
+            (row[7], row[1], row[0], row[2], row[3], row[4], row[5], self._suikei_code(row, suikei_codes), ken_code, komoku_code, now)
+            for row in rows if len(row) > 7 and row[7]
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO stations "
+                "(js_detail, komoku, no, suikei_name, river_name, station_name, location, suikei_code, ken_code, komoku_code, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                records
+            )
+            self._conn.commit()
+            self._geo_indexes.clear()
+        return len(records)
+
+    @staticmethod
+    def _suikei_code(row, suikei_codes):
+        if suikei_codes is not None:
+            return suikei_codes.get(row[2])
+        return row[6] if row[6] and row[6] != ALL_SUIKEI else None
+
+    # NULLの列はRiverDataScraperの行と同じく空文字
+    @staticmethod
+    def _to_row(row):
+        return ['' if value is None else value for value in row]
+
+    # 条件に合う観測所をRiverDataScraperと同じ形式の行で返す
+    # station_name/river_nameは前方一致、それ以外は完全一致
+    def search(self, station_name=None, river_name=None, suikei_name=None, komoku=None, ken_code=None, limit=None):
+        conditions = []
+        params = []
+        for column, value in (('station_name', station_name), ('river_name', river_name)):
+            if value:
+                conditions.append(f"{column} LIKE ? ESCAPE '\\'")
+                params.append(value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        for column, value in (('suikei_name', suikei_name), ('komoku', komoku), ('ken_code', ken_code)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+
+        query = "SELECT no, komoku, suikei_name, river_name, station_name, location, suikei_code, js_detail FROM stations"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY ken_code, suikei_name, river_name, station_name"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+
+        with self._lock:
+            return [self._to_row(row) for row in self._conn.execute(query, params).fetchall()]
+
+    def get(self, js_detail):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT no, komoku, suikei_name, river_name, station_name, location, suikei_code, js_detail "
+                "FROM stations WHERE js_detail = ?", (js_detail,)
+            ).fetchall()
+        return [self._to_row(row) for row in rows]
+
+    # SiteInfo.exeの緯度経度から変換した10進数の座標
+    def upsert_coordinates(self, js_detail, latitude, longitude):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO coordinates (js_detail, latitude, longitude, updated_at) VALUES (?, ?, ?, ?)",
+                (js_detail, latitude, longitude, time.time())
+            )
+            self._conn.commit()
+            self._geo_indexes.clear()
+
+    def missing_coordinates(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT js_detail FROM stations "
+                "WHERE js_detail NOT IN (SELECT js_detail FROM coordinates)"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    # komoku (雨量, 水位など) ごとのGridIndex、catalogが更新されるまで使い回す
+    def geo_index(self, komoku=None):
+        with self._lock:
+            index = self._geo_indexes.get(komoku)
+            if index is not None:
+                return index
+
+            query = (
+                "SELECT DISTINCT c.js_detail, c.latitude, c.longitude FROM coordinates c "
+                "JOIN stations s ON s.js_detail = c.js_detail"
+            )
+            params = []
+            if komoku:
+                query += " WHERE s.komoku = ?"
+                params.append(komoku)
+
+            index = GridIndex()
+            for js_detail, latitude, longitude in self._conn.execute(query, params):
+                index.add(js_detail, latitude, longitude)
+            self._geo_indexes[komoku] = index
+            return index
+
+    def _rows_for(self, js_detail, komoku):
+        return [row for row in self.get(js_detail) if not komoku or row[1] == komoku]
+
+    # 指定した地点から近い順にk件の (行, 距離km)
+    def nearest(self, latitude, longitude, k=5, komoku=None):
+        results = []
+        for js_detail, distance in self.geo_index(komoku).nearest(latitude, longitude, k):
+            results.extend((row, distance) for row in self._rows_for(js_detail, komoku))
+        return results
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon, komoku=None):
+        results = []
+        for js_detail, latitude, longitude in self.geo_index(komoku).within_bbox(min_lat, min_lon, max_lat, max_lon):
+            results.extend(self._rows_for(js_detail, komoku))
+        return results
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM stations").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# SrchSite.exeの検索結果を全ページ取得してcatalogに保存
+class CatalogCrawler:
+    def __init__(self, scraper, catalog, max_workers=4, log=print):
+        self.scraper = scraper
+        self.catalog = catalog
+        self.max_workers = max_workers
+        self.log = log
+
+    # 一つの検索条件の全ページ (page_workers件ずつ並列に取得)
+    def crawl_query(self, ken_code, suikei_code, komoku_code, page_workers=None):
+        count = 0
+        page_workers = page_workers or self.max_workers
+        for page_number, rows in self.scraper.iter_pages(ken_code, suikei_code, komoku_code, max_workers=page_workers):
+            count += self.catalog.upsert_rows(rows, ken_code, komoku_code, self.scraper.suikei_values)
+        return count
+
+    # ken_values.json × komoku_values.jsonの全組み合わせ (水系は全水系)
+    # 一つの観測所はどこかの県に属するので、全国を重複なく取得できる
+    def crawl_all(self, ken_codes=None, komoku_codes=None, suikei_codes=None):
+        ken_codes = ken_codes or [code for code in self.scraper.ken_values.values() if code != ALL_KEN]
+        komoku_codes = komoku_codes or [code for code in self.scraper.komoku_values.values() if code != ALL_KOMOKU]
+        suikei_codes = suikei_codes or [ALL_SUIKEI]
+        queries = [(ken, suikei, komoku) for ken in ken_codes for suikei in suikei_codes for komoku in komoku_codes]
+
+        # 並列数は検索条件の単位で制限し、各検索条件のページは順番に取得
+        total = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.crawl_query, *query, page_workers=1): query for query in queries}
+            for future in as_completed(futures):
+                ken, suikei, komoku = futures[future]
+                try:
+                    count = future.result()
+                    total += count
+                    self.log(f"INFO - KEN={ken} SUIKEI={suikei} KOMOKU={komoku}: {count} stations")
+                except Exception as e:
+                    self.log(f"ERROR - KEN={ken} SUIKEI={suikei} KOMOKU={komoku}: {e}")
+        return total
+
+    # 座標が未取得の観測所のSiteInfo.exeから緯度経度を取得
+    def crawl_coordinates(self):
+        def crawl(js_detail):
+            coords = parse_coords(DetailInfoScraper(js_detail, self.scraper.session).scrape().get('緯度経度'))
+            if coords:
+                self.catalog.upsert_coordinates(js_detail, *coords)
+            return coords
+
+        total = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(crawl, js_detail): js_detail for js_detail in self.catalog.missing_coordinates()}
+            for future in as_completed(futures):
+                try:
+                    if future.result():
+                        total += 1
+                    else:
+                        self.log(f"WARNING - ID={futures[future]}: no coordinates")
+                except Exception as e:
+                    self.log(f"ERROR - ID={futures[future]}: {e}")
+        return total
+
+def create_scraper(session=None):
+    return RiverDataScraper(
+        SRCH_SITE_URL,
+        os.path.join(JSON_DIR, 'ken_values.json'),
+        os.path.join(JSON_DIR, 'suikei_values.json'),
+        os.path.join(JSON_DIR, 'komoku_values.json'),
+        session=session
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local station catalog for the WIS database")
+    parser.add_argument('--catalog', default=CATALOG_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    crawl_parser = subparsers.add_parser('crawl', help="crawl SrchSite.exe into the catalog")
+    crawl_parser.add_argument('--ken', nargs='*', help="prefecture names (ken_values.json), default: all")
+    crawl_parser.add_argument('--suikei', nargs='*', help="river system names (suikei_values.json), default: all")
+    crawl_parser.add_argument('--komoku', nargs='*', help="item names (komoku_values.json), default: all")
+    crawl_parser.add_argument('--workers', type=int, default=4)
+
+    search_parser = subparsers.add_parser('search', help="search stations in the catalog")
+    search_parser.add_argument('station_name', nargs='?')
+    search_parser.add_argument('--river')
+    search_parser.add_argument('--suikei')
+    search_parser.add_argument('--komoku')
+    search_parser.add_argument('--limit', type=int, default=50)
+
+    coords_parser = subparsers.add_parser('coords', help="fetch coordinates of stations without them")
+    coords_parser.add_argument('--workers', type=int, default=4)
+
+    nearest_parser = subparsers.add_parser('nearest', help="k nearest stations to a point")
+    nearest_parser.add_argument('latitude', type=float)
+    nearest_parser.add_argument('longitude', type=float)
+    nearest_parser.add_argument('-k', type=int, default=5)
+    nearest_parser.add_argument('--komoku')
+
+    bbox_parser = subparsers.add_parser('bbox', help="stations inside a bounding box")
+    bbox_parser.add_argument('min_lat', type=float)
+    bbox_parser.add_argument('min_lon', type=float)
+    bbox_parser.add_argument('max_lat', type=float)
+    bbox_parser.add_argument('max_lon', type=float)
+    bbox_parser.add_argument('--komoku')
+
+    args = parser.parse_args(argv)
+    catalog = StationCatalog(args.catalog)
+
+    if args.command == 'crawl':
+        scraper = create_scraper()
+        crawler = CatalogCrawler(scraper, catalog, max_workers=args.workers)
+        total = crawler.crawl_all(
+            ken_codes=[scraper.ken_values[name] for name in args.ken] if args.ken else None,
+            komoku_codes=[scraper.komoku_values[name] for name in args.komoku] if args.komoku else None,
+            suikei_codes=[scraper.suikei_values[name] for name in args.suikei] if args.suikei else None,
+        )
+        print(f"INFO - {total} rows stored, {catalog.count()} stations in catalog")
+
+    elif args.command == 'search':
+        rows = catalog.search(args.station_name, args.river, args.suikei, args.komoku, limit=args.limit)
+        for row in rows:
+            print(','.join(row))
+
+    elif args.command == 'coords':
+        crawler = CatalogCrawler(create_scraper(), catalog, max_workers=args.workers)
+        print(f"INFO - {crawler.crawl_coordinates()} coordinates stored")
+
+    elif args.command == 'nearest':
+        for row, distance in catalog.nearest(args.latitude, args.longitude, args.k, args.komoku):
+            print(','.join(row + [f"{distance:.2f}km"]))
+
+    elif args.command == 'bbox':
+        for row in catalog.within_bbox(args.min_lat, args.min_lon, args.max_lat, args.max_lon, args.komoku):
+            print(','.join(row))
+
+    catalog.close()
+
+if __name__ == '__main__':
+    main()
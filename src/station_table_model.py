@@ -0,0 +1,134 @@
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, pyqtSignal
+from PyQt5.QtGui import QColor
+from utils.search_index import NgramIndex
+
+HEADERS = ['項目', '水系名', '河川名', '観測所名', '所在地', '詳細']
+DETAIL_COLUMN = 5
+DETAIL_TEXT = '詳細情報'
+FETCH_BATCH_SIZE = 500
+
+# RiverDataScraperの行 ([No, 項目, 水系名, 河川名, 観測所名, 所在地, SUIKEI, js_detail]) をそのまま保持するmodel
+# viewにはFETCH_BATCH_SIZE行ずつ公開し、スクロールに合わせて残りを渡す
+class StationTableModel(QAbstractTableModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._visible = 0
+        self._highlights = set()
+        self._index = NgramIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._visible
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row, column = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            return DETAIL_TEXT if column == DETAIL_COLUMN else str(self._rows[row][column + 1])
+        if role == Qt.BackgroundRole and (row, column) in self._highlights:
+            return QColor('yellow')
+        return None
+
+    def flags(self, index):
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._visible < len(self._rows)
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(FETCH_BATCH_SIZE, len(self._rows) - self._visible)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._visible, self._visible + count - 1)
+        self._visible += count
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self._visible = 0
+        self._highlights = set()
+        self._index.clear()
+        self.endResetModel()
+
+    # js_detailのない行・空の行は除外して末尾に追加し、追加した行数を返す
+    def append_rows(self, rows):
+        valid_rows = [
+            row for row in rows
+            if len(row) > 7 and row[7] and any(row[1:6])
+        ]
+        if not valid_rows:
+            return 0
+
+        start = len(self._rows)
+        self._rows.extend(valid_rows)
+        for row, row_data in enumerate(valid_rows, start):
+            for column in range(DETAIL_COLUMN):
+                self._index.add((row, column), row_data[column + 1])
+
+        # 表示中の行がバッチに満たなければすぐに見せる
+        if self._visible < FETCH_BATCH_SIZE:
+            self.fetchMore()
+        return len(valid_rows)
+
+    def total_rows(self):
+        return len(self._rows)
+
+    def row_data(self, row):
+        return self._rows[row]
+
+    def js_detail(self, row):
+        return self._rows[row][7]
+
+    # 未公開の行も含めて、queryを含むセルの(row, column)を返す
+    def find(self, query):
+        return self._index.search(query)
+
+    # 行をviewに公開してからindexを返す
+    def ensure_visible(self, row):
+        while row >= self._visible and self.canFetchMore():
+            self.fetchMore()
+        return self.index(row, 0)
+
+    # 変更のあったセルだけdataChangedを送る
+    def set_highlights(self, cells):
+        cells = set(cells)
+        changed = self._highlights ^ cells
+        self._highlights = cells
+        for row, column in changed:
+            if row < self._visible:
+                index = self.index(row, column)
+                self.dataChanged.emit(index, index, [Qt.BackgroundRole])
+
+# 詳細列にボタンを描画するだけのdelegate (行ごとのQPushButtonは作らない)
+class DetailButtonDelegate(QStyledItemDelegate):
+    clicked = pyqtSignal(int)
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data(Qt.DisplayRole)
+        button.state = QStyle.State_Enabled | QStyle.State_Raised
+        if option.state & QStyle.State_MouseOver:
+            button.state |= QStyle.State_MouseOver
+
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            if option.rect.contains(event.pos()):
+                self.clicked.emit(index.row())
+                return True
+        return super().editorEvent(event, model, option, index)
@@ -0,0 +1,163 @@
+import os
+import re
+
+import pytest
+
+import base_srch_data
+from base_srch_data import BaseSrchData
+from conftest import FakeResponse, OfflineSrchData
+from SrchRainData import SrchRainData_1, SrchRainData_2
+from SrchWaterData import SrchWaterData_1, SrchWaterData_2, SrchWaterData_5, SrchWaterData_6
+
+HEADER = '時刻雨量月表\r\n#日付,時刻,雨量\r\n'
+FOOTER = '注記：暫定値\r\n'
+
+def dat_lines(months, days=2):
+    return ''.join(f'{year}/{month:02d}/{day:02d},01:00,1.0\r\n' for year, month in months for day in range(1, days + 1))
+
+def to_chunks(text, size):
+    data = text.encode('shift_jis')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+def read(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        return file.read()
+
+# Dsp*Data.exeには一時ファイル番号のリンク、.datにはBGNDATE~ENDDATEのうちmonthsにある月の行を返す
+class FakeServer:
+    def __init__(self, months=None, error=None):
+        self.months = months
+        self.error = error
+        self.urls = []
+        self.ranges = {}
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        if self.error:
+            raise self.error
+
+        match = re.search(r'BGNDATE=(\d{6})\d\d&ENDDATE=(\d{6})', url)
+        if match:
+            number = len(self.ranges) + 1
+            self.ranges[number] = match.groups()
+            return FakeResponse(content=f'<a href="/dat/dload/download/{number}.dat" target="_blank">'.encode('ascii'))
+
+        number = int(re.search(r'/(\d+)\.dat$', url).group(1))
+        begin, end = self.ranges[number]
+        months = [(int(key[:4]), int(key[4:])) for key in sorted(self.months or [])
+                  if begin <= key <= end]
+        if self.months is None:
+            months = [(int(begin[:4]), int(begin[4:]))] if begin == end else []
+        return FakeResponse(chunks=to_chunks(HEADER + dat_lines(months) + FOOTER, 7))
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return OfflineSrchData(session=FakeServer())
+
+def test_split_chunks_by_month(handler):
+    months = [(2020, 12), (2021, 1)]
+    text = HEADER + dat_lines([(2020, 11)]) + dat_lines(months) + FOOTER
+    # 7 bytesごとに区切ると、Shift-JISの2 byte文字と行がchunkの境界で分かれる
+    written = handler.split_chunks_by_month(to_chunks(text, 7), months)
+
+    assert written == {(2020, 12), (2021, 1)}
+    for month in months:
+        content = read(handler.get_file_path(*month))
+        assert content == HEADER + dat_lines([month]) + FOOTER
+    # 対象外の月のファイルは作らない
+    assert not os.path.exists(handler.get_file_path(2020, 11))
+    assert not [name for name in os.listdir(handler.get_directory()) if name.endswith('.part')]
+
+def test_split_keeps_lines_between_data_rows(handler):
+    text = HEADER + dat_lines([(2020, 1)], days=1) + '欠測\r\n' + dat_lines([(2020, 2)], days=1) + FOOTER
+    handler.split_chunks_by_month(to_chunks(text, 5), [(2020, 1), (2020, 2)])
+
+    # 途中の行は次のデータ行と同じ月に書く
+    assert read(handler.get_file_path(2020, 1)) == HEADER + dat_lines([(2020, 1)], days=1) + FOOTER
+    assert read(handler.get_file_path(2020, 2)) == HEADER + '欠測\r\n' + dat_lines([(2020, 2)], days=1) + FOOTER
+
+def test_split_without_data_writes_nothing(handler):
+    assert handler.split_chunks_by_month(to_chunks(HEADER + FOOTER, 4), [(2020, 1)]) == set()
+    assert not os.path.exists(handler.get_file_path(2020, 1))
+
+def test_split_removes_partial_files_on_error(handler):
+    def chunks():
+        yield (HEADER + dat_lines([(2020, 1)])).encode('shift_jis')
+        raise ConnectionError('reset')
+
+    with pytest.raises(ConnectionError):
+        handler.split_chunks_by_month(chunks(), [(2020, 1)])
+    assert os.listdir(handler.get_directory()) == []
+
+def test_scrape_data_for_span_uses_one_request(handler):
+    handler.session = FakeServer(months=['202001', '202002', '202003'])
+    handler.scrape_data_for_span([(2020, 1), (2020, 2), (2020, 3)])
+
+    dsp_urls = [url for url in handler.session.urls if 'Dsp' in url]
+    assert dsp_urls == [handler.build_data_url('20200101', '20200331')]
+    assert handler.written_periods == {'2020_01', '2020_02', '2020_03'}
+    for month in (1, 2, 3):
+        assert read(handler.get_file_path(2020, month)) == HEADER + dat_lines([(2020, month)]) + FOOTER
+
+def test_scrape_data_for_span_fetches_missing_months_again(handler):
+    # spanの.datに2月がない (サーバー側で期間が切られた場合など) -> 2月だけ月ごとに取り直す
+    handler.session = FakeServer(months=['202001', '202003'])
+    handler.scrape_data_for_span([(2020, 1), (2020, 2), (2020, 3)])
+
+    dsp_urls = [url for url in handler.session.urls if 'Dsp' in url]
+    assert dsp_urls == [handler.build_data_url('20200101', '20200331'), handler.build_data_url('20200201', '20200229')]
+    # 月ごとのリクエストの.datは中身に関係なくそのまま保存する
+    assert handler.written_periods == {'2020_01', '2020_02', '2020_03'}
+
+def test_scrape_data_for_single_month_span(handler):
+    handler.session = FakeServer()
+    handler.scrape_data_for_span([(2020, 2)])
+
+    assert [url for url in handler.session.urls if 'Dsp' in url] == [handler.build_data_url('20200201', '20200229')]
+    assert handler.written_periods == {'2020_02'}
+
+def test_scrape_data_for_span_records_failures(handler):
+    handler.session = FakeServer(error=ConnectionError('timeout'))
+    with pytest.raises(ConnectionError):
+        handler.scrape_data_for_span([(2020, 1), (2020, 2)])
+
+    assert handler.get_manifest().failed_periods() == ['2020_01', '2020_02']
+
+def test_max_span_months_per_kind():
+    assert BaseSrchData.MAX_SPAN_MONTHS == 1
+    for data_class in (SrchRainData_1, SrchWaterData_1, SrchWaterData_5):
+        assert data_class.MAX_SPAN_MONTHS == 12
+    for data_class in (SrchRainData_2, SrchWaterData_2, SrchWaterData_6):
+        assert data_class.MAX_SPAN_MONTHS == 2
+        assert data_class.USE_LAST_DAY is False
+
+def dsp_data_page(link, encoding='EUC-JP'):
+    html = f'''<HTML><HEAD><TITLE>時刻雨量月表</TITLE></HEAD><BODY>
+<A href="/cgi-bin/SiteInfo.exe?ID=123">岩淵水門（いわぶちすいもん）</A>
+{link}
+<FONT size="-1">※ データは暫定値です</FONT>
+</BODY></HTML>'''
+    return html.encode(encoding)
+
+TEMP_NUMBER_PAGES = {
+    'quoted': (dsp_data_page('<A href="/dat/dload/download/12345-67.dat" target="_blank">ダウンロード</A>'), '12345-67'),
+    'single_quoted': (dsp_data_page("<a href='/dat/dload/download/2468.dat' target='_blank'>ダウンロード</a>"), '2468'),
+    'unquoted': (dsp_data_page('<a href=/dat/dload/download/13579.dat target=_blank>ダウンロード</a>'), '13579'),
+    'absolute': (dsp_data_page('<a href="http://www1.river.go.jp/dat/dload/download/111.dat" target="_blank">DL</a>'), '111'),
+    'shift_jis': (dsp_data_page('<a href="/dat/dload/download/98765.dat" target="_blank">ダウンロード</a>', 'shift_jis'), '98765'),
+    'missing': (dsp_data_page('<P>該当するデータがありません</P>'), None),
+}
+
+@pytest.mark.parametrize('content, expected', TEMP_NUMBER_PAGES.values(), ids=TEMP_NUMBER_PAGES.keys())
+def test_extract_temp_number_paths_agree(content, expected, monkeypatch):
+    assert BaseSrchData.extract_temp_number(content) == expected
+
+    # regexが外れたときのparserだけの結果
+    monkeypatch.setattr(base_srch_data, 'TEMP_NUMBER_PATTERN', re.compile(rb'(?!)'))
+    assert BaseSrchData.extract_temp_number(content) == expected
+
+def test_temp_number_pattern_skips_other_links():
+    content = dsp_data_page('<a href="/dat/dload/list.html">一覧</a><a href="/dat/dload/download/42.dat" target="_blank">DL</a>')
+    assert base_srch_data.TEMP_NUMBER_PATTERN.search(content).group(1) == b'42'
+    assert BaseSrchData.extract_temp_number(content) == '42'
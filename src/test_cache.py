@@ -0,0 +1,136 @@
+import threading
+import time
+import types
+
+import pytest
+
+from conftest import FakeClock
+from utils import cache
+from utils.cache import TTLCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, 'time', types.SimpleNamespace(monotonic=clock))
+    return clock
+
+def test_entries_expire_after_ttl(clock):
+    ttl_cache = TTLCache(ttl=10)
+    ttl_cache.set('a', 1)
+
+    clock.now += 9.9
+    assert ttl_cache.get('a') == 1
+    clock.now += 0.1
+    assert ttl_cache.get('a') is None
+    assert ttl_cache.get('a', 'default') == 'default'
+    assert len(ttl_cache) == 0
+
+def test_set_refreshes_expiry(clock):
+    ttl_cache = TTLCache(ttl=10)
+    ttl_cache.set('a', 1)
+    clock.now += 8
+    ttl_cache.set('a', 2)
+    clock.now += 8
+    assert ttl_cache.get('a') == 2
+
+def test_lru_eviction(clock):
+    ttl_cache = TTLCache(ttl=10, maxsize=2)
+    ttl_cache.set('a', 1)
+    ttl_cache.set('b', 2)
+    # 参照した'a'は新しくなるので、'b'が消える
+    assert ttl_cache.get('a') == 1
+    ttl_cache.set('c', 3)
+
+    assert ttl_cache.get('b') is None
+    assert (ttl_cache.get('a'), ttl_cache.get('c')) == (1, 3)
+    assert len(ttl_cache) == 2
+
+def test_invalidate_and_clear(clock):
+    ttl_cache = TTLCache(ttl=10)
+    ttl_cache.set('a', 1)
+    ttl_cache.set('b', 2)
+    ttl_cache.invalidate('a')
+    ttl_cache.invalidate('missing')
+    assert ttl_cache.get('a') is None
+    ttl_cache.clear()
+    assert len(ttl_cache) == 0
+
+def test_get_or_load_caches_until_expiry(clock):
+    ttl_cache = TTLCache(ttl=10)
+    calls = []
+    loader = lambda: calls.append(1) or len(calls)
+
+    assert ttl_cache.get_or_load('a', loader) == 1
+    assert ttl_cache.get_or_load('a', loader) == 1
+    clock.now += 10
+    assert ttl_cache.get_or_load('a', loader) == 2
+
+def test_get_or_load_skips_values_rejected_by_should_cache(clock):
+    ttl_cache = TTLCache(ttl=10)
+    assert ttl_cache.get_or_load('a', lambda: 'Error', should_cache=lambda value: value != 'Error') == 'Error'
+    assert ttl_cache.get('a') is None
+    assert ttl_cache.get_or_load('a', lambda: 'page', should_cache=lambda value: value != 'Error') == 'page'
+    assert ttl_cache.get('a') == 'page'
+
+def run_concurrently(ttl_cache, loader, count=5):
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(ttl_cache.get_or_load('a', loader))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+def test_get_or_load_deduplicates_in_flight_loads():
+    ttl_cache = TTLCache(ttl=60)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'page'
+
+    threads, results, errors = run_concurrently(ttl_cache, loader)
+    # loaderの実行中に他のthreadが取得を待つようにしてから終わらせる
+    assert started.wait(5)
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == ['page'] * 5
+    assert errors == []
+    assert ttl_cache._pending == {}
+
+def test_get_or_load_shares_errors_with_waiters():
+    ttl_cache = TTLCache(ttl=60)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise ConnectionError('reset')
+
+    threads, results, errors = run_concurrently(ttl_cache, loader)
+    # loaderの実行中に他のthreadが取得を待つようにしてから終わらせる
+    assert started.wait(5)
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == []
+    assert len(errors) == 5 and all(isinstance(e, ConnectionError) for e in errors)
+    # エラーはcacheしないので次の呼び出しで取り直す
+    assert ttl_cache.get_or_load('a', lambda: 'page') == 'page'
@@ -0,0 +1,198 @@
+import threading
+
+import pytest
+
+from conftest import FakeClock
+from download_engine import DownloadCancelled, DownloadEngine, DownloadProgress
+
+TIMEOUT = 5
+
+# set()されるまで終わらないjob
+class BlockingJob:
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, name, log):
+        log.append(name)
+        self.started.set()
+        assert self.release.wait(TIMEOUT)
+
+# engine.runを別threadで実行して、終了と例外を記録
+class Runner(threading.Thread):
+    def __init__(self, engine, jobs):
+        super().__init__(daemon=True)
+        self.engine = engine
+        self.jobs = jobs
+        self.error = None
+
+    def run(self):
+        try:
+            self.engine.run(self.jobs)
+        except Exception as e:
+            self.error = e
+
+    def finish(self):
+        self.join(TIMEOUT)
+        assert not self.is_alive()
+        return self.error
+
+def record(name, log):
+    log.append(name)
+
+def test_pause_blocks_new_jobs():
+    engine = DownloadEngine(max_workers=1)
+    blocking, log = BlockingJob(), []
+    runner = Runner(engine, [(blocking, ('a', log)), (record, ('b', log)), (record, ('c', log))])
+    runner.start()
+    assert blocking.started.wait(TIMEOUT)
+
+    # 実行中のjobは最後まで進み、次のjobはresumeまで始まらない
+    engine.pause()
+    blocking.release.set()
+    runner.join(0.1)
+    assert runner.is_alive()
+    assert log == ['a']
+    assert engine.jobs_done == 1
+
+    engine.resume()
+    assert runner.finish() is None
+    assert log == ['a', 'b', 'c']
+    assert engine.jobs_done == engine.jobs_total == 3
+
+def test_pause_before_run_blocks_every_worker():
+    engine = DownloadEngine(max_workers=3)
+    log = []
+    engine.pause()
+    runner = Runner(engine, [(record, (name, log)) for name in 'abcd'])
+    runner.start()
+
+    runner.join(0.1)
+    assert log == []
+
+    engine.resume()
+    assert runner.finish() is None
+    assert sorted(log) == ['a', 'b', 'c', 'd']
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_cancel_stops_queued_jobs_and_raises(max_workers):
+    engine = DownloadEngine(max_workers=max_workers)
+    blocking, log = BlockingJob(), []
+    jobs = [(blocking, ('a', log))] + [(record, (name, log)) for name in 'bcdefg']
+    if max_workers == 2:
+        # もう一つのworkerも止めておく
+        second = BlockingJob()
+        jobs.insert(1, (second, ('a2', log)))
+    runner = Runner(engine, jobs)
+    runner.start()
+    assert blocking.started.wait(TIMEOUT)
+    if max_workers == 2:
+        assert second.started.wait(TIMEOUT)
+        second.release.set()
+
+    engine.cancel()
+    blocking.release.set()
+
+    assert isinstance(runner.finish(), DownloadCancelled)
+    assert sorted(log) == sorted(['a', 'a2'][:max_workers])
+    # 開始しなかったjobは終わった数に含めない
+    assert engine.jobs_done == max_workers
+
+def test_cancel_while_paused_wakes_up_the_caller():
+    engine = DownloadEngine(max_workers=1)
+    log = []
+    engine.pause()
+    runner = Runner(engine, [(record, ('a', log))])
+    runner.start()
+
+    engine.cancel()
+    assert isinstance(runner.finish(), DownloadCancelled)
+    assert log == []
+
+def test_job_errors_are_raised_after_all_jobs():
+    engine = DownloadEngine(max_workers=2)
+    log = []
+
+    def fail(name, log):
+        log.append(name)
+        raise ConnectionError(name)
+
+    with pytest.raises(ConnectionError):
+        engine.run([(fail, ('a', log)), (record, ('b', log)), (record, ('c', log))])
+    assert sorted(log) == ['a', 'b', 'c']
+    assert engine.jobs_done == 3
+
+def test_track_reports_progress():
+    clock = FakeClock(0.0)
+    progress = []
+    engine = DownloadEngine(max_workers=1, on_progress=progress.append, clock=clock)
+
+    def download(file_name, chunks):
+        for chunk in engine.track(chunks, file_name):
+            clock.now += 1
+
+    engine.run([(download, ('a.dat', [b'12', b'345'])), (download, ('b.dat', [b'6789']))])
+
+    snapshots = [(p.jobs_done, p.file_name, p.file_bytes, p.total_bytes, p.elapsed) for p in progress]
+    assert snapshots == [
+        (0, None, 0, 0, 0.0),
+        (0, 'a.dat', 2, 2, 0.0),
+        (0, 'a.dat', 5, 5, 1.0),
+        (1, None, 0, 5, 2.0),
+        (1, 'b.dat', 4, 9, 2.0),
+        (2, None, 0, 9, 3.0),
+    ]
+    assert progress[-1].bytes_per_second == 3.0
+    assert engine.total_bytes == 9
+
+def test_track_stops_at_checkpoint_after_cancel():
+    engine = DownloadEngine(max_workers=1)
+    received = []
+
+    chunks = engine.track([b'1', b'2', b'3'], 'a.dat')
+    received.append(next(chunks))
+    engine.cancel()
+    with pytest.raises(DownloadCancelled):
+        received.append(next(chunks))
+
+    assert received == [b'1']
+    assert engine.total_bytes == 1
+
+def test_paused_time_is_not_counted():
+    clock = FakeClock(0.0)
+    progress = []
+    engine = DownloadEngine(max_workers=1, on_progress=progress.append, clock=clock)
+
+    def job():
+        clock.now += 10
+
+    engine.run([(job, ())])
+    engine.pause()
+    clock.now += 100
+    # pause中は経過時間が止まる
+    assert engine._elapsed() == 10
+    engine.resume()
+    clock.now += 5
+
+    engine.run([(job, ()), (job, ())])
+    assert progress[-1].elapsed == 35
+    assert (progress[-1].jobs_done, progress[-1].jobs_total) == (3, 3)
+
+def test_eta_from_engine_progress():
+    clock = FakeClock(0.0)
+    progress = []
+    engine = DownloadEngine(max_workers=1, on_progress=progress.append, clock=clock)
+
+    def job(seconds):
+        clock.now += seconds
+
+    engine.run([(job, (4,)), (job, (2,)), (job, (6,))])
+
+    # 開始時はjobが終わっていないので不明、終了後は残りなし
+    assert [p.eta for p in progress] == [None, 8.0, 3.0, None]
+
+def test_eta():
+    assert DownloadProgress(10, 0, None, 0, 0, 5.0, False).eta is None
+    assert DownloadProgress(10, 2, None, 0, 0, 5.0, False).eta == 20.0
+    assert DownloadProgress(10, 10, None, 0, 0, 50.0, False).eta is None
+    assert DownloadProgress(10, 2, None, 0, 100, 0.0, False).bytes_per_second == 0.0
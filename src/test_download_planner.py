@@ -0,0 +1,91 @@
+import pytest
+
+from download_planner import AvailabilityBitset, DownloadPlanner
+
+def table(ari_years, start=2010, end=2023):
+    return [f"{year} - {'ari' if year in ari_years else 'nashi'}" for year in range(start, end + 1)]
+
+def months(start, end):
+    (year, month), result = start, []
+    while (year, month) <= end:
+        result.append((year, month))
+        year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+    return result
+
+def test_bitset_from_table_data():
+    bitset = AvailabilityBitset.from_table_data(table({2012, 2013, 2020}))
+
+    assert bitset.base_year == 2012
+    assert bitset.years() == [2012, 2013, 2020]
+    assert bitset.has_year(2013)
+    assert not bitset.has_year(2014)
+    assert not bitset.has_year(2011)
+    assert not bitset.has_year(2021)
+    assert bitset.count_in_range(2010, 2015) == 2
+    assert bool(bitset)
+
+def test_bitset_ignores_non_year_cells():
+    bitset = AvailabilityBitset.from_table_data(['201* - ari', '2015 - ari', '2016 - nashi'])
+    assert bitset.years() == [2015]
+
+def test_empty_bitset():
+    bitset = AvailabilityBitset.from_table_data(table(set()))
+
+    assert bitset.base_year is None
+    assert bitset.years() == []
+    assert not bitset.has_year(2015)
+    assert bitset.count_in_range(2010, 2023) == 0
+    assert not bitset
+
+def test_planner_skips_years_without_data():
+    planner = DownloadPlanner(AvailabilityBitset.from_table_data(table({2019, 2021})))
+
+    assert planner.plan_years(range(2018, 2023)) == [2019, 2021]
+    # 年をまたぐ期間でも、データのない年の月だけを除く
+    assert planner.plan_months(months((2019, 11), (2021, 2))) == months((2019, 11), (2019, 12)) + months((2021, 1), (2021, 2))
+    assert planner.covers_any(2018, 2019)
+    assert not planner.covers_any(2020, 2020)
+    assert planner.covers_all(2019, 2019)
+    assert not planner.covers_all(2019, 2021)
+
+def test_planner_without_availability_keeps_everything():
+    planner = DownloadPlanner(None)
+
+    assert planner.plan_years(range(2018, 2021)) == [2018, 2019, 2020]
+    assert planner.plan_months(months((2019, 12), (2020, 1))) == [(2019, 12), (2020, 1)]
+    assert planner.covers_any(1900, 1900)
+    assert planner.covers_all(1900, 2100)
+
+def test_coalesce_across_year_boundary():
+    assert DownloadPlanner.coalesce_months(months((2019, 11), (2020, 2)), 12) == [months((2019, 11), (2020, 2))]
+
+def test_coalesce_splits_on_gaps():
+    planned = [(2020, 1), (2020, 2), (2020, 4), (2020, 12), (2021, 2)]
+    assert DownloadPlanner.coalesce_months(planned, 12) == [
+        [(2020, 1), (2020, 2)],
+        [(2020, 4)],
+        [(2020, 12)],
+        [(2021, 2)],
+    ]
+
+def test_coalesce_splits_on_missing_year():
+    # 2020年にデータがないと2019/12 -> 2021/01は連続しない
+    planner = DownloadPlanner(AvailabilityBitset.from_table_data(table({2019, 2021})))
+    planned = planner.plan_months(months((2019, 12), (2021, 1)))
+    assert DownloadPlanner.coalesce_months(planned, 12) == [[(2019, 12)], [(2021, 1)]]
+
+@pytest.mark.parametrize('max_months, sizes', [
+    (1, [1] * 14),
+    (2, [2] * 7),
+    (12, [12, 2]),
+    (24, [14]),
+])
+def test_coalesce_respects_max_months(max_months, sizes):
+    planned = months((2019, 6), (2020, 7))
+    spans = DownloadPlanner.coalesce_months(planned, max_months)
+
+    assert [len(span) for span in spans] == sizes
+    assert [month for span in spans for month in span] == planned
+
+def test_coalesce_empty():
+    assert DownloadPlanner.coalesce_months([], 12) == []
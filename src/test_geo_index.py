@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+from geo_index import GridIndex, haversine_km, parse_coords
+
+def random_stations(count, seed=0, lat_range=(24.0, 46.0), lon_range=(122.0, 154.0)):
+    rng = random.Random(seed)
+    return [(f'st{i}', rng.uniform(*lat_range), rng.uniform(*lon_range)) for i in range(count)]
+
+def build_index(stations, cell_size=0.25):
+    index = GridIndex(cell_size)
+    for key, latitude, longitude in stations:
+        index.add(key, latitude, longitude)
+    return index
+
+def brute_nearest(stations, latitude, longitude, k):
+    distances = sorted((haversine_km(latitude, longitude, lat, lon), key) for key, lat, lon in stations)
+    return [(key, distance) for distance, key in distances[:k]]
+
+def test_parse_coords():
+    latitude, longitude = parse_coords('北緯 35度41分22秒 東経 139度41分30秒')
+    assert latitude == pytest.approx(35 + 41 / 60 + 22 / 3600)
+    assert longitude == pytest.approx(139 + 41 / 60 + 30 / 3600)
+    assert parse_coords('北緯 35度41分22.5秒 東経 139度0分0秒')[0] == pytest.approx(35 + 41 / 60 + 22.5 / 3600)
+    assert parse_coords('北緯 35度41分22秒') is None
+    assert parse_coords('') is None
+    assert parse_coords(None) is None
+
+def test_haversine_km():
+    assert haversine_km(35.0, 139.0, 35.0, 139.0) == 0
+    # 経度1度 (赤道上) はおよそ111km
+    assert haversine_km(0, 0, 0, 1) == pytest.approx(111.19, abs=0.01)
+    # 東京 - 大阪はおよそ400km
+    assert haversine_km(35.681, 139.767, 34.702, 135.496) == pytest.approx(403, abs=5)
+
+def test_empty_index():
+    index = GridIndex()
+    assert index.nearest(35.0, 139.0) == []
+    assert index.within_bbox(30.0, 130.0, 40.0, 140.0) == []
+
+@pytest.mark.parametrize('cell_size', [0.25, 1.0, 2.0])
+def test_nearest_matches_brute_force(cell_size):
+    stations = random_stations(500)
+    index = build_index(stations, cell_size)
+    rng = random.Random(1)
+
+    for _ in range(50):
+        latitude, longitude = rng.uniform(20.0, 50.0), rng.uniform(118.0, 158.0)
+        k = rng.choice([1, 5, 20])
+        result = index.nearest(latitude, longitude, k)
+        expected = brute_nearest(stations, latitude, longitude, k)
+
+        assert [distance for _, distance in result] == pytest.approx([distance for _, distance in expected])
+        assert [key for key, _ in result] == [key for key, _ in expected]
+
+def test_nearest_far_outside_the_stations():
+    stations = random_stations(50, lat_range=(35.0, 36.0), lon_range=(139.0, 140.0))
+    index = build_index(stations)
+    result, expected = index.nearest(43.0, 141.3, 3), brute_nearest(stations, 43.0, 141.3, 3)
+    assert [key for key, _ in result] == [key for key, _ in expected]
+    assert [distance for _, distance in result] == pytest.approx([distance for _, distance in expected])
+
+def test_nearest_with_k_larger_than_index():
+    stations = random_stations(7)
+    index = build_index(stations)
+    assert [key for key, _ in index.nearest(35.0, 139.0, 100)] == [key for key, _ in brute_nearest(stations, 35.0, 139.0, 100)]
+    assert index.nearest(35.0, 139.0, 0) == []
+
+def test_nearest_at_high_latitude():
+    # 高緯度では経度方向のセル幅が狭く、遠くのセルのほうが近いことがある
+    stations = random_stations(300, lat_range=(60.0, 80.0), lon_range=(0.0, 40.0))
+    index = build_index(stations, 1.0)
+    rng = random.Random(2)
+    for _ in range(30):
+        latitude, longitude = rng.uniform(60.0, 80.0), rng.uniform(0.0, 40.0)
+        assert [key for key, _ in index.nearest(latitude, longitude, 5)] == \
+            [key for key, _ in brute_nearest(stations, latitude, longitude, 5)]
+
+@pytest.mark.parametrize('cell_size', [0.1, 0.25, 2.0])
+def test_within_bbox_matches_brute_force(cell_size):
+    stations = random_stations(500)
+    index = build_index(stations, cell_size)
+    rng = random.Random(3)
+
+    for _ in range(50):
+        min_lat, max_lat = sorted(rng.uniform(22.0, 48.0) for _ in range(2))
+        min_lon, max_lon = sorted(rng.uniform(120.0, 156.0) for _ in range(2))
+        expected = sorted((key, lat, lon) for key, lat, lon in stations
+                          if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon)
+        assert sorted(index.within_bbox(min_lat, min_lon, max_lat, max_lon)) == expected
+
+def test_within_bbox_includes_points_on_the_edges():
+    index = build_index([('edge', 35.0, 139.5), ('corner', 35.5, 140.0), ('outside', 35.5001, 140.0)])
+    assert sorted(key for key, _, _ in index.within_bbox(35.0, 139.5, 35.5, 140.0)) == ['corner', 'edge']
@@ -0,0 +1,197 @@
+import csv
+import json
+import logging
+import threading
+import time
+
+import pytest
+
+import getWISInfo
+from getWISInfo import RiverDataScraper, StationCsvWriter
+
+def page_rows(page_number, count=2):
+    return [[str(i), '雨量', '荒川', '荒川', f'観測所{page_number}_{i}', '東京都', '-00001', f'{page_number}{i:02d}'] for i in range(count)]
+
+# ページ番号ごとの行をfetch_pageで返すscraper (pagesにないページは空)
+class FakeScraper(RiverDataScraper):
+    def __init__(self, tmp_path, pages, delays=None):
+        files = []
+        for name, values in (('ken', {'東京都': '13'}), ('suikei', {'荒川': '83037000'}), ('komoku', {'雨量': '01'})):
+            path = tmp_path / f'{name}_values.json'
+            path.write_text(json.dumps(values, ensure_ascii=False), encoding='utf-8')
+            files.append(str(path))
+        super().__init__('http://example.invalid/SrchSite.exe', *files, session=object())
+        self.pages = pages
+        self.delays = delays or {}
+        self.fetched = []
+        self._fetched_lock = threading.Lock()
+
+    def fetch_page(self, ken_code, suikei_code, komoku_code, page_number):
+        with self._fetched_lock:
+            self.fetched.append((ken_code, suikei_code, komoku_code, page_number))
+        time.sleep(self.delays.get(page_number, 0))
+        if isinstance(self.pages.get(page_number), Exception):
+            raise self.pages[page_number]
+        return self.pages.get(page_number, [])
+
+    def fetched_pages(self):
+        return sorted(page_number for _, _, _, page_number in self.fetched)
+
+# submitされても、result()が呼ばれるまで実行しないexecutor
+class LazyFuture:
+    def __init__(self, fn, args):
+        self.fn, self.args = fn, args
+        self.cancelled = False
+
+    def result(self):
+        assert not self.cancelled
+        return self.fn(*self.args)
+
+    def cancel(self):
+        self.cancelled = True
+        return True
+
+class LazyExecutor:
+    instances = []
+
+    def __init__(self, max_workers=None):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = LazyFuture(fn, args)
+        self.futures.append(future)
+        return future
+
+    def __enter__(self):
+        LazyExecutor.instances.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+@pytest.fixture
+def lazy_executor(monkeypatch):
+    LazyExecutor.instances.clear()
+    monkeypatch.setattr(getWISInfo, 'ThreadPoolExecutor', LazyExecutor)
+    return LazyExecutor.instances
+
+def test_iter_pages_stops_at_the_first_empty_page(tmp_path, lazy_executor):
+    scraper = FakeScraper(tmp_path, {0: page_rows(0), 1: page_rows(1), 3: page_rows(3)})
+    pages = list(scraper.iter_pages('13', '-00001', '01', max_workers=3))
+
+    assert [page_number for page_number, _ in pages] == [0, 1]
+    assert pages[1][1] == page_rows(1)
+    # 空のページ(2)より後は取得しない
+    assert scraper.fetched_pages() == [0, 1, 2]
+    assert [future.cancelled for future in lazy_executor[0].futures] == [False, False, False, True, True]
+
+def test_iter_pages_cancels_lookahead_when_closed(tmp_path, lazy_executor):
+    scraper = FakeScraper(tmp_path, {page_number: page_rows(page_number) for page_number in range(10)})
+    pages = scraper.iter_pages('13', '-00001', '01', max_workers=4, start_page=2)
+
+    assert next(pages)[0] == 2
+    pages.close()
+
+    assert scraper.fetched_pages() == [2]
+    futures = lazy_executor[0].futures
+    assert len(futures) == 5
+    assert all(future.cancelled for future in futures[1:])
+
+def test_iter_pages_keeps_page_order_with_parallel_fetches(tmp_path):
+    # 前のページほど遅く返る
+    pages = {page_number: page_rows(page_number) for page_number in range(8)}
+    scraper = FakeScraper(tmp_path, pages, delays={page_number: (8 - page_number) * 0.01 for page_number in range(8)})
+
+    result = list(scraper.iter_pages('13', '-00001', '01', max_workers=4))
+
+    assert [page_number for page_number, _ in result] == list(range(8))
+    assert [rows for _, rows in result] == [pages[page_number] for page_number in range(8)]
+
+def test_iter_pages_raises_fetch_errors(tmp_path):
+    scraper = FakeScraper(tmp_path, {0: page_rows(0), 1: ConnectionError('reset'), 2: page_rows(2)})
+    pages = scraper.iter_pages('13', '-00001', '01', max_workers=2)
+
+    assert next(pages)[0] == 0
+    with pytest.raises(ConnectionError):
+        next(pages)
+
+def test_iter_pages_warns_when_max_pages_is_reached(tmp_path, lazy_executor, caplog):
+    scraper = FakeScraper(tmp_path, {page_number: page_rows(page_number) for page_number in range(10)})
+    with caplog.at_level(logging.WARNING):
+        pages = list(scraper.iter_pages('13', '-00001', '01', max_workers=2, max_pages=3))
+
+    assert [page_number for page_number, _ in pages] == [0, 1, 2]
+    assert scraper.fetched_pages() == [0, 1, 2]
+    assert 'Stopped after 3 pages' in caplog.text
+
+def test_iter_pages_does_not_warn_when_results_end(tmp_path, lazy_executor, caplog):
+    scraper = FakeScraper(tmp_path, {0: page_rows(0), 1: page_rows(1)})
+    with caplog.at_level(logging.WARNING):
+        list(scraper.iter_pages('13', '-00001', '01', max_workers=2, max_pages=3))
+    assert caplog.text == ''
+
+def test_iter_all_pages_accumulates_data(tmp_path):
+    scraper = FakeScraper(tmp_path, {0: page_rows(0), 1: page_rows(1, count=1)})
+    scraper.data = [['old']]
+
+    assert [page_number for page_number, _ in scraper.iter_all_pages('13', '-00001', '01', max_workers=2)] == [0, 1]
+    assert scraper.data == page_rows(0) + page_rows(1, count=1)
+
+def test_prefetch_pages(tmp_path):
+    scraper = FakeScraper(tmp_path, {0: page_rows(0), 1: page_rows(1)})
+    scraper.prefetch_pages('13', '-00001', '01', [1, -1])
+    scraper.prefetch_pages('13', '-00001', '01', [1])
+
+    assert scraper.is_page_cached('13', '-00001', '01', 1)
+    assert not scraper.is_page_cached('13', '-00001', '01', -1)
+    # 先読み済みのページは取得し直さない
+    assert scraper.get_page('13', '-00001', '01', 1) == page_rows(1)
+    assert scraper.fetched_pages() == [1]
+
+    # 検索条件が変わると前の条件のページは破棄
+    scraper.prefetch_pages('11', '-00001', '01', [0])
+    scraper.get_page('11', '-00001', '01', 0)
+    assert not scraper.is_page_cached('13', '-00001', '01', 1)
+
+def test_failed_prefetch_is_fetched_again(tmp_path):
+    scraper = FakeScraper(tmp_path, {1: ConnectionError('reset')})
+    scraper.prefetch_pages('13', '-00001', '01', [1])
+    assert isinstance(scraper._get_cached_page(('13', '-00001', '01'), 1).exception(timeout=5), ConnectionError)
+    scraper.pages[1] = page_rows(1)
+
+    assert scraper.get_page('13', '-00001', '01', 1) == page_rows(1)
+    assert scraper.fetched_pages() == [1, 1]
+
+def test_scrape_data_prefetches_neighbouring_pages(tmp_path):
+    scraper = FakeScraper(tmp_path, {0: page_rows(0), 1: page_rows(1), 2: page_rows(2)})
+    scraper.page_number = 1
+    scraper.scrape_data('13', '-00001', '01')
+
+    assert scraper.data == page_rows(1)
+    for page_number in (0, 2):
+        assert scraper.is_page_cached('13', '-00001', '01', page_number)
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        return list(csv.reader(file))
+
+def test_station_csv_writer(tmp_path):
+    output_dir = str(tmp_path / 'output')
+    with StationCsvWriter('stations.csv', output_dir=output_dir) as writer:
+        writer.write_rows(page_rows(0))
+        # ページごとにflushしているので書き込み途中でも読める
+        assert read_csv(writer.file_path) == [StationCsvWriter.HEADER] + page_rows(0)
+        writer.write_rows(page_rows(1, count=1))
+
+    assert writer.file.closed
+    assert writer.row_count == 3
+    assert read_csv(writer.file_path) == [StationCsvWriter.HEADER] + page_rows(0) + page_rows(1, count=1)
+
+def test_run_all_pages_streams_into_csv(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scraper = FakeScraper(tmp_path, {0: page_rows(0), 1: page_rows(1)})
+    scraper.run('東京都', '荒川', '雨量', all_pages=True)
+
+    assert read_csv(str(tmp_path / 'output' / 'river_data_東京都_荒川_雨量.csv')) == \
+        [StationCsvWriter.HEADER] + page_rows(0) + page_rows(1)
+    assert ('13', '83037000', '01', 0) in scraper.fetched
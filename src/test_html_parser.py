@@ -0,0 +1,145 @@
+import pytest
+
+import getDetailInfo
+from base_srch_data import BaseSrchData, SrchPage
+from getDetailInfo import DetailInfoScraper, SiteHtmlChecker
+from site_info import SiteInfoPage
+from utils import html_parser
+from utils.html_parser import available_backends, find_first, get_lookup_backend, get_parser_backend, make_soup, set_parser_backend
+
+TREE_BACKENDS = [name for name in available_backends() if name != 'selectolax']
+
+# WISのページと同じく、大文字のtag・閉じていないtd/tr・引用符のない属性を含む
+SRCH_PAGE_HTML = '''<HTML><HEAD>
+<META http-equiv="Content-Type" content="text/html; charset=EUC-JP">
+<TITLE>水文水質データベース</TITLE></HEAD>
+<BODY>
+<CENTER><FONT size="+2">時刻雨量検索</FONT></CENTER>
+<TABLE border="1" cellpadding=2>
+<TR><TH>番号<TH>観測所名<TH>水系名<TH>河川名
+<TR><TD>1</TD><TD>岩淵水門</TD><TD>荒川</TD><TD>荒川</TD></TR>
+</TABLE>
+<TABLE border=0>
+<TR align=CENTER><TD bgcolor="#FFFFCC">201*</TD>
+<TD><IMG src="/img/ari.gif"></TD><TD><IMG src="/img/nashi.gif"></TD><TD><IMG src="/img/ari.gif">
+<TD><IMG src="/img/nashi.gif"><TD><IMG src="/img/nashi.gif"><TD><IMG src="/img/nashi.gif">
+<TD><IMG src="/img/nashi.gif"><TD><IMG src="/img/nashi.gif"><TD><IMG src="/img/nashi.gif"><TD><IMG src="/img/ari.gif">
+<TR align=CENTER><TD bgcolor="#FFFFCC">202</TD>
+<TD><IMG src="/img/ari.gif"><TD><IMG src="/img/ari.gif"><TD><IMG src="/img/nashi.gif"><TD><IMG src="/img/nashi.gif">
+<TD><IMG src="/img/nashi.gif"><TD><IMG src="/img/nashi.gif"><TD><IMG src="/img/nashi.gif"><TD><IMG src="/img/nashi.gif">
+<TD><IMG src="/img/nashi.gif"><TD><IMG src="/img/nashi.gif">
+</TABLE>
+</BODY></HTML>
+'''
+
+# 閉じていない<tr>はhtml.parserでは次の<tr>を中に入れてしまい、lxmlと結果が変わる
+SITE_INFO_HTML = '''<html><head>
+<meta http-equiv="Content-Type" content="text/html; charset=EUC-JP">
+</head><body>
+<table align="CENTER" width="600" border=1>
+<tr><td>観測所名</td><td> 岩淵水門 </td></tr>
+<tr><td>所在地</td><td>東京都北区志茂５丁目</td></tr>
+<tr><td>緯度経度</td><td>北緯 35度47分0秒 東経 139度43分10秒</td></tr>
+<tr><td colspan=2>備考なし</td></tr>
+</table>
+<a href="DspMapPosition.exe?ID=123"><img src="/img/btn_view_pos.png" alt="位置図"></a>
+<a href="SrchRainData.exe?ID=123&KIND=1"><img src="/img/btn.gif" alt="時刻雨量"></a>
+</body></html>
+'''
+
+DSP_DATA_HTML = '''<HTML><BODY>
+<A href="/cgi-bin/SiteInfo.exe?ID=123">観測所</A>
+<A href="/dat/dload/download/12345-67.dat" target=_blank>ダウンロード</A>
+<IMG src="/img/map/0123.gif" alt="拡大図1">
+</BODY></HTML>
+'''
+
+@pytest.fixture(autouse=True)
+def reset_backend(monkeypatch):
+    monkeypatch.delenv(html_parser.PARSER_ENV_VAR, raising=False)
+    set_parser_backend(None)
+    yield
+    set_parser_backend(None)
+
+@pytest.fixture(params=TREE_BACKENDS)
+def tree_backend(request):
+    set_parser_backend(request.param)
+    return request.param
+
+def parse_srch_page(html):
+    page = SrchPage.from_html(html)
+    return page.header_value, page.table_data, page.station_data
+
+def test_srch_page_is_parsed_the_same_by_each_backend(tree_backend):
+    header_value, table_data, station_data = parse_srch_page(SRCH_PAGE_HTML)
+
+    assert get_parser_backend() == tree_backend
+    assert header_value == '時刻雨量検索'
+    assert station_data == {'観測所名': '岩淵水門', '水系名': '荒川', '河川名': '荒川'}
+    assert table_data[:4] == ['2010 - ari', '2011 - nashi', '2012 - ari', '2013 - nashi']
+    assert len(table_data) == 20
+    assert table_data[9] == '2019 - ari'
+
+    set_parser_backend('html.parser')
+    assert parse_srch_page(SRCH_PAGE_HTML) == (header_value, table_data, station_data)
+
+def test_site_info_is_parsed_the_same_by_each_backend(tree_backend, monkeypatch):
+    monkeypatch.setattr(getDetailInfo, 'fetch_site_info', lambda js_detail, session: SiteInfoPage(200, make_soup(SITE_INFO_HTML)))
+
+    assert DetailInfoScraper('123', session=object()).scrape() == {
+        '観測所名': '岩淵水門',
+        '所在地': '東京都北区志茂５丁目',
+        '緯度経度': '北緯 35度47分0秒 東経 139度43分10秒',
+    }
+    assert SiteHtmlChecker('123', session=object()).check_for_image()
+
+@pytest.mark.parametrize('backend', available_backends())
+@pytest.mark.parametrize('markup', [SRCH_PAGE_HTML, SRCH_PAGE_HTML.encode('EUC-JP')], ids=['str', 'bytes'])
+def test_find_first_is_the_same_for_each_backend(backend, markup):
+    header = find_first(markup, 'font', {'size': '+2'}, backend=backend)
+    assert header.text == '時刻雨量検索'
+    row = find_first(markup, 'tr', {'align': 'CENTER'}, backend=backend)
+    assert row.text.startswith('201*')
+    assert find_first(markup, 'a', {'href': True, 'target': '_blank'}, backend=backend) is None
+
+    link = find_first(DSP_DATA_HTML, 'a', {'href': True, 'target': '_blank'}, backend=backend)
+    assert (link.text, link['href']) == ('ダウンロード', '/dat/dload/download/12345-67.dat')
+    assert find_first(DSP_DATA_HTML, 'img', {'alt': '拡大図1'}, backend=backend)['src'] == '/img/map/0123.gif'
+
+def test_extract_temp_number_fallback_is_the_same_for_each_backend():
+    # regexに合わないリンク (hrefの前にtarget、/dat/dload/download/がない) はparserで探す
+    content = '<a target="_blank" href="../tmp/98765.dat">データ</a>'.encode('EUC-JP')
+    for backend in available_backends():
+        set_parser_backend(backend)
+        assert BaseSrchData.extract_temp_number(content) == '98765'
+
+def test_find_first_honors_the_requested_backend(monkeypatch):
+    def fail(*args):
+        raise AssertionError("selectolax should not be used")
+
+    monkeypatch.setattr(html_parser, '_find_first_selectolax', fail)
+    set_parser_backend('html.parser')
+
+    assert get_lookup_backend() == 'html.parser'
+    assert find_first(DSP_DATA_HTML, 'img', {'alt': '拡大図1'})['src'] == '/img/map/0123.gif'
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_backend_from_environment(backend, monkeypatch):
+    monkeypatch.setenv(html_parser.PARSER_ENV_VAR, backend)
+    html_parser._backend_resolved = False
+
+    assert get_lookup_backend() == backend
+    # selectolaxではtreeを作れないので、make_soupは自動で選んだbackendを使う
+    assert get_parser_backend() == (backend if backend != 'selectolax' else TREE_BACKENDS[0])
+    assert make_soup(SITE_INFO_HTML).find('img', alt='位置図') is not None
+
+def test_default_backends(monkeypatch, caplog):
+    monkeypatch.setenv(html_parser.PARSER_ENV_VAR, 'unknown')
+    html_parser._backend_resolved = False
+
+    assert get_parser_backend() == TREE_BACKENDS[0]
+    assert get_lookup_backend() == ('selectolax' if 'selectolax' in available_backends() else TREE_BACKENDS[0])
+    assert 'WIS_HTML_PARSER=unknown is not available' in caplog.text
+
+    with pytest.raises(ValueError):
+        set_parser_backend('unknown')
@@ -0,0 +1,149 @@
+import datetime
+import os
+
+import pytest
+
+import incremental_sync
+
+from conftest import STATION_DATA, write_file
+from incremental_sync import SyncSkipped, find_local_stations, latest_local_period, plan_sync, plan_sync_range
+from job_manifest import JobManifest, STATION_INDEX_FILE_NAME, write_station_index
+from SrchRainData import SrchRainData_1, SrchRainData_3
+
+TODAY = datetime.date(2024, 5, 15)
+
+def touch(directory, *names):
+    os.makedirs(directory, exist_ok=True)
+    for name in names:
+        write_file(os.path.join(directory, name))
+
+def test_latest_local_period(tmp_path):
+    directory = str(tmp_path / 'station')
+    assert latest_local_period(directory) is None
+
+    touch(directory, '_manifest.jsonl', '_station.json', 'x.part')
+    assert latest_local_period(directory) is None
+
+    touch(directory, '2023_12.dat', '2024_02.dat', '2019_11.dat')
+    assert latest_local_period(directory) == (2024, 2)
+
+def test_latest_local_period_yearly(tmp_path):
+    directory = str(tmp_path / 'station')
+    touch(directory, '2019.dat', '2022.dat', '2010-2020.dat')
+    assert latest_local_period(directory) == (2022, None)
+
+def test_find_local_stations(tmp_path):
+    write_station_index(str(tmp_path / 'SrchWaterData_1_b'), '222', 'SrchWaterData', 1)
+    write_station_index(str(tmp_path / 'SrchRainData_3_a'), '111', 'SrchRainData', 3)
+    touch(str(tmp_path / 'without_index'), '2020.dat')
+
+    assert find_local_stations(str(tmp_path)) == [
+        {'js_detail': '111', 'data_type': 'SrchRainData', 'kind': '3'},
+        {'js_detail': '222', 'data_type': 'SrchWaterData', 'kind': '1'},
+    ]
+    assert find_local_stations(str(tmp_path / 'missing')) == []
+
+def test_find_local_stations_skips_broken_indexes(tmp_path):
+    write_station_index(str(tmp_path / 'SrchRainData_3_a'), '111', 'SrchRainData', 3)
+    write_file(str(tmp_path / 'SrchRainData_1_b' / STATION_INDEX_FILE_NAME), b'{"js_detail": "22')
+
+    assert find_local_stations(str(tmp_path)) == [{'js_detail': '111', 'data_type': 'SrchRainData', 'kind': '3'}]
+
+@pytest.mark.parametrize('latest, monthly, expected', [
+    # 最新の月から今月まで、最新の月は取り直す
+    ((2024, 2), True, ('2024/02', '2024/05', '2024_02')),
+    ((2023, 11), True, ('2023/11', '2024/05', '2023_11')),
+    ((2024, 5), True, ('2024/05', '2024/05', '2024_05')),
+    # 今日より後の期間があっても今月/今年だけ
+    ((2024, 9), True, ('2024/05', '2024/05', '2024_05')),
+    ((2030, 1), True, ('2024/05', '2024/05', '2024_05')),
+    ((2021, None), False, ('2021', '2024', '2021')),
+    ((2024, None), False, ('2024', '2024', '2024')),
+    ((2026, None), False, ('2024', '2024', '2024')),
+])
+def test_plan_sync_range(latest, monthly, expected):
+    assert plan_sync_range(latest, monthly, TODAY) == expected
+
+@pytest.mark.parametrize('initial_start, monthly, expected', [
+    ('2020/03', True, ('2020/03', '2024/05', None)),
+    ('2020', True, ('2020/01', '2024/05', None)),
+    ('2020/03', False, ('2020', '2024', None)),
+    ('2020', False, ('2020', '2024', None)),
+])
+def test_plan_sync_range_without_local_data(initial_start, monthly, expected):
+    assert plan_sync_range(None, monthly, TODAY, initial_start) == expected
+
+def test_plan_sync_range_without_local_data_or_initial_start():
+    with pytest.raises(SyncSkipped):
+        plan_sync_range(None, True, TODAY)
+
+def test_plan_sync_range_rejects_yearly_files_for_monthly_kind():
+    with pytest.raises(SyncSkipped):
+        plan_sync_range((2023, None), True, TODAY)
+
+def test_plan_sync_range_for_yearly_kind_ignores_month():
+    assert plan_sync_range((2022, 7), False, TODAY) == ('2022', '2024', '2022')
+
+# Srch*Data.exeを取得しない観測所
+class OfflineRainData_1(SrchRainData_1):
+    def fetch_station_data(self):
+        return dict(STATION_DATA)
+
+class OfflineRainData_3(SrchRainData_3):
+    def fetch_station_data(self):
+        return "Error accessing the page"
+
+@pytest.fixture
+def offline_classes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    classes = {'1': OfflineRainData_1, '3': OfflineRainData_3}
+    real_get_data_class = incremental_sync.get_data_class
+    monkeypatch.setattr(incremental_sync, 'get_data_class',
+                        lambda data_type, kind: classes.get(str(kind)) or real_get_data_class(data_type, kind))
+
+def test_plan_sync_invalidates_the_latest_period(offline_classes):
+    entry = {'js_detail': '123', 'data_type': 'rain', 'kind': '1'}
+    directory = OfflineRainData_1('123', 1).get_directory()
+    touch(directory, '2024_01.dat', '2024_02.dat')
+    manifest = JobManifest(directory)
+    manifest.record_done('2024_02', os.path.join(directory, '2024_02.dat'))
+
+    planned = plan_sync(entry, today=TODAY)
+
+    assert planned == dict(entry, data_type='SrchRainData', start='2024/02', end='2024/05', directory=directory)
+    assert JobManifest(directory).get('2024_02')['state'] == 'stale'
+
+def test_plan_sync_reads_the_download_dir(offline_classes, tmp_path):
+    entry = {'js_detail': '123', 'data_type': 'rain', 'kind': '1'}
+    handler = OfflineRainData_1('123', 1)
+    handler.download_dir = str(tmp_path / 'data')
+    directory = handler.get_directory()
+    touch(directory, '2024_03.dat')
+
+    planned = plan_sync(entry, today=TODAY, download_dir=str(tmp_path / 'data'))
+
+    assert directory.startswith(str(tmp_path / 'data'))
+    assert (planned['start'], planned['directory']) == ('2024/03', directory)
+    # ./Download側にはデータがないので、download_dirを見なければ取得できない
+    with pytest.raises(SyncSkipped):
+        plan_sync(entry, today=TODAY)
+
+def test_plan_sync_uses_entry_start_for_new_stations(offline_classes):
+    planned = plan_sync({'js_detail': '123', 'data_type': 'rain', 'kind': '1', 'start': '2023/10'}, initial_start='2000/01', today=TODAY)
+
+    assert (planned['start'], planned['end']) == ('2023/10', '2024/05')
+    assert not os.path.exists(planned['directory'])
+
+@pytest.mark.parametrize('entry', [
+    {'js_detail': '123', 'data_type': 'rain', 'kind': '4'},  # 期間のkind
+    {'js_detail': '123', 'data_type': 'rain', 'kind': '9'},
+    {'js_detail': '123', 'data_type': 'snow', 'kind': '1'},
+    {'js_detail': '123', 'data_type': 'rain', 'kind': '1'},  # ローカルにデータがなくinitial_startもない
+])
+def test_plan_sync_skips(offline_classes, entry):
+    with pytest.raises(SyncSkipped):
+        plan_sync(entry, today=TODAY)
+
+def test_plan_sync_fails_when_the_page_is_not_available(offline_classes):
+    with pytest.raises(RuntimeError):
+        plan_sync({'js_detail': '123', 'data_type': 'rain', 'kind': '3'}, initial_start='2020', today=TODAY)
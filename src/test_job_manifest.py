@@ -0,0 +1,159 @@
+import datetime
+import json
+import os
+
+import pytest
+
+from conftest import OfflineSrchData, RecordingSession, write_file
+from job_manifest import (
+    JobManifest, MANIFEST_FILE_NAME, STATION_INDEX_FILE_NAME,
+    is_open_period, period_key, read_station_index, write_station_index,
+)
+
+TODAY = datetime.date(2024, 5, 15)
+
+def test_period_key():
+    assert period_key(2020, 1) == '2020_01'
+    assert period_key(2020, 12) == '2020_12'
+    assert period_key(2020) == '2020'
+    assert period_key('2010-2020') == '2010-2020'
+
+@pytest.mark.parametrize('period, expected', [
+    ('2024_04', False),
+    ('2024_05', True),
+    ('2024_06', True),
+    ('2023_12', False),
+    ('2023', False),
+    ('2024', True),
+    ('2025', True),
+    ('2010-2023', False),
+    ('2010-2024', True),
+])
+def test_is_open_period(period, expected):
+    assert is_open_period(period, TODAY) is expected
+
+def test_is_done_after_record_done(tmp_path):
+    manifest = JobManifest(str(tmp_path))
+    file_path = write_file(str(tmp_path / '2024_04.dat'))
+
+    assert not manifest.is_done('2024_04', file_path, today=TODAY)
+    manifest.record_done('2024_04', file_path)
+    assert manifest.is_done('2024_04', file_path, today=TODAY)
+    assert manifest.is_done('2024_04', file_path, verify_checksum=True, today=TODAY)
+
+def test_open_period_is_never_done(tmp_path):
+    manifest = JobManifest(str(tmp_path))
+    for period in ('2024_05', '2024', '2020-2024'):
+        file_path = write_file(str(tmp_path / f'{period}.dat'))
+        manifest.record_done(period, file_path)
+        assert manifest.get(period)['state'] == 'done'
+        assert not manifest.is_done(period, file_path, today=TODAY)
+
+def test_is_done_checks_the_file(tmp_path):
+    manifest = JobManifest(str(tmp_path))
+    file_path = write_file(str(tmp_path / '2020_01.dat'))
+    manifest.record_done('2020_01', file_path)
+
+    # 同じサイズで中身が違う場合はchecksumでだけ分かる
+    write_file(file_path, b'DATA')
+    assert manifest.is_done('2020_01', file_path, today=TODAY)
+    assert not manifest.is_done('2020_01', file_path, verify_checksum=True, today=TODAY)
+
+    write_file(file_path, b'truncated')
+    assert not manifest.is_done('2020_01', file_path, today=TODAY)
+
+    os.remove(file_path)
+    assert not manifest.is_done('2020_01', file_path, today=TODAY)
+
+def test_failed_and_invalidated_periods_are_not_done(tmp_path):
+    manifest = JobManifest(str(tmp_path))
+    first = write_file(str(tmp_path / '2020_01.dat'))
+    second = write_file(str(tmp_path / '2020_02.dat'))
+    manifest.record_done('2020_01', first)
+    manifest.record_done('2020_02', second)
+
+    manifest.record_failed('2020_01', RuntimeError('timeout'))
+    manifest.invalidate('2020_02')
+
+    assert not manifest.is_done('2020_01', first, today=TODAY)
+    assert not manifest.is_done('2020_02', second, today=TODAY)
+    assert manifest.failed_periods() == ['2020_01']
+    assert manifest.get('2020_01')['error'] == 'timeout'
+
+def test_reload_skips_a_broken_last_line(tmp_path):
+    manifest = JobManifest(str(tmp_path))
+    file_path = write_file(str(tmp_path / '2020_01.dat'))
+    manifest.record_done('2020_01', file_path)
+    with open(manifest.path, 'a', encoding='utf-8') as file:
+        file.write('{"period": "2020_02", "sta')
+
+    reloaded = JobManifest(str(tmp_path))
+    assert reloaded.is_done('2020_01', file_path, today=TODAY)
+    assert reloaded.get('2020_02') is None
+
+def test_compact_keeps_the_last_record(tmp_path):
+    manifest = JobManifest(str(tmp_path))
+    file_path = write_file(str(tmp_path / '2020_01.dat'))
+    manifest.record_failed('2020_01', RuntimeError('timeout'))
+    manifest.record_done('2020_01', file_path)
+    manifest.compact()
+
+    with open(os.path.join(str(tmp_path), MANIFEST_FILE_NAME), encoding='utf-8') as file:
+        records = [json.loads(line) for line in file]
+    assert [record['state'] for record in records] == ['done']
+    assert JobManifest(str(tmp_path)).is_done('2020_01', file_path, today=TODAY)
+
+def test_station_index(tmp_path):
+    directory = str(tmp_path / 'station')
+    assert read_station_index(directory) is None
+
+    write_station_index(directory, 123, 'SrchRainData', '1')
+    write_station_index(directory, 456, 'SrchWaterData', 2)  # 既にあれば書き換えない
+    assert read_station_index(directory) == {'js_detail': '123', 'data_type': 'SrchRainData', 'kind': 1}
+    assert os.path.exists(os.path.join(directory, STATION_INDEX_FILE_NAME))
+    assert os.listdir(directory) == [STATION_INDEX_FILE_NAME]
+
+@pytest.mark.parametrize('content', [b'', b'{"js_detail": "123", "data_ty', b'[1, 2]', b'{"js_detail": "123"}', b'\xff\xfe'])
+def test_broken_station_index_is_ignored_and_rewritten(tmp_path, content):
+    directory = str(tmp_path / 'station')
+    write_file(os.path.join(directory, STATION_INDEX_FILE_NAME), content)
+    assert read_station_index(directory) is None
+
+    write_station_index(directory, 123, 'SrchRainData', 1)
+    assert read_station_index(directory) == {'js_detail': '123', 'data_type': 'SrchRainData', 'kind': 1}
+
+def record_months(handler, months):
+    for year, month in months:
+        write_file(handler.get_file_path(year, month))
+        handler.record_done(year, month)
+
+def test_resume_skips_only_closed_periods(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    today = datetime.date.today()
+    last_month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+
+    handler = OfflineSrchData(last_month, (today.year, today.month))
+    record_months(handler, [last_month, (today.year, today.month)])
+
+    # 先月は完了済みでスキップ、今月はまだ途中なので取得し直す
+    assert handler.planned_months() == [(today.year, today.month)]
+    assert handler.skipped_periods == {period_key(*last_month)}
+
+    handler = OfflineSrchData(last_month, (today.year, today.month))
+    handler.resume = False
+    assert handler.planned_months() == [last_month, (today.year, today.month)]
+
+def test_scrape_data_returns_early_for_done_periods(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    session = RecordingSession()
+    handler = OfflineSrchData((2020, 1), (2020, 2), session=session)
+    record_months(handler, [(2020, 1)])
+
+    handler.scrape_data('http://example.invalid/Dsp', 2020, 1)
+    assert session.urls == []
+
+    # 失敗した期間はmanifestに残る
+    with pytest.raises(AssertionError):
+        handler.scrape_data('http://example.invalid/Dsp', 2020, 2)
+    assert session.urls == ['http://example.invalid/Dsp']
+    assert handler.get_manifest().failed_periods() == ['2020_02']
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from PyQt5.QtCore import QSize
+from PyQt5.QtGui import QColor, QImage
+
+from conftest import RecordingSession
+from map_image_loader import MAP_IMAGE_SIZE, MapImageLoader, extract_map_coords, map_cache_path, save_map_image
+
+COORDS = '北緯 35度41分22秒 東経 139度41分30秒'
+
+def make_image(width, height, color='red'):
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(QColor(color))
+    return image
+
+def test_extract_map_coords():
+    assert extract_map_coords(COORDS) == ('0354122000', '1394130000')
+    # 1桁の分・秒も2桁にする
+    assert extract_map_coords('北緯 26度5分7秒 東経 127度40分0秒') == ('0260507000', '1274000000')
+
+def test_map_cache_path():
+    assert map_cache_path('123') == os.path.join('.', 'cache', 'map', '123_400x300.png')
+    assert map_cache_path('123', QSize(200, 150), cache_dir='maps') == os.path.join('maps', '123_200x150.png')
+
+def test_save_map_image_replaces_the_file(tmp_path):
+    file_path = str(tmp_path / 'map' / '123_400x300.png')
+    save_map_image(make_image(40, 30), file_path)
+    save_map_image(make_image(20, 10, 'blue'), file_path)
+
+    image = QImage(file_path)
+    assert (image.width(), image.height()) == (20, 10)
+    assert image.pixelColor(0, 0) == QColor('blue')
+    assert os.listdir(str(tmp_path / 'map')) == ['123_400x300.png']
+
+def test_save_map_image_keeps_the_old_file_on_failure(tmp_path):
+    file_path = str(tmp_path / 'map' / '123_400x300.png')
+    save_map_image(make_image(40, 30), file_path)
+
+    # 空のQImageは保存できない
+    with pytest.raises(OSError):
+        save_map_image(QImage(), file_path)
+
+    assert QImage(file_path).width() == 40
+    assert os.listdir(str(tmp_path / 'map')) == ['123_400x300.png']
+
+def run_loader(loader):
+    images = []
+    loader.imageLoaded.connect(images.append)
+    loader.run()
+    return images
+
+def test_cache_hit_makes_no_request(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    save_map_image(make_image(400, 300, 'green'), map_cache_path('123'))
+    session = RecordingSession()
+
+    loader = MapImageLoader('123', COORDS, session=session)
+    fetch_image = loader.fetch_image
+    fetched = []
+    loader.fetch_image = lambda: fetched.append(1) or fetch_image()
+    images = run_loader(loader)
+
+    assert fetched == []
+    assert session.urls == []
+    assert len(images) == 1
+    assert images[0].size() == MAP_IMAGE_SIZE
+    assert images[0].pixelColor(0, 0) == QColor('green')
+
+def test_cache_miss_stores_the_scaled_image(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    loader = MapImageLoader('123', COORDS, session=RecordingSession())
+    fetched = []
+    loader.fetch_image = lambda: fetched.append(1) or make_image(800, 600)
+
+    images = run_loader(loader)
+    assert images[0].size() == MAP_IMAGE_SIZE
+    assert QImage(map_cache_path('123')).size() == MAP_IMAGE_SIZE
+
+    # 2回目はキャッシュから
+    loader = MapImageLoader('123', COORDS, session=RecordingSession())
+    loader.fetch_image = lambda: fetched.append(1) or make_image(800, 600)
+    run_loader(loader)
+    assert fetched == [1]
+
+def test_unreadable_cache_is_fetched_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.dirname(map_cache_path('123')))
+    with open(map_cache_path('123'), 'wb') as file:
+        file.write(b'not a png')
+
+    loader = MapImageLoader('123', COORDS, session=RecordingSession())
+    loader.fetch_image = lambda: make_image(400, 300, 'blue')
+    images = run_loader(loader)
+
+    assert images[0].pixelColor(0, 0) == QColor('blue')
+    assert QImage(map_cache_path('123')).pixelColor(0, 0) == QColor('blue')
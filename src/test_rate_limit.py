@@ -0,0 +1,220 @@
+import multiprocessing
+import threading
+
+import pytest
+
+from conftest import FakeClock, StatusAdapter
+from http_session import HttpSession
+from response_cache import ResponseCache
+from utils.rate_limit import AdaptiveConcurrency, TokenBucket, MIN_LATENCY_SAMPLES
+
+# ---------------------------- TokenBucket ---------------------------- #
+
+def test_bucket_starts_full_and_refills():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock)
+
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+    clock.now += 0.25  # 0.5 token
+    assert not bucket.try_acquire()
+    clock.now += 0.25
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+def test_bucket_refill_is_capped_at_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=5, burst=2, clock=clock)
+    bucket.try_acquire()
+    bucket.try_acquire()
+
+    clock.now += 3600
+    assert bucket.tokens == 2
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+
+def test_bucket_acquire_sleeps_until_the_next_token():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=4, burst=1, clock=clock, sleep=clock.sleep)
+
+    bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(0.25), pytest.approx(0.25)]
+    assert clock.now == pytest.approx(100.5)
+
+def test_bucket_default_burst():
+    assert TokenBucket(rate=10).burst == 10
+    assert TokenBucket(rate=0.5).burst == 1
+
+def test_bucket_rejects_invalid_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+def test_buckets_sharing_state_share_tokens():
+    clock = FakeClock()
+    first = TokenBucket.shared(rate=1, burst=2, clock=clock)
+    second = TokenBucket(first.rate, first.burst, lock=first._lock, state=first._state, clock=clock)
+
+    assert first.try_acquire()
+    assert second.try_acquire()
+    assert not first.try_acquire()
+    clock.now += 1
+    assert second.try_acquire()
+    assert not first.try_acquire()
+
+def _take_tokens(bucket, attempts, counter):
+    for _ in range(attempts):
+        if bucket.try_acquire():
+            with counter.get_lock():
+                counter.value += 1
+
+def test_shared_bucket_across_processes():
+    # refillがほぼない速度なので、全プロセスで取れるのはburstの分だけ
+    bucket = TokenBucket.shared(rate=0.001, burst=5)
+    counter = multiprocessing.Value('i', 0)
+    processes = [multiprocessing.Process(target=_take_tokens, args=(bucket, 5, counter)) for _ in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    assert counter.value == 5
+    assert not bucket.try_acquire()
+
+# ------------------------- AdaptiveConcurrency ------------------------- #
+
+def release_ok(concurrency, clock, latency=0.1, count=1):
+    for _ in range(count):
+        concurrency.acquire()
+        started_at = clock()
+        clock.now += latency
+        concurrency.release(started_at, ok=True)
+
+def test_additive_increase():
+    clock = FakeClock()
+    concurrency = AdaptiveConcurrency(initial=2, maximum=16, clock=clock)
+
+    release_ok(concurrency, clock)
+    assert concurrency.limit == pytest.approx(2.5)
+    release_ok(concurrency, clock)
+    assert concurrency.limit == pytest.approx(2.9)
+
+    # limit件ごとにおよそ+1
+    release_ok(concurrency, clock, count=3)
+    assert 3.5 < concurrency.limit < 4.0
+
+def test_increase_is_capped_at_maximum():
+    clock = FakeClock()
+    concurrency = AdaptiveConcurrency(initial=3, maximum=4, clock=clock)
+    release_ok(concurrency, clock, count=50)
+    assert concurrency.limit == 4
+
+def test_failure_halves_the_limit():
+    clock = FakeClock()
+    concurrency = AdaptiveConcurrency(initial=8, clock=clock)
+
+    concurrency.acquire()
+    concurrency.release(clock(), ok=False)
+    assert concurrency.limit == 4
+    assert concurrency.in_flight == 0
+
+def test_halve_once_per_congestion():
+    clock = FakeClock()
+    concurrency = AdaptiveConcurrency(initial=8, clock=clock)
+
+    # 同じ混雑の中で送った4つのリクエストが全部失敗しても半分にするのは1回
+    started = []
+    for _ in range(4):
+        concurrency.acquire()
+        started.append(clock())
+        clock.now += 0.01
+    for started_at in started:
+        clock.now += 1
+        concurrency.release(started_at, ok=False)
+    assert concurrency.limit == 4
+
+    # 減らした後に送ったリクエストの失敗ではまた減らす
+    concurrency.acquire()
+    started_at = clock()
+    clock.now += 1
+    concurrency.release(started_at, ok=False)
+    assert concurrency.limit == 2
+
+def test_limit_never_drops_below_minimum():
+    clock = FakeClock()
+    concurrency = AdaptiveConcurrency(initial=2, minimum=1, clock=clock)
+    for _ in range(5):
+        concurrency.acquire()
+        started_at = clock()
+        clock.now += 1
+        concurrency.release(started_at, ok=False)
+    assert concurrency.limit == 1
+
+def test_slow_response_counts_as_congestion():
+    clock = FakeClock()
+    concurrency = AdaptiveConcurrency(initial=4, maximum=4, clock=clock)
+    release_ok(concurrency, clock, latency=0.1, count=MIN_LATENCY_SAMPLES)
+    assert concurrency.latency == pytest.approx(0.1)
+
+    release_ok(concurrency, clock, latency=0.25)  # 平均の3倍以内
+    assert concurrency.limit == 4
+    release_ok(concurrency, clock, latency=1.0)
+    assert concurrency.limit == 2
+
+def test_neutral_release_does_not_adjust():
+    clock = FakeClock()
+    concurrency = AdaptiveConcurrency(initial=4, clock=clock)
+    concurrency.acquire()
+    concurrency.release(clock(), ok=None)
+
+    assert concurrency.limit == 4
+    assert concurrency.in_flight == 0
+
+def test_acquire_waits_for_a_free_slot():
+    concurrency = AdaptiveConcurrency(initial=1, maximum=1)
+    concurrency.acquire()
+
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (concurrency.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.2)
+
+    concurrency.release(concurrency.clock(), ok=None)
+    assert acquired.wait(5)
+    thread.join(5)
+    assert concurrency.in_flight == 1
+
+# ---------------------------- HttpSession ---------------------------- #
+
+class CountingBucket:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self):
+        self.acquired += 1
+
+def test_session_halves_concurrency_on_server_errors():
+    session = HttpSession(pool_size=16, rate=None)
+    session.session.mount('http://', StatusAdapter(503))
+    concurrency = session.throttle_for('http://www1.river.go.jp/')[1]
+    concurrency.limit = 8
+
+    assert session.get('http://www1.river.go.jp/cgi-bin/x').status_code == 503
+    assert concurrency.limit == 4
+    assert concurrency.in_flight == 0
+
+def test_session_takes_tokens_only_for_real_requests(tmp_path):
+    bucket = CountingBucket()
+    session = HttpSession(cache=ResponseCache(str(tmp_path / 'cache.sqlite3')), rate_limiter=bucket)
+    adapter = StatusAdapter(200)
+    session.session.mount('http://', adapter)
+
+    url = 'http://www1.river.go.jp/cgi-bin/SiteInfo.exe?ID=1'
+    session.get(url)
+    session.get(url)
+    session.close()
+
+    assert adapter.requests == 1
+    assert bucket.acquired == 1
@@ -0,0 +1,240 @@
+import re
+import sqlite3
+import types
+
+import pytest
+
+import response_cache
+
+from conftest import FakeClock, StatusAdapter
+from http_session import HttpSession
+from response_cache import ResponseCache, normalize_url
+
+SITE_URL = 'http://www1.river.go.jp/cgi-bin/SiteInfo.exe?ID=101'
+DATA_URL = 'http://www1.river.go.jp/cgi-bin/SrchRainData.exe?ID=101&KIND=1&PAGE=0'
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock(1_700_000_000.0)
+    monkeypatch.setattr(response_cache, 'time', types.SimpleNamespace(time=clock))
+    return clock
+
+@pytest.fixture
+def http_cache(tmp_path, clock):
+    http_cache = ResponseCache(str(tmp_path / 'cache' / 'http_cache.sqlite3'))
+    yield http_cache
+    http_cache.close()
+
+def test_normalize_url():
+    assert normalize_url('HTTP://WWW1.River.go.jp/cgi-bin/SiteInfo.exe?KIND=1&ID=101#top') == \
+        'http://www1.river.go.jp/cgi-bin/SiteInfo.exe?ID=101&KIND=1'
+    # pathの大文字小文字は区別する
+    assert normalize_url('http://a/X.exe') != normalize_url('http://a/x.exe')
+
+def test_ttl_per_endpoint(http_cache):
+    assert http_cache.ttl_for(SITE_URL) == 7 * 24 * 60 * 60
+    assert http_cache.ttl_for('http://www1.river.go.jp/cgi-bin/SrchSite.exe?KOMOKU=01') == 24 * 60 * 60
+    assert http_cache.ttl_for(DATA_URL) == 60 * 60
+    assert http_cache.ttl_for('http://www1.river.go.jp/cgi-bin/DspRainData.exe?KIND=1') is None
+    assert http_cache.ttl_for('http://www1.river.go.jp/dat/dload/download/123.dat') is None
+
+def test_put_and_get_raw_bytes(http_cache):
+    content = '観測所'.encode('euc_jp')
+    http_cache.put(SITE_URL, content)
+
+    assert http_cache.get(SITE_URL) == content
+    # queryの順序が違っても同じentry
+    assert http_cache.get('http://www1.river.go.jp/cgi-bin/SiteInfo.exe?ID=101&') == content
+
+def test_uncached_endpoints_are_not_stored(http_cache):
+    url = 'http://www1.river.go.jp/cgi-bin/DspRainData.exe?KIND=1'
+    http_cache.put(url, b'<a href="/dat/dload/download/1.dat">')
+    assert http_cache.get(url) is None
+
+def test_entries_expire_after_ttl(http_cache, clock):
+    http_cache.put(DATA_URL, b'page')
+
+    clock.now += 60 * 60 - 1
+    assert http_cache.get(DATA_URL) == b'page'
+    clock.now += 1
+    assert http_cache.get(DATA_URL) is None
+    # 期限切れのentryは削除される
+    clock.now -= 10
+    assert http_cache.get(DATA_URL) is None
+
+def test_cache_persists_across_instances(tmp_path, clock):
+    path = str(tmp_path / 'http_cache.sqlite3')
+    first = ResponseCache(path)
+    first.put(SITE_URL, b'page')
+    first.close()
+
+    second = ResponseCache(path)
+    assert second.get(SITE_URL) == b'page'
+    second.close()
+
+def test_evicts_least_recently_accessed(tmp_path, clock):
+    ttls = [(re.compile(r'\.exe$'), 3600)]
+    http_cache = ResponseCache(str(tmp_path / 'http_cache.sqlite3'), max_bytes=10, endpoint_ttls=ttls)
+    for name in ('a', 'b', 'c'):
+        clock.now += 1
+        http_cache.put(f'http://host/{name}.exe', b'1234')
+
+    # 'c'を追加した時点で合計12 bytes -> 最も古い'a'が消える
+    assert http_cache.get('http://host/a.exe') is None
+
+    # 'b'を参照すると'c'のほうが古くなる
+    clock.now += 1
+    assert http_cache.get('http://host/b.exe') == b'1234'
+    clock.now += 1
+    http_cache.put('http://host/d.exe', b'1234')
+
+    assert http_cache.get('http://host/c.exe') is None
+    assert http_cache.get('http://host/b.exe') == b'1234'
+    assert http_cache.get('http://host/d.exe') == b'1234'
+
+    # max_bytesより大きいレスポンスは保存しない
+    http_cache.put('http://host/e.exe', b'x' * 11)
+    assert http_cache.get('http://host/e.exe') is None
+    assert http_cache.get('http://host/d.exe') == b'1234'
+    http_cache.close()
+
+def test_clear(http_cache):
+    http_cache.put(SITE_URL, b'page')
+    http_cache.clear()
+    assert http_cache.get(SITE_URL) is None
+
+def stored_access_times(path):
+    conn = sqlite3.connect(path)
+    try:
+        return dict(conn.execute("SELECT url, accessed_at FROM responses").fetchall())
+    finally:
+        conn.close()
+
+def test_hits_update_accessed_at_in_batches(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(response_cache, 'ACCESS_FLUSH_SIZE', 3)
+    path = str(tmp_path / 'http_cache.sqlite3')
+    http_cache = ResponseCache(path)
+    urls = [f'{SITE_URL}{i}' for i in range(3)]
+    for url in urls:
+        http_cache.put(url, b'page')
+    stored = stored_access_times(path)
+
+    clock.now += 10
+    http_cache.get(urls[0])
+    http_cache.get(urls[1])
+    assert stored_access_times(path) == stored
+
+    http_cache.get(urls[2])
+    assert set(stored_access_times(path).values()) == {clock.now}
+    http_cache.close()
+
+def test_access_times_are_flushed_after_interval_and_on_close(tmp_path, clock):
+    path = str(tmp_path / 'http_cache.sqlite3')
+    http_cache = ResponseCache(path)
+    http_cache.put(SITE_URL, b'page')
+
+    clock.now += 1
+    http_cache.get(SITE_URL)
+    assert stored_access_times(path) == {normalize_url(SITE_URL): clock.now - 1}
+
+    clock.now += response_cache.ACCESS_FLUSH_INTERVAL
+    http_cache.get(SITE_URL)
+    assert stored_access_times(path) == {normalize_url(SITE_URL): clock.now}
+
+    clock.now += 1
+    http_cache.get(SITE_URL)
+    http_cache.close()
+    assert stored_access_times(path) == {normalize_url(SITE_URL): clock.now}
+
+def test_total_bytes_is_kept_without_rescanning(tmp_path, clock, monkeypatch):
+    counts = []
+    count_bytes = ResponseCache._count_bytes
+    monkeypatch.setattr(ResponseCache, '_count_bytes', staticmethod(lambda conn: counts.append(1) or count_bytes(conn)))
+    http_cache = ResponseCache(str(tmp_path / 'http_cache.sqlite3'))
+
+    http_cache.put(SITE_URL, b'12345')
+    http_cache.put(DATA_URL, b'123')
+    http_cache.put(SITE_URL, b'12')  # 置き換え
+    assert http_cache.total_bytes() == 5
+
+    clock.now += 60 * 60
+    assert http_cache.get(DATA_URL) is None  # 期限切れで削除
+    assert http_cache.total_bytes() == 2
+    http_cache.clear()
+    assert http_cache.total_bytes() == 0
+
+    # 接続時の一度だけ
+    assert counts == [1]
+    http_cache.close()
+
+def test_eviction_counts_entries_written_by_other_processes(tmp_path, clock):
+    ttls = [(re.compile(r'\.exe$'), 3600)]
+    path = str(tmp_path / 'http_cache.sqlite3')
+    first = ResponseCache(path, max_bytes=10, endpoint_ttls=ttls)
+    second = ResponseCache(path, max_bytes=10, endpoint_ttls=ttls)
+
+    clock.now += 1
+    first.put('http://host/a.exe', b'1234')
+    clock.now += 1
+    second.put('http://host/b.exe', b'1234')
+    clock.now += 1
+    # firstが数えた合計は8 bytes (実際は12 bytes)、RECOUNT_INTERVALまでは他のプロセスの分は分からない
+    first.put('http://host/c.exe', b'1234')
+    assert second.get('http://host/a.exe') == b'1234'
+
+    clock.now += response_cache.RECOUNT_INTERVAL
+    # 数え直すと16 bytesなので、古い'a'と'b'を消す
+    first.put('http://host/d.exe', b'1234')
+
+    assert second.get('http://host/a.exe') is None
+    assert second.get('http://host/b.exe') is None
+    assert first.get('http://host/d.exe') == b'1234'
+    assert first.total_bytes() == 8
+    first.close()
+    second.close()
+
+def test_corrupt_cache_file_raises_sqlite_errors(tmp_path):
+    path = tmp_path / 'http_cache.sqlite3'
+    path.write_bytes(b'this is not a database' * 100)
+    http_cache = ResponseCache(str(path))
+
+    with pytest.raises(sqlite3.DatabaseError):
+        http_cache.get(SITE_URL)
+    with pytest.raises(sqlite3.DatabaseError):
+        http_cache.put(SITE_URL, b'page')
+    http_cache.close()
+
+class LockedCache(ResponseCache):
+    def get(self, url):
+        raise sqlite3.OperationalError('database is locked')
+
+    def put(self, url, content):
+        raise sqlite3.OperationalError('database is locked')
+
+@pytest.mark.parametrize('make_cache', [
+    lambda tmp_path: LockedCache(str(tmp_path / 'http_cache.sqlite3')),
+    lambda tmp_path: (tmp_path / 'broken.sqlite3').write_bytes(b'x' * 4096) and ResponseCache(str(tmp_path / 'broken.sqlite3')),
+])
+def test_session_falls_back_to_network_on_cache_errors(tmp_path, make_cache):
+    session = HttpSession(cache=make_cache(tmp_path), rate=None)
+    adapter = StatusAdapter(200, b'page')
+    session.session.mount('http://', adapter)
+
+    for _ in range(2):
+        response = session.get(SITE_URL)
+        assert (response.status_code, response.content) == (200, b'page')
+        assert not getattr(response, 'from_cache', False)
+    assert adapter.requests == 2
+    session.close()
+
+def test_session_uses_the_cache(tmp_path):
+    session = HttpSession(cache=ResponseCache(str(tmp_path / 'http_cache.sqlite3')), rate=None)
+    adapter = StatusAdapter(200, b'page')
+    session.session.mount('http://', adapter)
+
+    session.get(SITE_URL)
+    response = session.get(SITE_URL)
+    assert response.from_cache
+    assert response.content == b'page'
+    assert adapter.requests == 1
+    session.close()
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from utils.search_index import NgramIndex, normalize_text
+
+@pytest.mark.parametrize('text, expected', [
+    ('ＡＢＣ１２３', 'abc123'),          # 全角英数字
+    ('ｶﾜ', 'かわ'),                       # 半角カタカナ
+    ('カワグチ', 'かわぐち'),
+    ('ヴァ', 'ゔぁ'),
+    ('ヶ', 'ゖ'),
+    ('ー', 'ー'),                         # 長音はそのまま
+    ('Tokyo 東京', 'tokyo 東京'),
+    (123, '123'),
+])
+def test_normalize_text(text, expected):
+    assert normalize_text(text) == expected
+
+@pytest.fixture
+def index():
+    index = NgramIndex()
+    index.add((0, 0), '荒川')
+    index.add((0, 1), 'アラカワ')
+    index.add((1, 0), '岩淵水門(上)')
+    index.add((1, 1), 'ｲﾜﾌﾞﾁ')
+    index.add((2, 0), 'Arakawa River')
+    return index
+
+def test_search_ignores_width_kana_and_case(index):
+    assert index.search('あらかわ') == [(0, 1)]
+    assert index.search('ｱﾗｶﾜ') == [(0, 1)]
+    assert index.search('いわぶち') == [(1, 1)]
+    assert index.search('ARAKAWA') == [(2, 0)]
+    assert index.search('（上）') == [(1, 0)]
+
+def test_search_single_character(index):
+    assert index.search('川') == [(0, 0)]
+    assert index.search('r') == [(2, 0)]
+    assert index.search('z') == []
+
+def test_search_requires_contiguous_match(index):
+    # 'らか'と'かわ'の両方を含んでもqueryとして連続していなければ一致しない
+    index.add((3, 0), 'らかXかわ')
+    assert index.search('らかわ') == [(0, 1)]
+
+def test_search_empty_query_and_clear(index):
+    assert index.search('') == []
+    assert len(index) == 5
+    index.clear()
+    assert len(index) == 0
+    assert index.search('荒川') == []
+
+def test_add_replaces_cell_text():
+    index = NgramIndex()
+    index.add((0, 0), '荒川')
+    index.add((0, 0), '多摩川')
+    assert index.search('多摩') == [(0, 0)]
+    assert index.search('荒川') == []
+
+def test_search_matches_substring_scan():
+    rng = random.Random(0)
+    alphabet = 'あいうアイウab'
+    texts = {(row, 0): ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 8))) for row in range(200)}
+    index = NgramIndex()
+    for cell, text in texts.items():
+        index.add(cell, text)
+
+    for _ in range(100):
+        query = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 3)))
+        expected = sorted(cell for cell, text in texts.items() if normalize_text(query) in normalize_text(text))
+        assert index.search(query) == expected
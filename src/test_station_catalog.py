@@ -0,0 +1,137 @@
+import pytest
+
+from geo_index import haversine_km
+from station_catalog import ALL_SUIKEI, CatalogCrawler, StationCatalog
+
+SUIKEI_VALUES = {'全水系': ALL_SUIKEI, '荒川': '83037000', '多摩川': '83036000'}
+
+def station_row(js_detail, station_name, suikei_name='荒川', river_name='荒川', komoku='雨量', suikei=ALL_SUIKEI):
+    return ['1', komoku, suikei_name, river_name, station_name, '東京都', suikei, js_detail]
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = StationCatalog(str(tmp_path / 'cache' / 'station_catalog.sqlite3'))
+    yield catalog
+    catalog.close()
+
+def test_upsert_looks_up_suikei_code_by_name(catalog):
+    rows = [
+        station_row('101', '岩淵'),
+        station_row('102', '調布', suikei_name='多摩川', river_name='多摩川'),
+        station_row('103', '不明', suikei_name='未登録水系'),
+    ]
+    assert catalog.upsert_rows(rows, '13', '01', SUIKEI_VALUES) == 3
+
+    assert catalog.get('101')[0][6] == '83037000'
+    assert catalog.get('102')[0][6] == '83036000'
+    # 水系名が分からなければ空 (DBではNULL)
+    assert catalog.get('103')[0][6] == ''
+
+def test_upsert_without_suikei_codes_keeps_specific_query_code(catalog):
+    catalog.upsert_rows([station_row('101', '岩淵', suikei='83037000'), station_row('102', '調布')])
+
+    assert catalog.get('101')[0][6] == '83037000'
+    assert catalog.get('102')[0][6] == ''
+
+def test_upsert_skips_rows_without_js_detail_and_replaces_existing(catalog):
+    assert catalog.upsert_rows([station_row('', '空'), ['1', '雨量']], '13', '01') == 0
+    catalog.upsert_rows([station_row('101', '岩淵')], '13', '01')
+    catalog.upsert_rows([station_row('101', '岩淵水門')], '13', '01')
+
+    assert catalog.count() == 1
+    assert catalog.get('101')[0][4] == '岩淵水門'
+
+def test_search(catalog):
+    catalog.upsert_rows([
+        station_row('101', '岩淵'),
+        station_row('102', '岩槻', river_name='元荒川'),
+        station_row('103', '調布', suikei_name='多摩川', river_name='多摩川', komoku='水位'),
+        station_row('104', '100%_岩'),
+    ], '13', '01', SUIKEI_VALUES)
+
+    def ids(rows):
+        return sorted(row[7] for row in rows)
+
+    assert ids(catalog.search('岩')) == ['101', '102']
+    assert ids(catalog.search(river_name='荒川')) == ['101', '104']
+    assert ids(catalog.search(suikei_name='多摩川')) == ['103']
+    assert ids(catalog.search(komoku='水位')) == ['103']
+    assert ids(catalog.search('岩', river_name='元')) == ['102']
+    # LIKEのワイルドカードは文字として扱う
+    assert ids(catalog.search('100%_')) == ['104']
+    assert ids(catalog.search('1%')) == []
+    assert len(catalog.search(limit=2)) == 2
+    assert ids(catalog.search()) == ['101', '102', '103', '104']
+
+def add_stations(catalog, stations, komoku='雨量'):
+    catalog.upsert_rows([station_row(key, f'観測所{key}', komoku=komoku) for key, _, _ in stations], '13', '01')
+    for key, latitude, longitude in stations:
+        catalog.upsert_coordinates(key, latitude, longitude)
+
+def test_nearest_and_bbox(catalog):
+    stations = [('101', 35.78, 139.72), ('102', 35.65, 139.54), ('103', 34.70, 135.50), ('104', 43.06, 141.35)]
+    add_stations(catalog, stations)
+    add_stations(catalog, [('201', 35.70, 139.70)], komoku='水位')
+
+    results = catalog.nearest(35.68, 139.77, k=2, komoku='雨量')
+    assert [row[7] for row, _ in results] == ['101', '102']
+    assert results[0][1] == pytest.approx(haversine_km(35.68, 139.77, 35.78, 139.72))
+
+    assert [row[7] for row, _ in catalog.nearest(35.68, 139.77, k=1)] == ['201']
+
+    assert sorted(row[7] for row in catalog.within_bbox(35.0, 139.0, 36.0, 140.0)) == ['101', '102', '201']
+    assert sorted(row[7] for row in catalog.within_bbox(35.0, 139.0, 36.0, 140.0, komoku='水位')) == ['201']
+    assert catalog.within_bbox(20.0, 120.0, 21.0, 121.0) == []
+
+def test_geo_index_is_rebuilt_after_updates(catalog):
+    add_stations(catalog, [('101', 35.78, 139.72)])
+    assert len(catalog.geo_index()) == 1
+    assert catalog.missing_coordinates() == []
+
+    catalog.upsert_rows([station_row('102', '調布')], '13', '01')
+    assert catalog.missing_coordinates() == ['102']
+    catalog.upsert_coordinates('102', 35.65, 139.54)
+    assert len(catalog.geo_index()) == 2
+
+# 県 × 項目ごとに決まったページを返すscraper
+class FakeScraper:
+    ken_values = {'全県': '-1', '東京都': '13', '埼玉県': '11'}
+    komoku_values = {'全項目': '-1', '雨量': '01'}
+    suikei_values = SUIKEI_VALUES
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.queries = []
+
+    def iter_pages(self, ken_code, suikei_code, komoku_code, max_workers=4):
+        self.queries.append((ken_code, suikei_code, komoku_code))
+        for page_number, rows in enumerate(self.pages.get(ken_code, [])):
+            yield page_number, [row[:6] + [suikei_code] + row[7:] for row in rows]
+
+def test_crawl_all_stores_real_suikei_codes(catalog):
+    scraper = FakeScraper({
+        '13': [[station_row('101', '岩淵'), station_row('102', '調布', suikei_name='多摩川')], [station_row('103', '不明', suikei_name='?')]],
+        '11': [[station_row('104', '岩槻')]],
+    })
+    logs = []
+    total = CatalogCrawler(scraper, catalog, max_workers=2, log=logs.append).crawl_all()
+
+    assert total == 4
+    assert sorted(scraper.queries) == [('11', ALL_SUIKEI, '01'), ('13', ALL_SUIKEI, '01')]
+    codes = {row[7]: row[6] for row in catalog.search()}
+    assert codes == {'101': '83037000', '102': '83036000', '103': '', '104': '83037000'}
+    assert catalog.search(suikei_name='多摩川')[0][7] == '102'
+    assert len(logs) == 2
+
+def test_crawl_all_logs_failed_queries(catalog):
+    class FailingScraper(FakeScraper):
+        def iter_pages(self, ken_code, suikei_code, komoku_code, max_workers=4):
+            if ken_code == '11':
+                raise ConnectionError('reset')
+            return super().iter_pages(ken_code, suikei_code, komoku_code, max_workers)
+
+    logs = []
+    total = CatalogCrawler(FailingScraper({'13': [[station_row('101', '岩淵')]]}), catalog, log=logs.append).crawl_all()
+
+    assert total == 1
+    assert any(message.startswith('ERROR - KEN=11') for message in logs)
@@ -0,0 +1,126 @@
+import pytest
+
+from PyQt5.QtCore import Qt, QModelIndex
+from PyQt5.QtGui import QColor
+
+from station_table_model import DETAIL_COLUMN, DETAIL_TEXT, FETCH_BATCH_SIZE, HEADERS, StationTableModel
+
+def station_rows(count, start=0):
+    return [[str(i), '雨量', '荒川', '荒川', f'観測所{i}', '東京都', '-00001', f'{i:05d}'] for i in range(start, start + count)]
+
+@pytest.fixture
+def model():
+    model = StationTableModel()
+    model.inserted = []
+    model.changed = []
+    model.rowsInserted.connect(lambda parent, first, last: model.inserted.append((first, last)))
+    model.dataChanged.connect(
+        lambda top_left, bottom_right, roles: model.changed.append((top_left.row(), top_left.column(), list(roles)))
+    )
+    return model
+
+def test_columns_and_data(model):
+    model.append_rows(station_rows(2))
+
+    assert model.columnCount() == len(HEADERS)
+    assert model.headerData(0, Qt.Horizontal) == HEADERS[0]
+    assert model.data(model.index(1, 3)) == '観測所1'
+    assert model.data(model.index(1, DETAIL_COLUMN)) == DETAIL_TEXT
+    assert model.data(QModelIndex()) is None
+    assert model.js_detail(1) == '00001'
+    assert model.rowCount(model.index(0, 0)) == 0
+
+def test_append_rows_skips_rows_without_js_detail(model):
+    rows = station_rows(2) + [['', '', '', '', '', '', '-00001', '123'], station_rows(1, 5)[0][:7] + [''], ['1', '雨量']]
+
+    assert model.append_rows(rows) == 2
+    assert model.append_rows([]) == 0
+    assert model.total_rows() == 2
+    assert model.inserted == [(0, 1)]
+
+def test_fetch_more_in_batches(model):
+    count = FETCH_BATCH_SIZE * 2 + 10
+    assert model.append_rows(station_rows(count)) == count
+
+    # 最初のバッチだけを公開
+    assert model.rowCount() == FETCH_BATCH_SIZE
+    assert model.canFetchMore()
+
+    model.fetchMore()
+    assert model.rowCount() == FETCH_BATCH_SIZE * 2
+    model.fetchMore()
+    assert model.rowCount() == count
+    assert not model.canFetchMore()
+    model.fetchMore()
+
+    assert model.inserted == [
+        (0, FETCH_BATCH_SIZE - 1),
+        (FETCH_BATCH_SIZE, FETCH_BATCH_SIZE * 2 - 1),
+        (FETCH_BATCH_SIZE * 2, count - 1),
+    ]
+
+def test_append_rows_shows_rows_until_the_first_batch_is_full(model):
+    model.append_rows(station_rows(300))
+    model.append_rows(station_rows(300, 300))
+    assert model.rowCount() == 600
+
+    # 最初のバッチが埋まった後は、fetchMoreまで公開しない
+    model.append_rows(station_rows(300, 600))
+    assert model.rowCount() == 600
+    assert model.total_rows() == 900
+    assert model.inserted == [(0, 299), (300, 599)]
+
+def test_ensure_visible(model):
+    model.append_rows(station_rows(FETCH_BATCH_SIZE * 3))
+
+    index = model.ensure_visible(FETCH_BATCH_SIZE * 2 + 5)
+    assert index.isValid()
+    assert (index.row(), index.column()) == (FETCH_BATCH_SIZE * 2 + 5, 0)
+    assert model.rowCount() == FETCH_BATCH_SIZE * 3
+
+    # 公開済みの行では何もしない
+    model.inserted.clear()
+    assert model.ensure_visible(3).row() == 3
+    assert model.inserted == []
+    assert not model.ensure_visible(FETCH_BATCH_SIZE * 3).isValid()
+
+def test_set_highlights_emits_only_changed_cells(model):
+    model.append_rows(station_rows(FETCH_BATCH_SIZE + 10))
+
+    model.set_highlights([(0, 1), (2, 3)])
+    assert sorted(model.changed) == [(0, 1, [Qt.BackgroundRole]), (2, 3, [Qt.BackgroundRole])]
+    assert model.data(model.index(0, 1), Qt.BackgroundRole) == QColor('yellow')
+    assert model.data(model.index(0, 2), Qt.BackgroundRole) is None
+
+    model.changed.clear()
+    model.set_highlights([(2, 3), (4, 0)])
+    assert sorted(model.changed) == [(0, 1, [Qt.BackgroundRole]), (4, 0, [Qt.BackgroundRole])]
+
+    model.changed.clear()
+    model.set_highlights([(2, 3), (4, 0)])
+    assert model.changed == []
+
+    # 未公開の行は変更を送らない
+    model.set_highlights([(2, 3), (4, 0), (FETCH_BATCH_SIZE + 1, 0)])
+    assert model.changed == []
+    model.ensure_visible(FETCH_BATCH_SIZE + 1)
+    assert model.data(model.index(FETCH_BATCH_SIZE + 1, 0), Qt.BackgroundRole) == QColor('yellow')
+
+def test_find_includes_rows_not_yet_visible(model):
+    rows = station_rows(FETCH_BATCH_SIZE + 1)
+    rows[-1][4] = '岩淵水門'
+    model.append_rows(rows)
+
+    assert model.find('いわぶち') == []
+    assert model.find('岩淵') == [(FETCH_BATCH_SIZE, 3)]
+    assert model.rowCount() == FETCH_BATCH_SIZE
+
+def test_clear(model):
+    model.append_rows(station_rows(3))
+    model.set_highlights([(0, 0)])
+    model.clear()
+
+    assert (model.rowCount(), model.total_rows()) == (0, 0)
+    assert model.find('観測所') == []
+    model.append_rows(station_rows(1))
+    assert model.data(model.index(0, 0), Qt.BackgroundRole) is None
@@ -0,0 +1,150 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+import http_session
+
+import wis_cli
+
+ENTRY = {'js_detail': '123', 'data_type': 'rain', 'kind': '1', 'start': '2020/01', 'end': '2020/12'}
+
+# 1つのjob (12ヶ月のspan) で月ごとのファイルを書くhandler
+class SpanHandler:
+    def __init__(self, engine, periods, error=None):
+        self.engine = engine
+        self.periods = periods
+        self.error = error
+        self.resume = True
+        self.download_dir = './Download'
+        self.skipped_periods = {'2020_01'}
+        self.written_periods = set()
+
+    def get_directory(self):
+        return f'{self.download_dir}/SrchRainData_1_test'
+
+    def download(self):
+        def job():
+            for period in self.periods:
+                self.written_periods.add(period)
+            if self.error:
+                raise self.error
+        self.engine.run([(job, ())])
+
+@pytest.fixture
+def handlers(monkeypatch):
+    created = []
+
+    def create_handler(js_detail, data_type, kind, start, end, engine=None):
+        handler = SpanHandler(engine, **created.pop(0))
+        created.append(handler)
+        return handler
+
+    monkeypatch.setattr(wis_cli, 'create_handler', create_handler)
+    monkeypatch.setattr(wis_cli, 'has_data_in_range', lambda handler: True)
+    monkeypatch.setattr(wis_cli, 'run_download', lambda handler: handler.download())
+    return created
+
+def test_files_counts_written_periods_not_jobs(handlers):
+    handlers.append({'periods': ['2020_02', '2020_03']})
+    result = wis_cli.download_entry(ENTRY, log=lambda message: None)
+
+    assert result['status'] == 'ok'
+    assert result['files'] == 2
+    assert result['resumed'] == 1
+
+def test_failed_job_counts_only_written_files(handlers):
+    handlers.append({'periods': ['2020_02'], 'error': RuntimeError('timeout')})
+    result = wis_cli.download_entry(ENTRY, log=lambda message: None)
+
+    assert result['status'] == 'failed'
+    assert result['error'] == 'timeout'
+    assert result['files'] == 1
+
+def test_invalid_entry_has_no_files():
+    result = wis_cli.download_entry(dict(ENTRY, kind='9'), log=lambda message: None)
+
+    assert result['status'] == 'failed'
+    assert result['files'] == 0
+
+def test_download_dir_is_passed_to_the_handler(handlers, tmp_path):
+    handlers.append({'periods': ['2020_02']})
+    result = wis_cli.download_entry(ENTRY, log=lambda message: None, download_dir=str(tmp_path))
+
+    assert handlers[0].download_dir == str(tmp_path)
+    assert result['directory'] == f'{tmp_path}/SrchRainData_1_test'
+
+def test_sync_plans_and_downloads_in_download_dir(handlers, monkeypatch, tmp_path):
+    planned = []
+
+    def plan_sync(entry, initial_start=None, today=None, session=None, download_dir=None):
+        planned.append(download_dir)
+        return dict(entry, start='2020/02', end='2020/03')
+
+    monkeypatch.setattr(wis_cli, 'plan_sync', plan_sync)
+    handlers.append({'periods': ['2020_02', '2020_03']})
+    summary = wis_cli.run_sync([ENTRY], log=lambda message: None, download_dir=str(tmp_path))
+
+    assert planned == [str(tmp_path)]
+    assert handlers[0].download_dir == str(tmp_path)
+    assert summary['results'][0]['directory'] == f'{tmp_path}/SrchRainData_1_test'
+
+MANIFEST_ENTRIES = [ENTRY, dict(ENTRY, js_detail='456', kind=2)]
+
+@pytest.mark.parametrize('file_name, content', [
+    ('jobs.json', json.dumps(MANIFEST_ENTRIES, indent=2)),
+    ('jobs.jsonl', ''.join(json.dumps(entry) + '\n' for entry in MANIFEST_ENTRIES) + '\n'),
+    ('jobs.csv', 'js_detail,data_type,kind,start,end\n123,rain,1,2020/01,2020/12\n456,rain,2,2020/01,2020/12\n'),
+])
+def test_load_manifest(tmp_path, file_name, content):
+    path = tmp_path / file_name
+    path.write_text(content, encoding='utf-8')
+
+    assert wis_cli.load_manifest(str(path)) == [ENTRY, dict(ENTRY, js_detail='456', kind='2')]
+
+@pytest.mark.parametrize('file_name, content, message', [
+    ('jobs.json', json.dumps(ENTRY), 'expected a JSON array'),
+    ('jobs.json', json.dumps([ENTRY, ['123']]), 'entry 2 is not an object'),
+    ('jobs.jsonl', json.dumps(dict(ENTRY, end='')), 'entry 1 is missing end'),
+])
+def test_load_manifest_rejects_invalid_entries(tmp_path, file_name, content, message):
+    path = tmp_path / file_name
+    path.write_text(content, encoding='utf-8')
+
+    with pytest.raises(ValueError, match=message):
+        wis_cli.load_manifest(str(path))
+
+# 子プロセス(fork)で実行するjob: プロセスごとに最初のjobで他のプロセスを待ってから、共有のbucketからtokenを取る
+_barrier = None
+_waited = False
+
+def take_token(entry, *args):
+    global _waited
+    if not _waited:
+        _barrier.wait(30)
+        _waited = True
+    acquired = http_session.get_session().rate_limiter.try_acquire()
+    return dict(wis_cli.make_result(entry, 'ok' if acquired else 'skipped'), pid=os.getpid())
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason="the patched job is inherited only by forked workers")
+def test_run_sharded_shares_one_bucket_between_two_processes(monkeypatch):
+    global _barrier
+    _barrier = multiprocessing.Barrier(2)
+    monkeypatch.setitem(wis_cli.JOBS, 'download', take_token)
+    # refillがほぼない速度なので、両方のプロセスで取れるのはburstの分だけ
+    bucket = wis_cli.TokenBucket.shared(rate=0.001, burst=3)
+    entries = [dict(ENTRY, js_detail=str(i)) for i in range(8)]
+
+    summary = wis_cli.run_sharded('download', entries, 2, 1, (), use_cache=False, rate_limiter=bucket)
+
+    assert len({result['pid'] for result in summary['results']}) == 2
+    assert [result['js_detail'] for result in summary['results']] == [str(i) for i in range(8)]
+    assert (summary['ok'], summary['skipped']) == (3, 5)
+    assert not bucket.try_acquire()
+
+    # shardが2つなら、要求が4でも2プロセス
+    _barrier = multiprocessing.Barrier(2)
+    summary = wis_cli.run_sharded('download', entries[:2], 4, 1, (), use_cache=False, rate_limiter=wis_cli.TokenBucket.shared(rate=0.001, burst=1))
+    assert summary['processes'] == 2
+    assert (summary['ok'], summary['skipped']) == (1, 1)
@@ -29,6 +29,17 @@ class UpdateChecker:
         remote_version = self.get_remote_version()
         return local_version and remote_version and local_version != remote_version
 
+class UpdateCheckThread(QThread):
+    update_available = pyqtSignal()
+
+    def __init__(self, update_checker: UpdateChecker):
+        super().__init__()
+        self.update_checker = update_checker
+
+    def run(self):
+        if self.update_checker.check_update():
+            self.update_available.emit()
+
 class DownloadProgressDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
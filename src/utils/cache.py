@@ -0,0 +1,96 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+_MISSING = object()
+
+class _PendingLoad:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+# 有効期限(ttl秒)付きのメモリキャッシュ
+# maxsizeを指定するとLRUで古いものから削除
+# get_or_loadは同じkeyの同時取得を一つのloader呼び出しにまとめる
+class TTLCache:
+    def __init__(self, ttl, maxsize=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _get_locked(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return _MISSING
+
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._get_locked(key)
+            return default if value is _MISSING else value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    # キャッシュになければloaderで取得して保存
+    # should_cacheがFalseを返した値(エラーページなど)は保存しない
+    def get_or_load(self, key, loader, should_cache=None):
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not _MISSING:
+                return value
+
+            pending = self._pending.get(key)
+            is_owner = pending is None
+            if is_owner:
+                pending = _PendingLoad()
+                self._pending[key] = pending
+
+        # 他のthreadが取得中なら、その結果を待って共有
+        if not is_owner:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            value = loader()
+            pending.value = value
+            if should_cache is None or should_cache(value):
+                self.set(key, value)
+            return value
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.event.set()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
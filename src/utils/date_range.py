@@ -0,0 +1,34 @@
+# ダウンロード期間の入力の検証 (GUIの入力欄とCLIで共通)
+# 不正な入力はValueErrorで、メッセージはそのまま警告として表示する
+
+# "YYYY/MM" - "YYYY/MM" -> (start_year, end_year, start_month, end_month)
+def parse_month_range(start_str, end_str):
+    if not all(char.isdigit() or char == '/' for char in start_str + end_str):
+        raise ValueError("Invalid input")
+
+    try:
+        start_year, start_month = map(int, start_str.split('/'))
+        end_year, end_month = map(int, end_str.split('/'))
+    except ValueError:
+        raise ValueError("Invalid Date Format")
+
+    if not (1 <= start_month <= 12) or not (1 <= end_month <= 12):
+        raise ValueError("Invalid Month")
+
+    if start_year > end_year or (start_year == end_year and start_month > end_month):
+        raise ValueError("Invalid range")
+
+    return start_year, end_year, start_month, end_month
+
+# "YYYY" - "YYYY" -> (start_year, end_year)
+def parse_year_range(start_str, end_str):
+    if not start_str.isdigit() or not end_str.isdigit():
+        raise ValueError("Invalid input")
+
+    start_year = int(start_str)
+    end_year = int(end_str)
+
+    if start_year > end_year:
+        raise ValueError("Invalid range")
+
+    return start_year, end_year
@@ -1,6 +1,8 @@
-from PyQt5.QtWidgets import QHBoxLayout, QLineEdit, QPushButton, QMessageBox
+from PyQt5.QtWidgets import QHBoxLayout, QLineEdit, QPushButton, QCheckBox, QMessageBox
 from PyQt5.QtCore import Qt
 
+from utils.date_range import parse_month_range, parse_year_range
+
 def date_input(input_type):
     def decorator(func):
         def wrapper(self, *args, **kwargs):
@@ -18,6 +20,11 @@ def date_input(input_type):
             self.date_input_layout.addWidget(self.start_input)
             self.date_input_layout.addWidget(self.end_input)
 
+            # 前回ダウンロードした期間を飛ばす (今日を含む期間は常に取得)
+            self.resume_check_box = QCheckBox("続きから")
+            self.resume_check_box.setToolTip("ダウンロード済みの期間をスキップ")
+            self.date_input_layout.addWidget(self.resume_check_box)
+
             self.confirm_button = QPushButton("Download Data")
             self.confirm_button.clicked.connect(lambda: func(self, *args, **kwargs))
             self.date_input_layout.addWidget(self.confirm_button)
@@ -32,42 +39,18 @@ def data_confirm(data_type):
             start_str = self.start_input.text()
             end_str = self.end_input.text()
 
-            if data_type == 'date':
-                if not all(char.isdigit() or char == '/' for char in start_str + end_str):
-                    QMessageBox.warning(self, "警告", "Invalid input")
-                    return
-
-                try:
-                    start_year, start_month = map(int, start_str.split('/'))
-                    end_year, end_month = map(int, end_str.split('/'))
-
-                    if not (1 <= start_month <= 12) or not (1 <= end_month <= 12):
-                        QMessageBox.warning(self, "警告", "Invalid Month")
-                        return
-
-                    if start_year > end_year or (start_year == end_year and start_month > end_month):
-                        QMessageBox.warning(self, "警告", "Invalid range")
-                        return
-
-                except ValueError:
-                    QMessageBox.warning(self, "警告", "Invalid Date Format")
-                    return
-                
-                func(self, start_year, end_year, start_month, end_month)
-
-            elif data_type == 'year':
-                if not start_str.isdigit() or not end_str.isdigit():
-                    QMessageBox.warning(self, "警告", "Invalid input")
-                    return
-
-                start_year = int(start_str)
-                end_year = int(end_str)
-
-                if start_year > end_year:
-                    QMessageBox.warning(self, "警告", "Invalid range")
+            try:
+                if data_type == 'date':
+                    parsed = parse_month_range(start_str, end_str)
+                elif data_type == 'year':
+                    parsed = parse_year_range(start_str, end_str)
+                else:
                     return
+            except ValueError as e:
+                QMessageBox.warning(self, "警告", str(e))
+                return
 
-                func(self, start_year, end_year)
+            func(self, *parsed)
 
         return wrapper
     return decorator
@@ -0,0 +1,110 @@
+import os
+import logging
+import functools
+import importlib.util
+
+# bs4は最初にparseするときにimportする (起動時間のため)
+
+# make_soupのtree builder、指定がなければインストールされている最初のもの (速い順)
+PREFERRED_BACKENDS = ('lxml', 'html.parser')
+PARSER_ENV_VAR = 'WIS_HTML_PARSER'
+
+# 環境変数WIS_HTML_PARSER / set_parser_backendで指定されたbackend (None = 自動)
+_backend = None
+_backend_resolved = False
+
+@functools.lru_cache(maxsize=None)
+def available_backends():
+    backends = []
+    for name in PREFERRED_BACKENDS:
+        if name == 'html.parser' or importlib.util.find_spec(name) is not None:
+            backends.append(name)
+    if importlib.util.find_spec('selectolax.lexbor') is not None:
+        backends.append('selectolax')
+    return tuple(backends)
+
+def requested_backend():
+    global _backend, _backend_resolved
+    if not _backend_resolved:
+        requested = os.environ.get(PARSER_ENV_VAR)
+        if requested and requested not in available_backends():
+            logging.warning(f"{PARSER_ENV_VAR}={requested} is not available, using {', '.join(available_backends())}")
+        elif requested:
+            _backend = requested
+        _backend_resolved = True
+        logging.info(f"HTML parser backend: {get_parser_backend()} (find_first: {get_lookup_backend()})")
+    return _backend
+
+# BeautifulSoupのtree builder (lxml or html.parser)
+# selectolaxが指定された場合はtreeを作れないので、自動で選ぶ
+def get_parser_backend():
+    requested = requested_backend()
+    if requested and requested != 'selectolax':
+        return requested
+    return next(name for name in PREFERRED_BACKENDS if name in available_backends())
+
+# find_firstのbackend、指定がなければselectolax > tree builder
+def get_lookup_backend():
+    requested = requested_backend()
+    if requested:
+        return requested
+    return 'selectolax' if 'selectolax' in available_backends() else get_parser_backend()
+
+# Noneで自動選択に戻す
+def set_parser_backend(name):
+    global _backend, _backend_resolved
+    if name is not None and name not in available_backends():
+        raise ValueError(f"Unsupported parser backend: {name}")
+    _backend = name
+    _backend_resolved = True
+
+def make_soup(markup, parse_only=None, backend=None):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(markup, backend or get_parser_backend(), parse_only=parse_only)
+
+def make_strainer(name, attrs=None, **kwargs):
+    from bs4 import SoupStrainer
+    return SoupStrainer(name, attrs or {}, **kwargs)
+
+# 一つのtagだけが必要な場合の部分parse
+# selectolaxならそれで、それ以外はSoupStrainerで対象tagだけをparse
+class TagMatch:
+    def __init__(self, text, attrs):
+        self.text = text
+        self.attrs = attrs
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+    def __getitem__(self, key):
+        return self.attrs[key]
+
+def find_first(markup, name, attrs=None, backend=None):
+    attrs = attrs or {}
+    backend = backend or get_lookup_backend()
+
+    if backend == 'selectolax':
+        return _find_first_selectolax(markup, name, attrs)
+
+    soup = make_soup(markup, parse_only=make_strainer(name, attrs), backend=backend)
+    tag = soup.find(name, attrs)
+    if tag is None:
+        return None
+    return TagMatch(tag.get_text(strip=True), dict(tag.attrs))
+
+def _find_first_selectolax(markup, name, attrs):
+    from bs4 import UnicodeDammit
+    from selectolax.lexbor import LexborHTMLParser
+
+    # bytesの場合はbs4と同じ方法で文字コードを判定
+    if isinstance(markup, bytes):
+        markup = UnicodeDammit(markup, is_html=True).unicode_markup
+
+    selector = name
+    for key, value in attrs.items():
+        selector += f'[{key}]' if value is True else f'[{key}="{value}"]'
+
+    node = LexborHTMLParser(markup).css_first(selector)
+    if node is None:
+        return None
+    return TagMatch(node.text(strip=True), dict(node.attributes))
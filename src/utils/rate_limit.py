@@ -0,0 +1,116 @@
+import threading
+import time
+
+# token bucket (rate: 1秒あたりのリクエスト数, burst: まとめて使えるtokenの上限)
+# stateは [tokens, 最後に補充した時刻] の2要素で、shared()で作るとプロセス間で共有できる
+# time.monotonicはプロセス間で共通の時計なので、共有stateの時刻にそのまま使える
+# clock/sleepはテスト用に差し替えられる
+class TokenBucket:
+    def __init__(self, rate, burst=None, lock=None, state=None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = lock or threading.Lock()
+        self._state = state if state is not None else [self.burst, clock()]
+
+    # ProcessPoolExecutorのinitargsなどで子プロセスに渡す
+    @classmethod
+    def shared(cls, rate, burst=None, clock=time.monotonic):
+        import multiprocessing  # GUIの起動時には不要なので使うときだけ
+
+        burst = float(burst if burst is not None else max(1.0, rate))
+        state = multiprocessing.RawArray('d', [burst, clock()])
+        return cls(rate, burst, lock=multiprocessing.Lock(), state=state, clock=clock)
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill(self.clock())
+            return self._state[0]
+
+    def _refill(self, now):
+        tokens, updated_at = self._state[0], self._state[1]
+        self._state[0] = min(self.burst, tokens + (now - updated_at) * self.rate)
+        self._state[1] = now
+
+    # tokenを1つ取れるまで待つ、取れなかったら次のtokenまでの秒数だけsleep
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill(self.clock())
+                if self._state[0] >= 1.0:
+                    self._state[0] -= 1.0
+                    return
+                wait = (1.0 - self._state[0]) / self.rate
+            self.sleep(wait)
+
+    # 待たずにtokenを取る、取れなければFalse
+    def try_acquire(self):
+        with self._lock:
+            self._refill(self.clock())
+            if self._state[0] >= 1.0:
+                self._state[0] -= 1.0
+                return True
+            return False
+
+LATENCY_EWMA_ALPHA = 0.2
+MIN_LATENCY_SAMPLES = 10
+
+# 同時リクエスト数の上限をAIMDで調整する
+# 正常なレスポンスが返るたびに増やし (limit件でおよそ+increase)、
+# 失敗 (timeout、5xx) や普段より極端に遅いレスポンスでは limit * decrease に減らす
+class AdaptiveConcurrency:
+    def __init__(self, initial=4, minimum=1, maximum=16, increase=1.0, decrease=0.5, latency_factor=3.0, clock=time.monotonic):
+        self.clock = clock
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._latency = None  # 正常なレスポンスの時間の平均 (EWMA)
+        self._samples = 0
+        self._decreased_at = 0.0
+
+    @property
+    def in_flight(self):
+        with self._condition:
+            return self._in_flight
+
+    @property
+    def latency(self):
+        with self._condition:
+            return self._latency
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    # started_at: リクエストを送った時刻 (clock)
+    # ok: True=正常, False=失敗, None=サーバーの状態と関係ないエラーなので調整しない
+    def release(self, started_at, ok=True):
+        now = self.clock()
+        latency = now - started_at
+
+        with self._condition:
+            self._in_flight -= 1
+            slow = self._samples >= MIN_LATENCY_SAMPLES and latency > self._latency * self.latency_factor
+
+            if ok and not slow:
+                self._latency = latency if self._latency is None else self._latency + LATENCY_EWMA_ALPHA * (latency - self._latency)
+                self._samples += 1
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            elif ok is not None and started_at >= self._decreased_at:
+                # 前回減らした後に送ったリクエストの失敗でだけ減らす (同じ混雑で何度も半分にしない)
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self._decreased_at = now
+
+            self._condition.notify_all()
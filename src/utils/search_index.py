@@ -0,0 +1,68 @@
+import unicodedata
+
+from collections import defaultdict
+
+NGRAM_SIZE = 2
+
+# 全角/半角 (NFKC)、カタカナ/ひらがな、大文字/小文字の違いを無視するための正規化
+def normalize_text(text):
+    text = unicodedata.normalize('NFKC', str(text)).lower()
+    return ''.join(
+        chr(ord(char) - 0x60) if 'ァ' <= char <= 'ヶ' else char
+        for char in text
+    )
+
+def _ngrams(text, size):
+    if len(text) < size:
+        return set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+# (row, column)単位のn-gram転置index
+# 1文字のqueryにも対応するため、文字単位のpostingも持つ
+class NgramIndex:
+    def __init__(self, ngram_size=NGRAM_SIZE):
+        self.ngram_size = ngram_size
+        self._texts = {}
+        self._chars = defaultdict(set)
+        self._grams = defaultdict(set)
+
+    def add(self, cell, text):
+        text = normalize_text(text)
+        self._texts[cell] = text
+        for char in set(text):
+            self._chars[char].add(cell)
+        for gram in _ngrams(text, self.ngram_size):
+            self._grams[gram].add(cell)
+
+    def clear(self):
+        self._texts.clear()
+        self._chars.clear()
+        self._grams.clear()
+
+    # queryを含むcellを(row, column)順で返す
+    def search(self, query):
+        query = normalize_text(query)
+        if not query:
+            return []
+
+        keys = _ngrams(query, self.ngram_size)
+        postings = self._grams
+        if not keys:
+            keys = set(query)
+            postings = self._chars
+
+        # postingの小さい順に積集合をとる
+        candidates = None
+        for key in sorted(keys, key=lambda key: len(postings.get(key, ()))):
+            cells = postings.get(key)
+            if not cells:
+                return []
+            candidates = set(cells) if candidates is None else candidates & cells
+            if not candidates:
+                return []
+
+        # n-gramが全て含まれていても連続しているとは限らないので最後に確認
+        return sorted(cell for cell in candidates if query in self._texts[cell])
+
+    def __len__(self):
+        return len(self._texts)
@@ -0,0 +1,257 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from http_session import configure_session, DEFAULT_RATE_LIMIT
+from download_engine import DownloadEngine, DEFAULT_MAX_WORKERS
+from data_handlers import create_handler, has_data_in_range, run_download, normalize_data_type
+from base_srch_data import DOWNLOAD_DIR
+from incremental_sync import SyncSkipped, find_local_stations, plan_sync
+from utils.rate_limit import TokenBucket
+
+# PyQtを使わないダウンロード用のCLI
+#
+#   python src/wis_cli.py download --manifest stations.csv --workers 4
+#   python src/wis_cli.py download --station 303031283310010 --data-type water --kind 1 --start 2020/01 --end 2020/12
+#   python src/wis_cli.py sync --workers 4
+#   python src/wis_cli.py download --manifest stations.csv --processes 8 --workers 4 --rate 20
+#
+# manifestはCSV (ヘッダ: js_detail,data_type,kind,start,end) またはJSONL (同じkey)
+# 月単位のkindはstart/endを "YYYY/MM"、年単位・期間のkindは "YYYY"
+# 最後に結果のsummaryをJSONで出力する
+# 前回までに完了した期間 (各観測所ディレクトリの_manifest.jsonl) はスキップし、失敗した期間だけ再取得する
+#
+# syncは各観測所ディレクトリの最新の期間から今の月 (年単位のkindは今年) までだけを取得する
+# manifestを指定しなければ--download-dir (既定は./Download) 以下のダウンロード済みの観測所 (_station.json) が対象
+# manifestのstart (または--initial-start) はまだローカルにデータがない観測所の開始
+#
+# --processesを指定すると観測所のリストをshardに分けてプロセスプールで実行する (parseがGILで詰まらないように)
+# 各プロセスは自分のSessionを持ち、--rateはすべてのプロセスで共有するリクエスト数/秒の上限 (0で無制限)
+# 同時リクエスト数は各Sessionがレスポンスの時間とエラーを見て調整する (http_session.HttpSession)
+
+MANIFEST_FIELDS = ('js_detail', 'data_type', 'kind', 'start', 'end')
+SYNC_FIELDS = ('js_detail', 'data_type', 'kind')
+SHARDS_PER_PROCESS = 4  # 観測所ごとの時間の偏りをならすため、プロセス数より細かく分ける
+
+# 子プロセスにも渡せるようにlambdaではなく関数
+def log_stderr(message):
+    print(message, file=sys.stderr, flush=True)
+
+def load_manifest(path, fields=MANIFEST_FIELDS):
+    with open(path, 'r', encoding='utf-8') as file:
+        if path.endswith('.jsonl'):
+            entries = [json.loads(line) for line in file if line.strip()]
+        elif path.endswith('.json'):
+            entries = json.load(file)
+            if not isinstance(entries, list):
+                raise ValueError(f"{path}: expected a JSON array of entries")
+        else:
+            entries = list(csv.DictReader(file))
+
+    for number, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"{path}: entry {number} is not an object")
+        missing = [field for field in fields if not str(entry.get(field, '')).strip()]
+        if missing:
+            raise ValueError(f"{path}: entry {number} is missing {', '.join(missing)}")
+    return [{field: str(entry[field]).strip() for field in MANIFEST_FIELDS if str(entry.get(field) or '').strip()} for entry in entries]
+
+def make_result(entry, status, error=None):
+    return dict(entry, data_type=normalize_data_type(entry['data_type']), status=status, error=error, files=0, bytes=0, resumed=0)
+
+def log_result(log, result):
+    log(f"{result['status'].upper()} - ID={result['js_detail']} {result['data_type']}_{result['kind']} "
+        f"{result.get('start', '')}-{result.get('end', '')}" + (f": {result['error']}" if result['error'] else ""))
+
+def download_entry(entry, engine_workers=DEFAULT_MAX_WORKERS, log=print, resume=True, download_dir=DOWNLOAD_DIR):
+    result = make_result(entry, 'ok')
+    start_time = time.monotonic()
+    engine = DownloadEngine(max_workers=engine_workers)
+    data_handler = None
+
+    try:
+        data_handler = create_handler(entry['js_detail'], entry['data_type'], entry['kind'], entry['start'], entry['end'], engine=engine)
+        data_handler.resume = resume
+        data_handler.download_dir = download_dir
+        if not has_data_in_range(data_handler):
+            result['status'] = 'skipped'
+            result['error'] = "Invalid Data range"
+        else:
+            try:
+                run_download(data_handler)
+            finally:
+                result['directory'] = data_handler.get_directory()
+                result['resumed'] = len(data_handler.skipped_periods)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+
+    result['files'] = len(data_handler.written_periods) if data_handler is not None else 0
+    result['bytes'] = engine.total_bytes
+    result['seconds'] = round(time.monotonic() - start_time, 3)
+    log_result(log, result)
+    return result
+
+# 取得範囲を決めてからdownload_entry
+def sync_entry(entry, engine_workers=DEFAULT_MAX_WORKERS, log=print, initial_start=None, today=None, download_dir=DOWNLOAD_DIR):
+    try:
+        planned = plan_sync(entry, initial_start, today, download_dir=download_dir)
+    except SyncSkipped as e:
+        result = make_result(entry, 'skipped', str(e))
+    except Exception as e:
+        result = make_result(entry, 'failed', str(e))
+    else:
+        return download_entry(planned, engine_workers, log, resume=True, download_dir=download_dir)
+
+    result['seconds'] = 0
+    log_result(log, result)
+    return result
+
+def run_downloads(entries, workers=1, engine_workers=DEFAULT_MAX_WORKERS, log=print, resume=True, download_dir=DOWNLOAD_DIR):
+    return run_jobs(download_entry, entries, workers, engine_workers, log, resume, download_dir)
+
+def run_sync(entries, workers=1, engine_workers=DEFAULT_MAX_WORKERS, log=print, initial_start=None, today=None, download_dir=DOWNLOAD_DIR):
+    return run_jobs(sync_entry, entries, workers, engine_workers, log, initial_start, today, download_dir)
+
+def run_jobs(job, entries, workers, *args):
+    start_time = time.monotonic()
+    results = [None] * len(entries)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(job, entry, *args): i for i, entry in enumerate(entries)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    return summarize(results, start_time)
+
+JOBS = {
+    'download': download_entry,
+    'sync': sync_entry,
+}
+
+# i番目の観測所をi % shard_count番目のshardへ、元の順番に戻せるようにindexも持たせる
+def shard_entries(entries, shard_count):
+    shards = [[] for _ in range(max(1, shard_count))]
+    for i, entry in enumerate(entries):
+        shards[i % len(shards)].append((i, entry))
+    return [shard for shard in shards if shard]
+
+# rate_limiterがNone (--rate 0) なら無制限
+def init_worker_process(use_cache, pool_size, rate_limiter):
+    configure_session(use_cache=use_cache, pool_size=pool_size, rate=None, rate_limiter=rate_limiter)
+
+def run_shard(command, shard, workers, job_args):
+    summary = run_jobs(JOBS[command], [entry for _, entry in shard], workers, *job_args)
+    return summary['results']
+
+# job_argsはJOBS[command]のentry以降の引数 (子プロセスに送るのでpickleできるもの)
+def run_sharded(command, entries, processes, workers, job_args, use_cache=True, pool_size=None, rate_limiter=None):
+    start_time = time.monotonic()
+    results = [None] * len(entries)
+    shards = shard_entries(entries, min(len(entries), processes * SHARDS_PER_PROCESS))
+
+    # shardより多くのプロセスは起動しない
+    processes = min(processes, len(shards))
+    initargs = (use_cache, pool_size or max(10, workers * DEFAULT_MAX_WORKERS), rate_limiter)
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker_process, initargs=initargs) as executor:
+        futures = {executor.submit(run_shard, command, shard, workers, job_args): shard for shard in shards}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                shard_results = future.result()
+            except Exception as e:
+                # プロセスごと落ちた場合
+                shard_results = [make_result(entry, 'failed', str(e) or e.__class__.__name__) for _, entry in shard]
+            for (i, _), result in zip(shard, shard_results):
+                results[i] = result
+
+    return summarize(results, start_time, processes=processes)
+
+def summarize(results, start_time, processes=1):
+    counts = {status: sum(1 for result in results if result['status'] == status) for status in ('ok', 'skipped', 'failed')}
+    return {
+        'jobs': len(results),
+        **counts,
+        'bytes': sum(result['bytes'] for result in results),
+        'seconds': round(time.monotonic() - start_time, 3),
+        'processes': processes,
+        'results': results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless downloader for the WIS database")
+    parser.add_argument('--no-cache', action='store_true', help="disable the on-disk HTTP response cache")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    download_parser = subparsers.add_parser('download', help="download observation data for stations")
+    download_parser.add_argument('--manifest', help="CSV, JSON array or JSONL with js_detail,data_type,kind,start,end")
+    download_parser.add_argument('--station', help="js_detail of a single station")
+    download_parser.add_argument('--data-type', help="rain / water (or SrchRainData / SrchWaterData)")
+    download_parser.add_argument('--kind', type=int)
+    download_parser.add_argument('--start', help="YYYY/MM (monthly kinds) or YYYY")
+    download_parser.add_argument('--end', help="YYYY/MM (monthly kinds) or YYYY")
+    download_parser.add_argument('--workers', type=int, default=1, help="stations downloaded in parallel")
+    download_parser.add_argument('--engine-workers', type=int, default=DEFAULT_MAX_WORKERS, help="parallel requests per station")
+    download_parser.add_argument('--no-resume', action='store_true', help="download again even periods completed in a previous run")
+    download_parser.add_argument('--summary', help="write the JSON summary to this file instead of stdout")
+
+    sync_parser = subparsers.add_parser('sync', help="download only the periods newer than the local data")
+    sync_parser.add_argument('--manifest', help="CSV, JSON array or JSONL with js_detail,data_type,kind[,start] (default: stations in --download-dir)")
+    sync_parser.add_argument('--initial-start', help="YYYY/MM or YYYY for stations without local data")
+    sync_parser.add_argument('--workers', type=int, default=1, help="stations downloaded in parallel")
+    sync_parser.add_argument('--engine-workers', type=int, default=DEFAULT_MAX_WORKERS, help="parallel requests per station")
+    sync_parser.add_argument('--summary', help="write the JSON summary to this file instead of stdout")
+
+    for subparser in (download_parser, sync_parser):
+        subparser.add_argument('--download-dir', default=DOWNLOAD_DIR, help="directory containing the station directories")
+        subparser.add_argument('--processes', type=int, default=1, help="worker processes, each running --workers stations (0: number of CPUs)")
+        subparser.add_argument('--rate', type=float, default=DEFAULT_RATE_LIMIT, help="max requests per second shared by all workers and processes (0: unlimited)")
+
+    args = parser.parse_args(argv)
+    log = log_stderr
+
+    if args.command == 'download':
+        if args.manifest:
+            entries = load_manifest(args.manifest)
+        elif args.station and args.data_type and args.kind and args.start and args.end:
+            entries = [{'js_detail': args.station, 'data_type': args.data_type, 'kind': str(args.kind), 'start': args.start, 'end': args.end}]
+        else:
+            parser.error("download needs --manifest or --station/--data-type/--kind/--start/--end")
+
+        job_args = (args.engine_workers, log, not args.no_resume, args.download_dir)
+
+    elif args.command == 'sync':
+        entries = load_manifest(args.manifest, SYNC_FIELDS) if args.manifest else find_local_stations(args.download_dir)
+        if not entries:
+            parser.error(f"no stations to sync (no --manifest and no downloaded stations in {args.download_dir})")
+
+        job_args = (args.engine_workers, log, args.initial_start, None, args.download_dir)
+
+    processes = args.processes or os.cpu_count() or 1
+    pool_size = max(10, args.workers * args.engine_workers)
+    if processes > 1 and len(entries) > 1:
+        rate_limiter = TokenBucket.shared(args.rate) if args.rate else None
+        summary = run_sharded(args.command, entries, processes, args.workers, job_args, not args.no_cache, pool_size, rate_limiter)
+    else:
+        configure_session(use_cache=not args.no_cache, pool_size=pool_size, rate=args.rate or None)
+        summary = run_jobs(JOBS[args.command], entries, args.workers, *job_args)
+
+    output = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.summary:
+        directory = os.path.dirname(args.summary)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.summary, 'w', encoding='utf-8') as file:
+            file.write(output)
+    else:
+        print(output)
+
+    return 0 if summary['failed'] == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())